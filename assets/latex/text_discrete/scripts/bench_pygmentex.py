@@ -0,0 +1,233 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmarks for pygmentex.py.
+
+The corpus is made of the Python listings of the chapters included by
+main_discrete_prog.tex, highlighted with the option combinations used
+by the book.
+
+Usage: python bench_pygmentex.py [<repeat>]
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pygmentex
+from build_book import book_chapters
+
+BASE_OPTS = { 'lang'      : 'python',
+              'sty'       : 'default',
+              'linenosep' : '0pt',
+              'tabsize'   : '8',
+              'encoding'  : 'guess',
+            }
+
+OPTION_SETS = [
+    'mathescape',
+    'mathescape,linenos',
+    'sty=friendly,gobble=4',
+    'escapeinside=||,linenos,linenostep=2',
+]
+
+_re_listing = re.compile(r'\\begin\{python\*?\}.*\n([\s\S]*?)\\end\{python\*?\}')
+
+
+def book_corpus():
+    """Return the list of (opts, text) snippets of the book."""
+    snippets = []
+    for path in book_chapters():
+        with open(path, encoding='utf-8') as f:
+            for text in _re_listing.findall(f.read()):
+                for extra in OPTION_SETS:
+                    opts = pygmentex.parse_opts(BASE_OPTS, extra)
+                    snippets.append((opts, text.rstrip('\n')))
+    return snippets
+
+
+def timeit(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(title, count, unit, before, after):
+    print('%s' % title)
+    print('  before: %10.1f %s/s  (%.4f s)' % (count / before, unit, before))
+    print('  after:  %10.1f %s/s  (%.4f s)' % (count / after, unit, after))
+    print('  speedup: %.2fx' % (before / after))
+
+
+def bench_registry(snippets, repeat):
+    """Fresh lexer/formatter per snippet vs. a shared registry."""
+    def before():
+        for opts, text in snippets:
+            pygmentex.highlight_snippet(opts, text,
+                                        pygmentex.HighlighterRegistry())
+
+    def after():
+        registry = pygmentex.HighlighterRegistry()
+        for opts, text in snippets:
+            pygmentex.highlight_snippet(opts, text, registry)
+
+    report('highlight_snippet: lexer/formatter registry',
+           len(snippets), 'snippets', timeit(before, repeat), timeit(after, repeat))
+
+
+def format_lines_per_line(code, opts):
+    """The per-line post-processing pygmentex.py did before format_lines()."""
+    linenos = pygmentex.get_bool_opt(opts, 'linenos', False)
+    linenostart = abs(pygmentex.get_int_opt(opts, 'linenostart', 1))
+    linenostep = abs(pygmentex.get_int_opt(opts, 'linenostep', 1))
+    numbers = []
+    lines = []
+    counter = linenostart
+    for line in code.split('\n'):
+        line = re.sub(r'^ ', r'\\makebox[0pt]{\\phantom{Xy}} ', line)
+        line = re.sub(r' ', '~', line)
+        if linenos:
+            if (counter - linenostart) % linenostep == 0:
+                line = r'\pygmented@lineno@do{' + str(counter) + '}' + line
+                numbers.append(str(counter))
+            counter = counter + 1
+        lines.append(line)
+    return '\\newline\n'.join(lines), numbers
+
+
+def bench_format_lines(snippets, repeat, min_lines = 10000):
+    """Per-line vs. whole-body post-processing of a long listing."""
+    text = '\n'.join(text for opts, text in snippets)
+    lines = text.count('\n') + 1
+    text = '\n'.join([text] * (min_lines // lines + 1))
+    registry = pygmentex.HighlighterRegistry()
+    for extra in ('', 'linenos', 'linenos,linenostart=5,linenostep=3'):
+        opts = pygmentex.parse_opts(BASE_OPTS, 'mathescape,' + extra)
+        lexer, fmter = registry.get(opts)
+        x = pygmentex.highlight(text, lexer, fmter)
+        code = pygmentex._re_verbatim.match(x).group(2)
+        assert pygmentex.format_lines(code, opts) == format_lines_per_line(code, opts)
+        nlines = code.count('\n') + 1
+        report('format_lines: %d-line listing [%s]' % (nlines, extra or 'no linenos'),
+               nlines, 'lines',
+               timeit(lambda: format_lines_per_line(code, opts), repeat),
+               timeit(lambda: pygmentex.format_lines(code, opts), repeat))
+
+
+class PerTokenLatexFormatter(pygmentex.EnhancedLatexFormatter):
+    """EnhancedLatexFormatter with the token loop it had before the
+    token-type table and the list-based output builder."""
+
+    def format_unencoded(self, tokensource, outfile):
+        Token = pygmentex.Token
+        escape_tex = pygmentex.escape_tex
+        t2n = self.ttype2name
+        cp = self.commandprefix
+        for ttype, value in tokensource:
+            if ttype in Token.Comment:
+                if self.texcomments:
+                    start = value[0:1]
+                    for i in range(1, len(value)):
+                        if start[0] != value[i]:
+                            break
+                        start += value[i]
+                    value = value[len(start):]
+                    start = escape_tex(start, self.commandprefix)
+                    value = start + value
+                elif self.mathescape:
+                    parts = value.split('$')
+                    in_math = False
+                    for i, part in enumerate(parts):
+                        if not in_math:
+                            parts[i] = escape_tex(part, self.commandprefix)
+                        in_math = not in_math
+                    value = '$'.join(parts)
+                elif self.escapeinside:
+                    text = value
+                    value = ''
+                    while len(text) > 0:
+                        a,sep1,text = text.partition(self.left)
+                        if len(sep1) > 0:
+                            b,sep2,text = text.partition(self.right)
+                            if len(sep2) > 0:
+                                value += escape_tex(a, self.commandprefix) + b
+                            else:
+                                value += escape_tex(a + sep1 + b, self.commandprefix)
+                        else:
+                            value = value + escape_tex(a, self.commandprefix)
+                else:
+                    value = escape_tex(value, self.commandprefix)
+            elif ttype not in Token.Escape:
+                value = escape_tex(value, self.commandprefix)
+            styles = []
+            while ttype is not Token:
+                try:
+                    styles.append(t2n[ttype])
+                except KeyError:
+                    styles.append(pygmentex._get_ttype_name(ttype))
+                ttype = ttype.parent
+            styleval = '+'.join(reversed(styles))
+            if styleval:
+                spl = value.split('\n')
+                for line in spl[:-1]:
+                    if line:
+                        outfile.write("\\%s{%s}{%s}" % (cp, styleval, line))
+                    outfile.write('\n')
+                if spl[-1]:
+                    outfile.write("\\%s{%s}{%s}" % (cp, styleval, spl[-1]))
+            else:
+                outfile.write(value)
+
+
+def bench_format_tokens(snippets, repeat, min_tokens = 200000):
+    """Token emission of EnhancedLatexFormatter over a synthetic stream."""
+    text = '\n'.join(text for opts, text in snippets)
+    for extra in ('mathescape', 'texcomments', 'escapeinside=||'):
+        opts = pygmentex.parse_opts(BASE_OPTS, extra)
+        lexer, fmter = pygmentex.HighlighterRegistry().get(opts)
+        tokens = list(lexer.get_tokens(text))
+        tokens = tokens * (min_tokens // len(tokens) + 1)
+        before = PerTokenLatexFormatter(style=opts['sty'])
+        after = pygmentex.EnhancedLatexFormatter(style=opts['sty'])
+        for fmt in (before, after):
+            fmt.escapeinside = fmter.escapeinside
+            if fmt.escapeinside:
+                fmt.left, fmt.right = fmter.left, fmter.right
+            fmt.texcomments = fmter.texcomments
+            fmt.mathescape = fmter.mathescape
+
+        def run(fmt):
+            out = pygmentex.StringIO()
+            fmt.format_unencoded(iter(tokens), out)
+            return out.getvalue()
+
+        expected = run(before)
+        assert run(after).endswith(expected + '\\end{Verbatim}\n')
+        report('format_unencoded: %d tokens [%s]' % (len(tokens), extra),
+               len(tokens), 'tokens',
+               timeit(lambda: run(before), repeat),
+               timeit(lambda: run(after), repeat))
+
+
+def main(args = sys.argv):
+    repeat = int(args[1]) if len(args) > 1 else 5
+    snippets = book_corpus()
+    print('corpus: %d snippets from %d chapters' %
+          (len(snippets), len(book_chapters())))
+    bench_registry(snippets, repeat)
+    bench_format_lines(snippets, repeat)
+    bench_format_tokens(snippets, repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
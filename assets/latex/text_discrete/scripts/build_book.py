@@ -0,0 +1,238 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Chapter-level incremental highlighting for the text_discrete book.
+
+pygmentex.py processes the snippets of the whole book as one unit. This
+driver attributes each snippet of ``<jobname>.snippets`` to the chapter
+it comes from, keeps the content hash of every chapter and the snippet
+numbers it owns in ``<jobname>.pygbuild``, and only highlights again the
+snippets of the chapters that changed since the previous build. The
+snippets of unchanged chapters are replayed from the pygmentex cache.
+
+Usage: python build_book.py [-l <latex command>] [-j <jobs>] [<main tex file>]
+
+With -l, the LaTeX command is run on the main file before highlighting
+(to write the snippets file) and after it (to typeset the snippets).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import getopt
+import hashlib
+import subprocess
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pygmentex
+
+BOOK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_TEX = os.path.join(BOOK_DIR, 'main_discrete_prog.tex')
+
+MANIFEST_FORMAT = 1
+
+_re_include = re.compile(r'^[ \t]*\\(?:include|input)\{([^}]*)\}', re.MULTILINE)
+
+
+def book_chapters(main_tex = MAIN_TEX):
+    """Return the chapter files included (not commented out) by the book."""
+    with open(main_tex, encoding='utf-8') as f:
+        main = f.read()
+    chapters = []
+    for name in _re_include.findall(main):
+        path = os.path.join(os.path.dirname(main_tex), name)
+        if not path.endswith('.tex'):
+            path = path + '.tex'
+        if os.path.exists(path):
+            chapters.append(path)
+    return chapters
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def assign_snippets(blocks, sources):
+    """
+    Return the index in ``sources`` of the file each snippet of ``blocks``
+    comes from.
+
+    ``sources`` holds the text of the chapters in document order followed
+    by the text of the main file. LaTeX writes the snippets in document
+    order, so the search for the chapter of a snippet starts at the
+    chapter of the previous one; this disambiguates short inline snippets
+    that occur in several chapters. Snippets found in no chapter from
+    there on but in the main file belong to it; other snippets, such as
+    the contents of input snippets, belong to the current chapter.
+    """
+    owners = []
+    current = 0
+    last = len(sources) - 1
+    for n, opts, text, inline_delim in blocks:
+        for i in range(current, last):
+            if text in sources[i]:
+                current = i
+                owners.append(i)
+                break
+        else:
+            owners.append(last if text in sources[last] else current)
+    return owners
+
+
+def load_manifest(filename):
+    try:
+        with open(filename, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('format') != MANIFEST_FORMAT:
+        return {}
+    return manifest.get('chapters', {})
+
+
+def build(main_tex, jobs = 1):
+    """
+    Highlight the snippets of ``main_tex``, chapter by chapter.
+
+    Return the per-chapter report, a list of
+    ``(chapter, changed, snippets, highlighted, replayed, seconds)``.
+    """
+    root, ext = os.path.splitext(main_tex)
+    infn = root + '.snippets'
+    outfn = root + '.pygmented'
+    manifest_fn = root + '.pygbuild'
+
+    chapters = book_chapters(main_tex) + [main_tex]
+    names = [os.path.relpath(path, os.path.dirname(main_tex)) for path in chapters]
+    sources = []
+    for path in chapters:
+        with open(path, encoding='utf-8') as f:
+            sources.append(f.read())
+    hashes = [file_hash(path) for path in chapters]
+
+    old = load_manifest(manifest_fn)
+    changed = [old.get(name, {}).get('hash') != h for name, h in zip(names, hashes)]
+
+    code, inencoding = pygmentex.open_input(infn)
+    blocks = list(pygmentex.scan(code))
+    owners = assign_snippets(blocks, sources)
+
+    cache = pygmentex.SnippetCache(root + '.pygcache')
+    cache.load()
+    pygmentex._registry.styledefs = cache.styledefs
+
+    snippets = [None] * len(blocks)
+    report = []
+    for i, name in enumerate(names):
+        start = time.perf_counter()
+        owned = [k for k, owner in enumerate(owners) if owner == i]
+        highlighted = replayed = 0
+        todo = []
+        for k in owned:
+            n, opts, text, inline_delim = blocks[k]
+            key = cache.key(opts, text)
+            snippet = None if changed[i] else cache.get(key)
+            if snippet is None:
+                todo.append((k, key))
+            else:
+                snippets[k] = snippet
+                replayed += 1
+        if jobs > 1 and len(todo) > 1:
+            results = pygmentex.highlight_all([blocks[k] for k, key in todo],
+                                              None, jobs)
+        else:
+            results = [pygmentex.highlight_snippet(blocks[k][1], blocks[k][2])
+                       for k, key in todo]
+        for (k, key), snippet in zip(todo, results):
+            snippets[k] = snippet
+            if snippet is not None:
+                cache.put(key, snippet)
+            highlighted += 1
+        report.append((name, changed[i], len(owned), highlighted, replayed,
+                       time.perf_counter() - start))
+
+    outfile = StringIO()
+    outfile.write(pygmentex.GENERIC_DEFINITIONS_1)
+    usedstyles = []
+    for (n, opts, text, inline_delim), snippet in zip(blocks, snippets):
+        if snippet is not None:
+            pygmentex.write_snippet(outfile, n, opts, '', snippet, usedstyles,
+                                    inline_delim)
+    outfile.write(pygmentex.GENERIC_DEFINITIONS_2)
+    pygmentex.update_file(outfn, outfile.getvalue())
+
+    cache.save()
+    manifest = dict(format = MANIFEST_FORMAT, chapters = {})
+    for i, (name, h) in enumerate(zip(names, hashes)):
+        numbers = [blocks[k][0] for k, owner in enumerate(owners) if owner == i]
+        manifest['chapters'][name] = dict(hash = h, snippets = numbers)
+    pygmentex.update_file(manifest_fn, json.dumps(manifest, indent = 1) + '\n',
+                          'utf-8')
+    return report
+
+
+def print_report(report):
+    print('%-40s %-9s %8s %11s %8s %9s' %
+          ('chapter', 'status', 'snippets', 'highlighted', 'replayed', 'time'))
+    for name, changed, count, highlighted, replayed, seconds in report:
+        print('%-40s %-9s %8d %11d %8d %8.3fs' %
+              (name, changed and 'changed' or 'unchanged', count,
+               highlighted, replayed, seconds))
+    print('%-40s %-9s %8d %11d %8d %8.3fs' %
+          ('total', '',
+           sum(r[2] for r in report), sum(r[3] for r in report),
+           sum(r[4] for r in report), sum(r[5] for r in report)))
+
+
+def run_latex(command, main_tex):
+    cwd = os.path.dirname(os.path.abspath(main_tex))
+    return subprocess.call(command.split() + [os.path.basename(main_tex)], cwd = cwd)
+
+
+def main(args = sys.argv):
+    try:
+        popts, args = getopt.getopt(args[1:], 'l:j:h')
+    except getopt.GetoptError:
+        print(__doc__, file=sys.stderr)
+        return 2
+    opts = dict(popts)
+    if '-h' in opts:
+        print(__doc__)
+        return 0
+    if len(args) > 1:
+        print(__doc__, file=sys.stderr)
+        return 2
+    main_tex = args[0] if args else MAIN_TEX
+    try:
+        jobs = int(opts.get('-j', 1))
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        print('Error: -j needs a number of jobs of at least 1, not %r' % opts['-j'],
+              file=sys.stderr)
+        return 2
+    latex = opts.get('-l')
+
+    if latex and run_latex(latex, main_tex) != 0:
+        print('Error: %s failed' % latex, file=sys.stderr)
+        return 1
+    try:
+        report = build(main_tex, jobs)
+    except OSError as err:
+        print('Error: ', err, file=sys.stderr)
+        return 1
+    print_report(report)
+    if latex and run_latex(latex, main_tex) != 0:
+        print('Error: %s failed' % latex, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
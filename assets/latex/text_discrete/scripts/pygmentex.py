@@ -16,15 +16,28 @@ __version__ = '0.10'
 __docformat__ = 'restructuredtext'
 
 import sys
+import os
 import getopt
 import re
+import codecs
+import pickle
+import hashlib
+import json
+import socket
+import tempfile
+import getpass
+import signal
+from io import StringIO
+from contextlib import redirect_stdout, redirect_stderr
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from os.path import splitext
 
-from pygments import highlight
+from pygments import highlight, __version__ as pygments_version
 from pygments.styles import get_style_by_name
 from pygments.lexers import get_lexer_by_name
 from pygments.formatters.latex import LatexFormatter, escape_tex, _get_ttype_name
-from pygments.util import get_bool_opt, get_int_opt
+from pygments.util import get_bool_opt, get_int_opt, ClassNotFound
 from pygments.lexer import Lexer
 from pygments.token import Token
 from pygments.util import guess_decode
@@ -48,10 +61,38 @@ class EnhancedLatexFormatter(LatexFormatter):
         else:
             self.escapeinside = ''
 
+    def _create_stylesheet(self):
+        LatexFormatter._create_stylesheet(self)
+        # ttype -> (kind, styleval), see _token_info()
+        self._tokeninfo = {}
+
+    def _token_info(self, ttype):
+        r"""
+        Return whether ``ttype`` is a comment (0), an escape (1) or
+        another token (2), and the names of its style and parent styles,
+        joined by ``+``.
+        """
+        t2n = self.ttype2name
+        if ttype in Token.Comment:
+            kind = 0
+        elif ttype in Token.Escape:
+            kind = 1
+        else:
+            kind = 2
+        styles = []
+        while ttype is not Token:
+            try:
+                styles.append(t2n[ttype])
+            except KeyError:
+                # not in current style
+                styles.append(_get_ttype_name(ttype))
+            ttype = ttype.parent
+        return kind, '+'.join(reversed(styles))
+
     def format_unencoded(self, tokensource, outfile):
         # TODO: add support for background colors
-        t2n = self.ttype2name
         cp = self.commandprefix
+        tokeninfo = self._tokeninfo
 
         if self.full:
             realoutfile = outfile
@@ -69,67 +110,63 @@ class EnhancedLatexFormatter(LatexFormatter):
             outfile.write(',' + self.verboptions)
         outfile.write(']\n')
 
+        # The output is collected in a list and written at once.
+        chunks = []
+        write = chunks.append
+
         for ttype, value in tokensource:
-            if ttype in Token.Comment:
+            try:
+                kind, styleval = tokeninfo[ttype]
+            except KeyError:
+                kind, styleval = tokeninfo[ttype] = self._token_info(ttype)
+            if kind == 0:
                 if self.texcomments:
                     # Try to guess comment starting lexeme and escape it ...
-                    start = value[0:1]
-                    for i in range(1, len(value)):
-                        if start[0] != value[i]:
-                            break
-                        start += value[i]
-
-                    value = value[len(start):]
-                    start = escape_tex(start, self.commandprefix)
+                    i = 1
+                    while i < len(value) and value[i] == value[0]:
+                        i += 1
+                    start = escape_tex(value[:i], cp)
 
                     # ... but do not escape inside comment.
-                    value = start + value
+                    value = start + value[i:]
                 elif self.mathescape:
                     # Only escape parts not inside a math environment.
                     parts = value.split('$')
-                    in_math = False
-                    for i, part in enumerate(parts):
-                        if not in_math:
-                            parts[i] = escape_tex(part, self.commandprefix)
-                        in_math = not in_math
+                    parts[::2] = [escape_tex(part, cp) for part in parts[::2]]
                     value = '$'.join(parts)
                 elif self.escapeinside:
                     text = value
-                    value = ''
-                    while len(text) > 0:
+                    segments = []
+                    while text:
                         a,sep1,text = text.partition(self.left)
-                        if len(sep1) > 0:
+                        if sep1:
                             b,sep2,text = text.partition(self.right)
-                            if len(sep2) > 0:
-                                value += escape_tex(a, self.commandprefix) + b
+                            if sep2:
+                                segments.append(escape_tex(a, cp))
+                                segments.append(b)
                             else:
-                                value += escape_tex(a + sep1 + b, self.commandprefix)
+                                segments.append(escape_tex(a + sep1 + b, cp))
                         else:
-                            value = value + escape_tex(a, self.commandprefix)
+                            segments.append(escape_tex(a, cp))
+                    value = ''.join(segments)
                 else:
-                    value = escape_tex(value, self.commandprefix)
-            elif ttype not in Token.Escape:
-                value = escape_tex(value, self.commandprefix)
-            styles = []
-            while ttype is not Token:
-                try:
-                    styles.append(t2n[ttype])
-                except KeyError:
-                    # not in current style
-                    styles.append(_get_ttype_name(ttype))
-                ttype = ttype.parent
-            styleval = '+'.join(reversed(styles))
+                    value = escape_tex(value, cp)
+            elif kind == 2:
+                value = escape_tex(value, cp)
             if styleval:
-                spl = value.split('\n')
-                for line in spl[:-1]:
-                    if line:
-                        outfile.write("\\%s{%s}{%s}" % (cp, styleval, line))
-                    outfile.write('\n')
-                if spl[-1]:
-                    outfile.write("\\%s{%s}{%s}" % (cp, styleval, spl[-1]))
+                if '\n' in value:
+                    spl = value.split('\n')
+                    for line in spl[:-1]:
+                        if line:
+                            write("\\%s{%s}{%s}" % (cp, styleval, line))
+                        write('\n')
+                    value = spl[-1]
+                if value:
+                    write("\\%s{%s}{%s}" % (cp, styleval, value))
             else:
-                outfile.write(value)
+                write(value)
 
+        outfile.write(''.join(chunks))
         outfile.write('\\end{Verbatim}\n')
 
         if self.full:
@@ -206,6 +243,11 @@ GENERIC_DEFINITIONS_2 = r'''
 '''
 
 
+STYLE_FILE_HEADER = r'''% -*- mode: latex -*-
+% Pygments style definitions, written by pygmentex
+'''
+
+
 INLINE_SNIPPET_TEMPLATE = r'''
 \expandafter\def\csname pygmented@snippet@%(number)s\endcsname{%%
   \pygmented@snippet@inlined{%%
@@ -233,96 +275,346 @@ DISPLAY_LINENOS_SNIPPET_TEMPLATE = r'''
 '''
 
 
-def pyg(outfile, outencoding, n, opts, extra_opts, text, usedstyles, inline_delim = ''):
+class SnippetCache(object):
+    r"""
+    On-disk cache of highlighted snippets.
+
+    Entries map a digest of the snippet text, its parsed options and the
+    PygmenTeX and Pygments versions to the formatted snippet body and its
+    line numbers, so an unchanged snippet is replayed instead of being
+    highlighted again. The least recently used entries are evicted once
+    the total size of the cached bodies exceeds ``maxsize`` bytes.
+    A hit only reorders the entries in memory: the file is rewritten when
+    an entry was added or evicted, so a run that replays every snippet
+    does not write it, and the order of its hits is saved with the next
+    run that does.
+
+    The escaped ``\PYstyle`` definitions of the styles seen so far are
+    kept in ``styledefs``, as they only depend on the style and the
+    versions.
+    """
+    FORMAT = 2
+
+    def __init__(self, filename, maxsize = 32 * 1024 * 1024):
+        self.filename = filename
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.styledefs = {}
+        self.nstyledefs = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.filename, 'rb') as fp:
+                header, entries, styledefs = pickle.load(fp)
+        except Exception:
+            # missing, unreadable or corrupt cache: start afresh
+            return
+        if header != (self.FORMAT, __version__, pygments_version):
+            self.dirty = True
+            return
+        self.entries = entries
+        self.styledefs.update(styledefs)
+        self.nstyledefs = len(self.styledefs)
+        self.size = sum(self._entry_size(e) for e in entries.values())
+        self._evict()
+
+    def save(self):
+        if not self.dirty and len(self.styledefs) == self.nstyledefs:
+            return
+        tmpfn = self.filename + '.tmp'
+        with open(tmpfn, 'wb') as fp:
+            pickle.dump(((self.FORMAT, __version__, pygments_version),
+                         self.entries,
+                         self.styledefs),
+                        fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfn, self.filename)
+        self.dirty = False
+        self.nstyledefs = len(self.styledefs)
+
+    @staticmethod
+    def key(opts, text):
+        data = repr((sorted(opts.items()), text))
+        return hashlib.sha1(data.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    @staticmethod
+    def _entry_size(entry):
+        body, numbers = entry
+        return len(body) + sum(len(x) for x in numbers)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        if key in self.entries:
+            self.size -= self._entry_size(self.entries.pop(key))
+        self.entries[key] = entry
+        self.size += self._entry_size(entry)
+        self.dirty = True
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.maxsize and self.entries:
+            key, entry = self.entries.popitem(last = False)
+            self.size -= self._entry_size(entry)
+            self.evictions += 1
+            self.dirty = True
+
+    def stats(self):
+        return ('PygmenTeX cache: %d hits, %d misses, %d evicted, '
+                '%d entries (%.1f KiB) in %s\n' %
+                (self.hits, self.misses, self.evictions,
+                 len(self.entries), self.size / 1024.0, self.filename))
+
+
+class HighlighterRegistry(object):
+    r"""
+    Lexers, formatters and style definitions shared by the snippets of a
+    run.
+
+    Building a lexer and a formatter and its stylesheet is far more
+    expensive than highlighting a typical snippet, so they are built once
+    for each combination of the options that affect them and reused by
+    every snippet with the same combination.
+    """
+    def __init__(self):
+        self.highlighters = {}
+        self.styledefs = {}
+
+    @staticmethod
+    def key(opts):
+        return (opts['lang'],
+                opts['sty'],
+                opts.get('escapeinside', ''),
+                get_bool_opt(opts, 'texcomments', False),
+                get_bool_opt(opts, 'mathescape', False),
+                abs(get_int_opt(opts, 'gobble', 0)),
+                abs(get_int_opt(opts, 'tabsize', 0)))
+
+    def get(self, opts):
+        r"""
+        Return the lexer and the formatter for ``opts``.
+
+        Raise ``ClassNotFound`` if there is no lexer for the language.
+        """
+        key = self.key(opts)
+        try:
+            return self.highlighters[key]
+        except KeyError:
+            pass
+        lang, stylename, escapeinside, texcomments, mathescape, gobble, tabsize = key
+
+        lexer = get_lexer_by_name(lang)
+
+        _fmter = EnhancedLatexFormatter()
+
+        if len(escapeinside) == 2:
+            left = escapeinside[0]
+            right = escapeinside[1]
+            _fmter.escapeinside = escapeinside
+            _fmter.left = left
+            _fmter.right = right
+            lexer = LatexEmbeddedLexer(left, right, lexer)
+
+        if gobble:
+            lexer.add_filter('gobble', n=gobble)
+
+        if tabsize:
+            lexer.tabsize = tabsize
+
+        lexer.encoding = ''
+        # _fmter.encoding = outencoding
+
+        _fmter.style = get_style_by_name(stylename)
+        _fmter._create_stylesheet()
+
+        _fmter.texcomments = texcomments
+        _fmter.mathescape = mathescape
+
+        self.highlighters[key] = lexer, _fmter
+        return lexer, _fmter
+
+    def style_defs(self, stylename):
+        r"""
+        Return the definition of the ``\PYstyle<stylename>`` macro.
+        """
+        try:
+            return self.styledefs[stylename]
+        except KeyError:
+            pass
+        _fmter = EnhancedLatexFormatter(style=stylename)
+        styledefs = _fmter.get_style_defs() \
+            .replace('#', '##') \
+            .replace(r'\##', r'\#') \
+            .replace(r'\makeatletter', '') \
+            .replace(r'\makeatother', '') \
+            .replace('\n', '%\n')
+        result = '\\def\\PYstyle{0}{{%\n{1}%\n}}%\n'.format(stylename, styledefs)
+        self.styledefs[stylename] = result
+        return result
+
+
+_registry = HighlighterRegistry()
+
+_re_verbatim = re.compile(
+    r'\\begin\{Verbatim}(.*)\n([\s\S]*?)\n\\end\{Verbatim}(\s*)\Z')
+
+
+def highlight_snippet(opts, text, registry = None):
+    r"""
+    Highlight ``text`` according to ``opts``.
+
+    Return a pair with the body of the snippet, ready to be inserted in
+    one of the snippet templates, and the list of line numbers to be
+    typeset, or ``None`` if the snippet cannot be highlighted.
+    """
+    if registry is None:
+        registry = _registry
     try:
-        lexer = get_lexer_by_name(opts['lang'])
+        lexer, _fmter = registry.get(opts)
     except ClassNotFound as err:
         sys.stderr.write('Error: ')
         sys.stderr.write(str(err))
-        return ""
+        return None
 
-    # global _fmter
-    _fmter = EnhancedLatexFormatter()
+    x = highlight(text, lexer, _fmter)
 
-    escapeinside = opts.get('escapeinside', '')
-    if len(escapeinside) == 2:
-        left = escapeinside[0]
-        right = escapeinside[1]
-        _fmter.escapeinside = escapeinside
-        _fmter.left = left
-        _fmter.right = right
-        lexer = LatexEmbeddedLexer(left, right, lexer)
+    m = _re_verbatim.match(x)
+    if not m:
+        return None
 
-    gobble = abs(get_int_opt(opts, 'gobble', 0))
-    if gobble:
-        lexer.add_filter('gobble', n=gobble)
+    return format_lines(m.group(2), opts)
 
-    tabsize = abs(get_int_opt(opts, 'tabsize', 0))
-    if tabsize:
-        lexer.tabsize = tabsize
 
-    lexer.encoding = ''
-    # _fmter.encoding = outencoding
+_re_leading_space = re.compile(r'^ ', re.MULTILINE)
 
-    stylename = opts['sty']
+def format_lines(code, opts):
+    r"""
+    Turn the contents ``code`` of a Verbatim environment into the body of a
+    snippet.
+
+    Spaces become ties, a leading space is preceded by an empty box so it
+    is not dropped, and the lines are separated by ``\newline``. If line
+    numbers are requested, return them too, and precede each numbered line
+    by a ``\pygmented@lineno@do`` command.
 
-    _fmter.style = get_style_by_name(stylename)
-    _fmter._create_stylesheet()
+    The whole body is transformed at once; only the numbered lines are
+    handled one by one.
+    """
+    code = _re_leading_space.sub(r'\\makebox[0pt]{\\phantom{Xy}} ', code) \
+        .replace(' ', '~')
+
+    if not get_bool_opt(opts, 'linenos', False):
+        return code.replace('\n', '\\newline\n'), []
+
+    linenostart = abs(get_int_opt(opts, 'linenostart', 1))
+    linenostep = abs(get_int_opt(opts, 'linenostep', 1))
+    lines = code.split('\n')
+    numbers = [str(i) for i in range(linenostart,
+                                     linenostart + len(lines),
+                                     linenostep)]
+    lines[::linenostep] = [r'\pygmented@lineno@do{' + number + '}' + line
+                           for number, line in zip(numbers, lines[::linenostep])]
+    return '\\newline\n'.join(lines), numbers
 
-    _fmter.texcomments = get_bool_opt(opts, 'texcomments', False)
-    _fmter.mathescape = get_bool_opt(opts, 'mathescape', False)
+
+def write_snippet(outfile, n, opts, extra_opts, snippet, usedstyles, inline_delim = '', styledefs = True):
+    r"""
+    Write the definition of snippet number ``n``, preceded by the
+    definition of its style if it is the first snippet using it, unless
+    ``styledefs`` is false.
+    """
+    body, numbers = snippet
+
+    stylename = opts['sty']
 
     if stylename not in usedstyles:
-        styledefs = _fmter.get_style_defs() \
-            .replace('#', '##') \
-            .replace(r'\##', r'\#') \
-            .replace(r'\makeatletter', '') \
-            .replace(r'\makeatother', '') \
-            .replace('\n', '%\n')
-        outfile.write(
-            '\\def\\PYstyle{0}{{%\n{1}%\n}}%\n'.format(stylename, styledefs))
+        if styledefs:
+            outfile.write(_registry.style_defs(stylename))
         usedstyles.append(stylename)
 
-    x = highlight(text, lexer, _fmter)
+    if inline_delim:
+        outfile.write(INLINE_SNIPPET_TEMPLATE %
+            dict(number    = n,
+                 style     = stylename,
+                 options   = extra_opts,
+                 body      = body))
+    else:
+        if get_bool_opt(opts, 'linenos', False):
+            template = DISPLAY_LINENOS_SNIPPET_TEMPLATE
+        else:
+            template = DISPLAY_SNIPPET_TEMPLATE
+        outfile.write(template %
+            dict(number      = n,
+                 style       = stylename,
+                 options     = extra_opts,
+                 linenosep   = opts['linenosep'],
+                 linenumbers = ','.join(numbers),
+                 body        = body))
+
+
+def pyg(outfile, outencoding, n, opts, extra_opts, text, usedstyles, inline_delim = '', cache = None, styledefs = True):
+    snippet = None
+    if cache is not None:
+        key = cache.key(opts, text)
+        snippet = cache.get(key)
+    if snippet is None:
+        snippet = highlight_snippet(opts, text)
+        if snippet is None:
+            return ""
+        if cache is not None:
+            cache.put(key, snippet)
+    write_snippet(outfile, n, opts, extra_opts, snippet, usedstyles,
+                  inline_delim, styledefs)
+
+
+def highlight_all(blocks, cache, jobs):
+    r"""
+    Highlight the snippets of ``blocks`` using a pool of ``jobs``
+    processes.
 
-    m = re.match(r'\\begin\{Verbatim}(.*)\n([\s\S]*?)\n\\end\{Verbatim}(\s*)\Z',
-                 x)
-    if m:
-        linenos = get_bool_opt(opts, 'linenos', False)
-        linenostart = abs(get_int_opt(opts, 'linenostart', 1))
-        linenostep = abs(get_int_opt(opts, 'linenostep', 1))
-        lines0 = m.group(2).split('\n')
-        numbers = []
-        lines = []
-        counter = linenostart
-        for line in lines0:
-            line = re.sub(r'^ ', r'\\makebox[0pt]{\\phantom{Xy}} ', line)
-            line = re.sub(r' ', '~', line)
-            if linenos:
-                if (counter - linenostart) % linenostep == 0:
-                    line = r'\pygmented@lineno@do{' + str(counter) + '}' + line
-                    numbers.append(str(counter))
-                counter = counter + 1
-            lines.append(line)
-        if inline_delim:
-            outfile.write(INLINE_SNIPPET_TEMPLATE %
-                dict(number    = n,
-                     style     = stylename,
-                     options   = extra_opts,
-                     body      = '\\newline\n'.join(lines)))
+    Return the list of highlighted snippets, in the order of ``blocks``.
+    Snippets found in ``cache`` and repeated snippets are highlighted
+    only once, by the parent process.
+    """
+    keys = [SnippetCache.key(opts, text) for n, opts, text, inline_delim in blocks]
+    done = {}
+    todo = OrderedDict()
+    for key, (n, opts, text, inline_delim) in zip(keys, blocks):
+        if key in done or key in todo:
+            continue
+        snippet = cache.get(key) if cache is not None else None
+        if snippet is None:
+            todo[key] = (opts, text)
         else:
-            if linenos:
-                template = DISPLAY_LINENOS_SNIPPET_TEMPLATE
-            else:
-                template = DISPLAY_SNIPPET_TEMPLATE
-            outfile.write(template %
-                dict(number      = n,
-                     style       = stylename,
-                     options     = extra_opts,
-                     linenosep   = opts['linenosep'],
-                     linenumbers = ','.join(numbers),
-                     body        = '\\newline\n'.join(lines)))
+            done[key] = snippet
+
+    if todo:
+        work = list(todo.values())
+        with ProcessPoolExecutor(jobs) as executor:
+            results = executor.map(_highlight_job, work,
+                                   chunksize = max(1, len(work) // (4 * jobs)))
+            for key, snippet in zip(todo, results):
+                done[key] = snippet
+                if cache is not None and snippet is not None:
+                    cache.put(key, snippet)
 
+    return [done[key] for key in keys]
+
+
+def _highlight_job(job):
+    opts, text = job
+    return highlight_snippet(opts, text)
 
 
 def parse_opts(basedic, opts):
@@ -337,24 +629,19 @@ def parse_opts(basedic, opts):
 
 
 
-_re_display = re.compile(
-    r'^<@@pygmented@display@(\d+)\n(.*)\n([\s\S]*?)\n>@@pygmented@display@\1$',
-    re.MULTILINE)
+_re_begin = re.compile(r'<@@pygmented@(display|inline|input)@(\d+)\Z')
 
-_re_inline = re.compile(
-    r'^<@@pygmented@inline@(\d+)\n(.*)\n([\s\S]*?)\n>@@pygmented@inline@\1$',
-    re.MULTILINE)
+def scan(lines):
+    r"""
+    Iterate over the snippets read from ``lines``.
 
-_re_input = re.compile(
-    r'^<@@pygmented@input@(\d+)\n(.*)\n([\s\S]*?)\n>@@pygmented@input@\1$',
-    re.MULTILINE)
+    ``lines`` is an iterable of lines, each one ending with a newline
+    except maybe the last one. The lines are consumed incrementally, so
+    only the current snippet is kept in memory.
 
-def convert(code, outfile, outencoding):
-    """
-    Convert ``code``
+    Yield ``(number, opts, text, inline_delim)`` for each snippet, reading
+    the contents of input snippets from their files.
     """
-    outfile.write(GENERIC_DEFINITIONS_1)
-
     opts = { 'lang'      : 'c',
              'sty'       : 'default',
              'linenosep' : '0pt',
@@ -362,64 +649,151 @@ def convert(code, outfile, outencoding):
              'encoding'  : 'guess',
            }
 
-    usedstyles = [ ]
-    styledefs = ''
-
-    pos = 0
+    lines = iter(lines)
 
-    while pos < len(code):
-        if code[pos].isspace():
-            pos = pos + 1
+    for line in lines:
+        if line.isspace():
             continue
 
-        m = _re_inline.match(code, pos)
-        if m:
-            pyg(outfile,
-                outencoding,
-                m.group(1),
-                parse_opts(opts.copy(), m.group(2)),
-                '',
-                m.group(3),
-                usedstyles,
-                True)
-            pos = m.end()
-            continue
-
-        m = _re_display.match(code, pos)
-        if m:
-            pyg(outfile,
-                outencoding,
-                m.group(1),
-                parse_opts(opts.copy(), m.group(2)),
-                '',
-                m.group(3),
-                usedstyles)
-            pos = m.end()
-            continue
+        m = _re_begin.match(_chomp(line))
+        if not m:
+            break
+        kind, n = m.groups()
+        end = '>@@pygmented@' + kind + '@' + n
+
+        options = next(lines, None)
+        if options is None:
+            break
+
+        body = []
+        for line in lines:
+            line = _chomp(line)
+            if line == end and body:
+                break
+            body.append(line)
+        else:
+            break
+        text = '\n'.join(body)
 
-        m = _re_input.match(code, pos)
-        if m:
-            opts_new = parse_opts(opts, m.group(2))
+        if kind == 'inline':
+            yield n, parse_opts(opts.copy(), _chomp(options)), text, True
+        elif kind == 'display':
+            yield n, parse_opts(opts.copy(), _chomp(options)), text, ''
+        else:
+            opts_new = parse_opts(opts, _chomp(options))
             try:
-                filecontents, inencoding = read_input(m.group(3), opts_new['encoding'])
+                filecontents, inencoding = read_input(text, opts_new['encoding'])
             except Exception as err:
                 print('Error: cannot read input file: ', err, file=sys.stderr)
             else:
-                pyg(outfile,
-                    outencoding,
-                    m.group(1),
-                    opts_new,
-                    "",
-                    filecontents,
-                    usedstyles)
-            pos = m.end()
-            continue
+                yield n, opts_new, filecontents, ''
+        continue
+    else:
+        return
+
+    sys.stderr.write('Error: invalid input file contents: ignoring')
+
+def _iter_lines(text):
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start) + 1 or len(text)
+        yield text[start:end]
+        start = end
 
-        sys.stderr.write('Error: invalid input file contents: ignoring')
-        break
+def _chomp(line):
+    if line.endswith('\n'):
+        return line[:-1]
+    return line
+
+def convert(code, outfile, outencoding, cache = None, jobs = 1, stylefile = None):
+    """
+    Convert ``code``, a string or an iterable of lines such as the
+    object returned by ``open_input()``.
+
+    If ``stylefile`` is given, the style definitions are written to it by
+    ``write_style_file()`` and ``outfile`` just inputs it.
+    """
+    if isinstance(code, str):
+        code = _iter_lines(code)
+
+    outfile.write(GENERIC_DEFINITIONS_1)
+
+    usedstyles = [ ]
+    styledefs = stylefile is None
+
+    if stylefile is not None:
+        outfile.write('\\input{%s}%%\n' % stylefile.replace(os.sep, '/'))
+
+    if jobs > 1:
+        blocks = list(scan(code))
+        snippets = highlight_all(blocks, cache, jobs)
+        for (n, opts, text, inline_delim), snippet in zip(blocks, snippets):
+            if snippet is not None:
+                write_snippet(outfile, n, opts, '', snippet, usedstyles,
+                              inline_delim, styledefs)
+    else:
+        for n, opts, text, inline_delim in scan(code):
+            pyg(outfile, outencoding, n, opts, '', text, usedstyles,
+                inline_delim, cache, styledefs)
 
     outfile.write(GENERIC_DEFINITIONS_2)
 
+    if stylefile is not None:
+        write_style_file(stylefile, usedstyles)
+
+_re_style_def = re.compile(r'^\\def\\PYstyle(\S+?)\{%$', re.MULTILINE)
+
+def write_style_file(filename, stylenames):
+    r"""
+    Write the definitions of the styles ``stylenames`` to ``filename``.
+
+    Styles already defined in the file are kept, so that several documents
+    can share it. The file is left untouched if its contents do not
+    change.
+    """
+    try:
+        with open(filename, encoding='utf-8') as f:
+            old = f.read()
+    except OSError:
+        old = None
+    else:
+        stylenames = set(stylenames).union(_re_style_def.findall(old))
+
+    update_file(filename,
+                ''.join([STYLE_FILE_HEADER] +
+                        [_registry.style_defs(name) for name in sorted(stylenames)]),
+                'utf-8')
+
+def update_file(filename, text, encoding = None):
+    r"""
+    Replace the contents of ``filename`` by ``text``.
+
+    The text is written to a temporary file that is then renamed over
+    ``filename``, so readers never see a partially written file. Nothing
+    is written if the file already has this contents, which preserves
+    its modification time and spares latexmk a needless recompilation.
+
+    Return whether the file was written.
+    """
+    try:
+        with open(filename, encoding=encoding) as f:
+            if f.read() == text:
+                return False
+    except (OSError, UnicodeError):
+        pass
+    tmpfn = filename + '.tmp'
+    try:
+        with open(tmpfn, 'w', encoding=encoding) as f:
+            f.write(text)
+        os.replace(tmpfn, filename)
+    except:
+        try:
+            os.remove(tmpfn)
+        except OSError:
+            pass
+        raise
+    return True
+
 def read_input(filename, encoding):
     with open(filename, 'rb') as infp:
         code = infp.read()
@@ -431,9 +805,142 @@ def read_input(filename, encoding):
 
     return code, encoding
 
+def open_input(filename, encoding = 'guess'):
+    r"""
+    Open ``filename`` for reading its lines incrementally.
+
+    Return an iterator over the decoded lines and the encoding. When
+    guessing, the encodings tried by ``guess_decode()`` are checked against
+    the whole file, a chunk at a time, before any line is returned.
+    """
+    infp = open(filename, 'rb')
+    try:
+        if not encoding or encoding == 'guess':
+            encoding = _guess_encoding(infp)
+            infp.seek(0)
+        else:
+            codecs.lookup(encoding)
+    except:
+        infp.close()
+        raise
+    return _decode_lines(infp, encoding), encoding
+
+def _guess_encoding(infp):
+    encodings = ['utf-8']
+    try:
+        import locale
+        encodings.append(locale.getpreferredencoding())
+    except Exception:
+        pass
+    for encoding in encodings:
+        infp.seek(0)
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            for chunk in iter(lambda: infp.read(1 << 16), b''):
+                decoder.decode(chunk)
+            decoder.decode(b'', True)
+        except (UnicodeDecodeError, LookupError):
+            continue
+        return encoding
+    return 'latin1'
+
+def _decode_lines(infp, encoding):
+    # Split on b'\n' only, as the snippet markers are newline delimited.
+    with infp:
+        for line in infp:
+            yield line.decode(encoding)
+
+
+def default_socket():
+    return os.environ.get('PYGMENTEX_SOCKET') or \
+        os.path.join(tempfile.gettempdir(), 'pygmentex-%s.sock' % getpass.getuser())
+
+# Command line options of main(), and those a server request must not
+# have: -D in a request would start a server inside the server.
+OPTIONS = 'e:o:c:Cj:s:DhV'
+SERVER_ONLY_OPTIONS = ('-D',)
+
+def server_only_options(args):
+    """Return the options of ``args`` that only the command line takes."""
+    try:
+        popts, args = getopt.getopt(list(args), OPTIONS)
+    except (getopt.GetoptError, TypeError):
+        # main() reports the error
+        return []
+    return [opt for opt, arg in popts if opt in SERVER_ONLY_OPTIONS]
+
+def serve(address):
+    r"""
+    Serve conversion requests on the Unix socket ``address``.
+
+    Each request is a line with a JSON object holding the command line
+    arguments and the working directory of a client; the reply is a line
+    with a JSON object holding the exit status and the output of
+    ``main()``. Requests are handled one at a time by this process, so the
+    Pygments modules are imported, and the lexers, formatters and style
+    definitions built, only once. A request with a server-only option
+    (``-D``) gets a usage error.
+    """
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                request = json.loads(self.rfile.readline().decode('utf-8'))
+                args, cwd = request['args'], request['cwd']
+            except (ValueError, KeyError, TypeError):
+                return
+            out, err = StringIO(), StringIO()
+            rejected = server_only_options(args)
+            if rejected:
+                err.write('Error: %s cannot be sent to the server\n' % ' '.join(rejected))
+                err.write(USAGE % (('pygmentex',) * 3))
+                reply = dict(status=2, stdout='', stderr=err.getvalue())
+                self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+                return
+            oldcwd = os.getcwd()
+            try:
+                with redirect_stdout(out), redirect_stderr(err):
+                    os.chdir(cwd)
+                    status = main(['pygmentex'] + list(args))
+            except Exception as exc:
+                err.write('Error: %s\n' % exc)
+                status = 1
+            finally:
+                os.chdir(oldcwd)
+            reply = dict(status=status, stdout=out.getvalue(), stderr=err.getvalue())
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print('Error: server mode needs Unix domain sockets', file=sys.stderr)
+        return 1
+
+    try:
+        os.remove(address)
+    except OSError:
+        pass
+    oldmask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(address, Handler)
+    finally:
+        os.umask(oldmask)
+    print('PygmenTeX server listening on %s' % address, file=sys.stderr)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        with server:
+            server.serve_forever()
+    finally:
+        try:
+            os.remove(address)
+        except OSError:
+            pass
+    return 0
+
 
 USAGE = """\
-Usage: %s [-o <output file name>] <input file name>
+Usage: %s [-o <output file name>] [-c <cache file name> | -C] [-j <jobs>]
+          [-s <style file name>] <input file name>
+       %s -D [<socket file name>]
        %s -h | -V
 
 The input file should consist of a sequence of source code snippets, as
@@ -444,13 +951,34 @@ highlighted code snippet is written to the output file.
 It also writes to the output file a set of LaTeX macro definitions the
 Pygments styles that are used in the code snippets.
 
-If no output file name is given, use `<input file name>.pygmented`.
+If no output file name is given, use `<input file name>.pygmented`. The
+output file is replaced only once all the snippets are processed, and
+only if its contents change.
 
 The -e option enables escaping to LaTex. Text delimited by the <left>
 and <right> characters is read as LaTeX code and typeset accordingly. It
 has no effect in string literals. It has no effect in comments if
 `texcomments` or `mathescape` is set.
 
+Highlighted snippets are kept in a cache file, so that snippets that did
+not change since the previous run are not highlighted again. The -c
+option names the cache file (default: `<input file root>.pygcache`). The
+-C option disables the cache.
+
+The -s option writes the definitions of the Pygments styles to the given
+file, which is input by the output file, instead of to the output file
+itself. Styles already defined in the style file are kept, so several
+documents can share the same style file.
+
+The -j option highlights the snippets using a pool of <jobs> processes.
+The output is the same as with a single process.
+
+The -D option starts a server that keeps running and converts the files
+sent by `pygmentex_client.py`, which takes the same options as this
+command, through the given Unix socket (default: $PYGMENTEX_SOCKET or
+`pygmentex-<uid>.sock` in the temporary directory). This saves the
+start-up time of Python and Pygments on each LaTeX run.
+
 The -h option prints this help.
 
 The -V option prints the package version.
@@ -461,10 +989,10 @@ def main(args = sys.argv):
     """
     Main command line entry point.
     """
-    usage = USAGE % ((args[0],) * 2)
+    usage = USAGE % ((args[0],) * 3)
 
     try:
-        popts, args = getopt.getopt(args[1:], 'e:o:hV')
+        popts, args = getopt.getopt(args[1:], OPTIONS)
     except getopt.GetoptError as err:
         sys.stderr.write(usage)
         return 2
@@ -483,28 +1011,57 @@ def main(args = sys.argv):
     if opts.pop('-V', None) is not None:
         print('PygmenTeX version %s, (c) 2020 by José Romildo.' % __version__)
         return 0
+
+    if opts.pop('-D', None) is not None:
+        if len(args) > 1:
+            sys.stderr.write(usage)
+            return 2
+        return serve(args[0] if args else default_socket())
  
     if len(args) != 1:
         sys.stderr.write(usage)
         return 2
     infn = args[0]
+
+    try:
+        jobs = int(opts.pop('-j', 1))
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        sys.stderr.write(usage)
+        return 2
+
     try:
-        code, inencoding = read_input(infn, "guess")
+        code, inencoding = open_input(infn, "guess")
     except Exception as err:
         print('Error: cannot read input file: ', err, file=sys.stderr)
         return 1
 
+    root, ext = splitext(infn)
     outfn = opts.pop('-o', None)
     if not outfn:
-        root, ext = splitext(infn)
         outfn = root + '.pygmented'
+    cache = None
+    if opts.pop('-C', None) is None:
+        cache = SnippetCache(opts.pop('-c', None) or root + '.pygcache')
+        cache.load()
+        _registry.styledefs = cache.styledefs
+
+    outfile = StringIO()
+    convert(code, outfile, inencoding, cache, jobs, opts.pop('-s', None))
+
     try:
-        outfile = open(outfn, 'w')
+        update_file(outfn, outfile.getvalue())
     except Exception as err:
-        print('Error: cannot open output file: ', err, file=sys.stderr)
+        print('Error: cannot write output file: ', err, file=sys.stderr)
         return 1
 
-    convert(code, outfile, inencoding)
+    if cache is not None:
+        try:
+            cache.save()
+        except Exception as err:
+            print('Error: cannot write cache file: ', err, file=sys.stderr)
+        sys.stderr.write(cache.stats())
 
     return 0
 
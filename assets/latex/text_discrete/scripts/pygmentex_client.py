@@ -0,0 +1,86 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    PygmenTeX client
+    ~~~~~~~~~~~~~~~~
+
+    Thin client for the PygmenTeX server started with ``pygmentex.py -D``.
+
+    It takes the same arguments as ``pygmentex.py``, forwards them to the
+    server together with the working directory, and prints the reply. It
+    only imports modules of the standard library, so it starts quickly.
+    If no server is listening, the conversion is done by this process.
+    The server-only option ``-D`` is refused.
+"""
+
+import os
+import sys
+import json
+import getopt
+import socket
+import getpass
+import tempfile
+
+
+# Keep in sync with pygmentex.OPTIONS and pygmentex.SERVER_ONLY_OPTIONS.
+OPTIONS = 'e:o:c:Cj:s:DhV'
+SERVER_ONLY_OPTIONS = ('-D',)
+
+
+def default_socket():
+    # Keep in sync with pygmentex.default_socket().
+    return os.environ.get('PYGMENTEX_SOCKET') or \
+        os.path.join(tempfile.gettempdir(), 'pygmentex-%s.sock' % getpass.getuser())
+
+
+def request(address, args):
+    """
+    Send ``args`` to the server at ``address`` and return its reply.
+
+    Raise ``OSError`` if the server cannot be reached.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(address)
+        message = dict(args=args, cwd=os.getcwd())
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise OSError('no reply from server')
+    return json.loads(line.decode('utf-8'))
+
+
+def main(args = sys.argv):
+    try:
+        popts, rest = getopt.getopt(args[1:], OPTIONS)
+    except getopt.GetoptError:
+        # the server, or pygmentex.main(), prints the usage
+        popts = []
+    rejected = [opt for opt, arg in popts if opt in SERVER_ONLY_OPTIONS]
+    if rejected:
+        print('Error: the client does not take %s; start the server with pygmentex.py -D'
+              % ' '.join(rejected), file=sys.stderr)
+        return 2
+
+    if hasattr(socket, 'AF_UNIX'):
+        try:
+            reply = request(default_socket(), args[1:])
+        except OSError:
+            pass
+        else:
+            sys.stdout.write(reply['stdout'])
+            sys.stderr.write(reply['stderr'])
+            return reply['status']
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import pygmentex
+    return pygmentex.main(args)
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv))
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -5,7 +5,8 @@ Converts from main-container layout to main-layout with sidebar
 """
 
 import os
-import re
+
+from rules import MAIN_CONTENT_OPEN, report
 
 def add_sidebar_to_720201(file_path):
     """Add sidebar structure to 720201 file"""
@@ -64,11 +65,9 @@ def add_sidebar_to_720201(file_path):
         <main class="content-area">'''
     
     # Replace main-container with sidebar structure
-    pattern = r'    <!-- Main Content -->\s*<main class="main-container">'
-    replacement = sidebar_html
+    content, found = MAIN_CONTENT_OPEN.subn(sidebar_html, content)
     
-    if re.search(pattern, content):
-        content = re.sub(pattern, replacement, content)
+    if found:
         
         # Also need to close the div.main-layout at the end
         # Find the closing </body> and add closing div before it
@@ -153,11 +152,9 @@ def add_sidebar_to_725103(file_path):
         <main class="content-area">'''
     
     # Replace main-container with sidebar structure
-    pattern = r'    <!-- Main Content -->\s*<main class="main-container">'
-    replacement = sidebar_html
+    content, found = MAIN_CONTENT_OPEN.subn(sidebar_html, content)
     
-    if re.search(pattern, content):
-        content = re.sub(pattern, replacement, content)
+    if found:
         
         # Also need to close the div.main-layout at the end
         # Find the closing </body> and add closing div before it
@@ -204,6 +201,7 @@ def main():
     print(f"\n{'='*60}")
     print(f"✅ Successfully updated: {success_count}/{len(files_to_process)} files")
     print(f"{'='*60}\n")
+    report()
 
 if __name__ == "__main__":
     main()
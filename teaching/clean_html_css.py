@@ -1,7 +1,7 @@
 """
 Clean HTML teaching pages - Remove embedded CSS, keep only page-specific styles
 """
-import re
+from rules import GTAG_STYLE, report
 
 def clean_html_file(file_path, page_specific_css=""):
     """Remove embedded CSS and add common-styles.css link"""
@@ -22,9 +22,7 @@ def clean_html_file(file_path, page_specific_css=""):
         print("⚠️  File already references common-styles.css")
     
     # Find the </script> tag for gtag, then find the <style> and </style> tags
-    # Pattern: Find from gtag </script> to </style>
-    pattern = r"(gtag\('config', 'G-9VT36QFMKJ'\);\s*</script>)\s*(<style>.*?</style>)"
-    
+    # Rule: from gtag </script> to </style>
     replacement = r"""\1
 
     <!-- Common Styles for Teaching Pages -->
@@ -36,7 +34,7 @@ def clean_html_file(file_path, page_specific_css=""):
     </style>"""
     
     # Apply replacement
-    new_content = re.sub(pattern, replacement, content, flags=re.DOTALL)
+    new_content = GTAG_STYLE.sub(replacement, content)
     
     if new_content == content:
         print("⚠️  No changes made (pattern not found)")
@@ -103,6 +101,7 @@ def main():
     print("2. Check that sidebar appears on all pages")
     print("3. Test responsive design (resize browser)")
     print("4. Verify all navigation links work")
+    report()
 
 if __name__ == '__main__':
     main()
@@ -5,7 +5,8 @@ Makes 720201 and 725103 follow the same pattern as 819605
 """
 
 import os
-import re
+
+from rules import ANALYTICS_SCRIPT, SCRIPT_BEFORE_LAYOUT_END, SIDEBAR_MENU, STYLE_BLOCK, report
 
 def convert_720201():
     """Convert 720201 to match 819605 template"""
@@ -20,12 +21,7 @@ def convert_720201():
         content = f.read()
     
     # 1. Fix the <style> section to match 819605 (empty style tags)
-    content = re.sub(
-        r'<style>.*?</style>',
-        '<style>\n\n    </style>',
-        content,
-        flags=re.DOTALL
-    )
+    content = STYLE_BLOCK.sub(r'\1\n\n    \3', content)
     
     # 2. Update sidebar menu items to include onclick handlers
     sidebar_menu = '''            <h3 class="sidebar-title">📑 เนื้อหารายวิชา</h3>
@@ -64,12 +60,7 @@ def convert_720201():
                 </a></li>
             </ul>'''
     
-    content = re.sub(
-        r'<h3 class="sidebar-title">.*?</ul>',
-        sidebar_menu,
-        content,
-        flags=re.DOTALL
-    )
+    content = SIDEBAR_MENU.sub(sidebar_menu, content)
     
     # 3. Replace JavaScript section with 819605 template
     js_section = '''    <!-- JavaScript -->
@@ -154,12 +145,7 @@ def convert_720201():
     </script>'''
     
     # Find and replace the entire script section
-    content = re.sub(
-        r'<!-- Simple Analytics Script -->.*?</script>',
-        js_section,
-        content,
-        flags=re.DOTALL
-    )
+    content = ANALYTICS_SCRIPT.sub(js_section, content)
     
     # Write back
     with open(file_path, 'w', encoding='utf-8') as f:
@@ -180,12 +166,7 @@ def convert_725103():
         content = f.read()
     
     # 1. Fix the <style> section to match 819605 (empty style tags)
-    content = re.sub(
-        r'<style>.*?</style>',
-        '<style>\n\n    </style>',
-        content,
-        flags=re.DOTALL
-    )
+    content = STYLE_BLOCK.sub(r'\1\n\n    \3', content)
     
     # 2. Update sidebar menu items to include onclick handlers
     sidebar_menu = '''            <h3 class="sidebar-title">📑 เนื้อหารายวิชา</h3>
@@ -236,12 +217,7 @@ def convert_725103():
                 </a></li>
             </ul>'''
     
-    content = re.sub(
-        r'<h3 class="sidebar-title">.*?</ul>',
-        sidebar_menu,
-        content,
-        flags=re.DOTALL
-    )
+    content = SIDEBAR_MENU.sub(sidebar_menu, content)
     
     # 3. Replace JavaScript section with 819605 template (keeping 725103 page key)
     js_section = '''    <!-- JavaScript -->
@@ -369,12 +345,8 @@ def convert_725103():
     </script>'''
     
     # Find and replace the entire script section - need to handle the longer script in 725103
-    content = re.sub(
-        r'<script>.*?</script>\s*</div> <!-- End main-layout -->',
-        js_section + '\n    </div> <!-- End main-layout -->',
-        content,
-        flags=re.DOTALL
-    )
+    content = SCRIPT_BEFORE_LAYOUT_END.sub(js_section + '\n    </div> <!-- End main-layout -->',
+                                          content)
     
     # Write back
     with open(file_path, 'w', encoding='utf-8') as f:
@@ -402,6 +374,7 @@ def main():
     print("6. ✅ Added smooth scroll handling")
     print("\nAll pages now follow 819605 template structure!")
     print("="*60 + "\n")
+    report()
 
 if __name__ == "__main__":
     main()
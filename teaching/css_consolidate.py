@@ -0,0 +1,736 @@
+#!/usr/bin/env python3
+"""
+Consolidate the embedded <style> blocks of the site into shared stylesheets
+
+Parses every <style> block of the teaching pages, index.html, resume.html
+and teaching.html and indexes their rules (selector, or at-rule, with the
+@media it is in and its normalized declarations). Moving a rule must not
+change which rules apply to any page, in which order, so the rules of a
+page are modeled as its cascade: the rules of the stylesheets it links
+and of its <style> blocks in document order, where only the last copy of
+an identical rule counts. Then, for the teaching pages whose <style>
+blocks come right after their common-styles.css link (or, for the pages
+without it, with no other stylesheet between them):
+
+- rules that common-styles.css already has, in the same order, are
+  dropped from the page,
+- rules that every page linking common-styles.css (processed or not) has
+  first among its own rules, in the same order, are moved ("hoisted") to
+  the end of common-styles.css, if at least --min-pages pages have them,
+- rules that at least --min-pages pages have first among their own rules
+  go to a group stylesheet, shared-styles-<hash>.css, that only those
+  pages link (right after common-styles.css or before their <style>),
+- every other rule stays inline.
+
+A rule with an identical copy further down the page is dropped from any
+page. A comment right before a dropped rule goes with it.
+
+Pages that do not link common-styles.css only lose such repeated rules
+or rules moved to group stylesheets. --link adds the link to the teaching
+pages, as html_pipeline.py (common-css-link) does, but only where it does
+not change the rules that apply. Before writing, the cascade of every
+page is computed again from the new pages and stylesheets; any page whose
+rules would change stops the run. The pages and the stylesheets are
+written all or nothing; page_journal.py --undo reverts the run.
+
+Usage:
+    python css_consolidate.py [-n] [--link] [--variants] [-m pages] [page.html ...]
+    python css_consolidate.py --index
+"""
+
+import argparse
+import glob
+import os
+import sys
+import textwrap
+
+import rules
+from html_pipeline import COMMON_CSS_LINK, TEACHING_DIR, content_hash, is_variant, parse, parse_fragment
+from page_journal import JournalError, commit, undo_hunks
+from rules import CSS_COMBINATOR, CSS_COMMENT, CSS_DECLARATION, CSS_LEADING, CSS_TOKEN
+
+SITE_DIR = os.path.dirname(TEACHING_DIR)
+COMMON_CSS = os.path.join(TEACHING_DIR, 'common-styles.css')
+COMMON_DIR = os.path.dirname(COMMON_CSS)
+
+# Site pages indexed along with the teaching pages
+SITE_PAGES = ['index.html', 'resume.html', 'teaching.html']
+
+# At-rules whose block holds rules rather than declarations
+GROUPING_AT_RULES = ('@media', '@supports', '@container', '@layer', '@document')
+
+HOISTED_HEADER = '''
+/* ============================================================
+   SHARED PAGE STYLES (hoisted by css_consolidate.py)
+   ============================================================ */
+'''
+
+GROUP_HEADER = '''/* ============================================================
+   STYLES SHARED BY %s
+   (moved out of the pages by css_consolidate.py)
+   ============================================================ */
+'''
+
+
+# ============================================================
+# Stylesheet parsing
+# ============================================================
+
+class CSSRule:
+    """A rule of a stylesheet.
+
+    Style rules and at-rules with a block (@keyframes, @font-face) have a
+    ``prelude`` (selector) and a ``body``, both normalized; grouping
+    at-rules (@media, @supports) have ``children`` instead. Statements
+    such as @import have no body. ``lead`` is where the rule's leading
+    whitespace and comments begin, ``start`` where the rule itself begins
+    and ``end`` where it ends, as offsets in the parsed text.
+    """
+
+    __slots__ = ('context', 'prelude', 'body', 'children', 'lead', 'start', 'end')
+
+    def __init__(self, context, prelude, lead, start, end, body=None, children=None):
+        self.context = context
+        self.prelude = prelude
+        self.body = body
+        self.children = children
+        self.lead = lead
+        self.start = start
+        self.end = end
+
+    def key(self):
+        """Return what makes two rules the same, or None for statements."""
+        if self.body is None:
+            return None
+        return (self.context, self.prelude, self.body)
+
+    def selector(self):
+        return (self.context, self.prelude)
+
+    def leaves(self):
+        """Iterate over this rule, or the rules below a grouping rule."""
+        if self.children is None:
+            yield self
+            return
+        for child in self.children:
+            yield from child.leaves()
+
+
+def _normalize_prelude(text):
+    text = ' '.join(CSS_COMMENT.sub('', text).split())
+    return CSS_COMBINATOR.sub(r'\1', text)
+
+
+def _normalize_body(text):
+    text = CSS_COMMENT.sub('', text)
+    if '{' in text:
+        # @keyframes and the like: only the spacing is not significant
+        return ' '.join(text.split())
+    declarations = []
+    for declaration in CSS_DECLARATION.findall(text):
+        name, colon, value = declaration.partition(':')
+        if colon:
+            declarations.append('%s:%s' % (name.strip().lower(), ' '.join(value.split())))
+    return ';'.join(declarations)
+
+
+class _CSSParser:
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = CSS_TOKEN.finditer(text)
+        self.i = 0
+
+    def _next(self):
+        token = self.tokens[self.i] if self.i < len(self.tokens) else None
+        self.i += 1
+        return token
+
+    def _close(self, token):
+        """Skip past the '}' matching the '{' ``token``; return it."""
+        depth = 1
+        while depth:
+            token = self._next()
+            if token is None:
+                return None
+            if token.group() == '{':
+                depth += 1
+            elif token.group() == '}':
+                depth -= 1
+        return token
+
+    def block(self, pos, context):
+        """Parse rules from ``pos`` up to an unmatched '}' or the end."""
+        items = []
+        while True:
+            leading = CSS_LEADING.match(self.text, pos)
+            lead, start = pos, leading.end()
+            parens = 0
+            while True:
+                token = self._next()
+                if token is None or token.start() < start:
+                    if token is None:
+                        return items, len(self.text)
+                    # a leading comment
+                    continue
+                char = token.group()
+                if char == '(':
+                    parens += 1
+                elif char == ')':
+                    parens = max(parens - 1, 0)
+                elif char in '{;}' and not parens:
+                    break
+            if char == '}':
+                # end of the enclosing block; its '}' is the caller's
+                self.i -= 1
+                return items, token.start()
+            prelude = _normalize_prelude(self.text[start:token.start()])
+            if char == ';':
+                items.append(CSSRule(context, prelude, lead, start, token.end()))
+            elif prelude.lower().startswith(GROUPING_AT_RULES):
+                children, close = self.block(token.end(), context + (prelude,))
+                end_token = self._next()
+                end = end_token.end() if end_token is not None else len(self.text)
+                items.append(CSSRule(context, prelude, lead, start, end, children=children))
+            else:
+                end_token = self._close(token)
+                if end_token is None:
+                    return items, len(self.text)
+                body = _normalize_body(self.text[token.end():end_token.start()])
+                items.append(CSSRule(context, prelude, lead, start, end_token.end(), body=body))
+            pos = items[-1].end
+
+
+def parse_stylesheet(text):
+    """Parse a stylesheet into a list of CSSRules (top-level rules only)."""
+    return _CSSParser(text).block(0, ())[0]
+
+
+def leaves(items):
+    for item in items:
+        yield from item.leaves()
+
+
+def remove_rules(text, items, dropped):
+    """Return ``text`` without the rules of ``dropped`` (a set of ids)."""
+    spans = []
+
+    def collect(item):
+        if item.children is None:
+            if id(item) in dropped:
+                spans.append((item.lead, item.end))
+            return
+        if all(id(leaf) in dropped for leaf in item.leaves()):
+            spans.append((item.lead, item.end))
+            return
+        for child in item.children:
+            collect(child)
+
+    for item in items:
+        collect(item)
+    parts = []
+    pos = 0
+    for start, end in sorted(spans):
+        parts.append(text[pos:start])
+        pos = end
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
+def rule_source(text, item):
+    """Return the text of a rule, dedented."""
+    column = item.start - (text.rfind('\n', 0, item.start) + 1)
+    return textwrap.dedent(' ' * column + text[item.start:item.end])
+
+
+# ============================================================
+# Pages
+# ============================================================
+
+def rule_token(leaf, media=''):
+    """
+    Return what identifies a rule in the cascade, ``(context, prelude,
+    body)``: its key, with the @media of the <style> or <link> it comes
+    from, or a body of None for statements such as @import.
+    """
+    context = ('@media ' + media,) + leaf.context if media else leaf.context
+    return (context, leaf.prelude, leaf.body)
+
+
+def stylesheet_tokens(text):
+    return [rule_token(leaf) for leaf in leaves(parse_stylesheet(text))]
+
+
+def effective(sequence):
+    """
+    Return the rules of ``sequence`` with only the last copy of each. An
+    identical rule further down overrides all an earlier copy sets, so two
+    sequences with the same effective rules style a page the same way.
+    """
+    last = {token: i for i, token in enumerate(sequence)}
+    return [token for i, token in enumerate(sequence) if last[token] == i]
+
+
+def _media(node):
+    media = ' '.join((node.get('media') or '').split())
+    return '' if media.lower() == 'all' else media
+
+
+def _is_stylesheet(node):
+    return node.tag == 'link' and 'stylesheet' in (node.get('rel') or '')
+
+
+def sheet_path(page_path, link):
+    """Return the local stylesheet a <link> loads, or None."""
+    href = link.get('href') or ''
+    if not href or '://' in href or href.startswith('//'):
+        return None
+    return os.path.normpath(os.path.join(os.path.dirname(page_path), href))
+
+
+def cascade(path, tree, sheets):
+    """
+    Return the rules that style the page at ``path``, parsed as ``tree``,
+    in cascade order: those of its <style> blocks and of the stylesheets
+    of ``sheets`` (path -> rule tokens) it links, in document order. Any
+    other stylesheet is one opaque entry, so that a rule moved across it
+    shows.
+    """
+    sequence = []
+    for node in tree.iter():
+        media = _media(node)
+        if node.tag == 'style':
+            items = parse_stylesheet(node.inner_html())
+            sequence.extend(rule_token(leaf, media) for leaf in leaves(items))
+        elif _is_stylesheet(node):
+            sheet = sheet_path(path, node)
+            if sheet in sheets:
+                sequence.extend((('@media ' + media,) + context if media else context, prelude, body)
+                                for context, prelude, body in sheets[sheet])
+            else:
+                sequence.append(('link', sheet or node.get('href'), media))
+    return sequence
+
+
+# ============================================================
+# Pages
+# ============================================================
+
+class StyledPage:
+    """A page with its <style> blocks parsed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.relpath(path, SITE_DIR)
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            self.source = f.read()
+        self.tree = parse(self.source)
+        self.styles = []
+        for style in self.tree.find_all('style'):
+            css = style.inner_html()
+            self.styles.append((style, css, parse_stylesheet(css)))
+        self.dropped = {}
+        self.new_link = False
+        self.not_linked = False
+        self.groups = []
+
+    def leaves(self):
+        """Iterate over ``(style index, rule)`` in document order."""
+        for i, (style, css, items) in enumerate(self.styles):
+            for leaf in leaves(items):
+                yield i, leaf
+
+    def link_node(self, stylesheet):
+        for link in self.tree.find_all('link'):
+            if _is_stylesheet(link) and sheet_path(self.path, link) == stylesheet:
+                return link
+        return None
+
+    def links(self, stylesheet):
+        return self.link_node(stylesheet) is not None
+
+    def movable(self):
+        """
+        Return whether the rules of the page can move to stylesheets
+        linked where its <style> blocks begin (or right after its
+        common-styles.css link) without crossing another stylesheet: the
+        page is next to common-styles.css, its <style> blocks follow each
+        other with no stylesheet between them (but its common-styles.css
+        link just before), and neither they nor that link have a media
+        attribute or hold a statement such as @import.
+        """
+        if os.path.dirname(self.path) != COMMON_DIR or not self.styles:
+            return False
+        if any(leaf.body is None for i, leaf in self.leaves()):
+            return False
+        nodes = [node for node in self.tree.iter() if node.tag == 'style' or _is_stylesheet(node)]
+        anchor = self.link_node(COMMON_CSS)
+        if anchor is None:
+            head = self.tree.find('head')
+            anchor = head.find('style') if head is not None else None
+            if anchor is not self.styles[0][0]:
+                return False
+        last = nodes.index(self.styles[-1][0])
+        span = nodes[nodes.index(anchor):last + 1]
+        return all(node.tag == 'style' for node in span[1:]) and \
+            not any(_media(node) for node in span)
+
+    def css_bytes(self):
+        return sum(len(css.encode('utf-8')) for style, css, items in self.styles)
+
+    def html(self):
+        """Serialize the page without its dropped rules."""
+        for style, css, items in self.styles:
+            new_css = remove_rules(css, items, self.dropped)
+            if new_css != css:
+                style.children = parse_fragment(new_css)
+        return self.tree.inner_html()
+
+    def add_link(self):
+        head = self.tree.find('head')
+        style = head.find('style') if head is not None else None
+        if style is None:
+            return False
+        index = style.index()
+        for offset, node in enumerate(parse_fragment(COMMON_CSS_LINK)):
+            style.parent.insert(index + offset, node)
+        return True
+
+    def add_group_links(self, hrefs):
+        """Link ``hrefs`` right after common-styles.css, or before the first <style>."""
+        markup = '\n    '.join('<link rel="stylesheet" href="%s">' % href for href in hrefs)
+        anchor = self.link_node(COMMON_CSS)
+        if anchor is not None:
+            nodes, index = parse_fragment('\n    ' + markup), anchor.index() + 1
+        else:
+            anchor = self.styles[0][0]
+            nodes, index = parse_fragment(markup + '\n\n    '), anchor.index()
+        for offset, node in enumerate(nodes):
+            anchor.parent.insert(index + offset, node)
+
+
+def default_pages(variants=False):
+    paths = [path for path in sorted(glob.glob(os.path.join(TEACHING_DIR, '*.html')))
+             if variants or not is_variant(os.path.basename(path))]
+    for name in SITE_PAGES:
+        path = os.path.join(SITE_DIR, name)
+        if os.path.exists(path):
+            paths.append(path)
+    return paths
+
+
+def build_index(pages):
+    """Return rule key -> names of the pages that have the rule."""
+    index = {}
+    for page in pages:
+        for i, leaf in page.leaves():
+            if leaf.key() is not None:
+                names = index.setdefault(leaf.key(), [])
+                if page.name not in names:
+                    names.append(page.name)
+    return index
+
+
+def own_rules(base, inline):
+    """
+    Return the rules a page's <style> blocks must supply, in cascade
+    order, when the rules ``base`` come before them: the shortest tail of
+    the page's effective rules such that ``base`` alone gives the rest of
+    them, in the same order.
+    """
+    rules = effective(base + inline)
+    base = effective(base)
+    for k in range(len(rules), -1, -1):
+        tail = set(rules[k:])
+        if rules[:k] == [token for token in base if token not in tail]:
+            return rules[k:]
+    return rules
+
+
+def _common_prefix(sequences):
+    prefix = []
+    for tokens in zip(*sequences):
+        if any(token != tokens[0] for token in tokens):
+            break
+        prefix.append(tokens[0])
+    return prefix
+
+
+def _styles_unchanged(page, sheets_before, sheets_after):
+    before = effective(cascade(page.path, page.tree, sheets_before))
+    return before == effective(cascade(page.path, page.tree, sheets_after))
+
+
+def consolidate(pages, common_css, min_pages=2, link=False, others=()):
+    """
+    Decide which rules each page drops, which move to common-styles.css
+    and which to group stylesheets.
+
+    ``others`` are the pages not processed that link common-styles.css;
+    they must not change either. Return ``(hoisted, groups)``: the rules
+    appended to common-styles.css and the group stylesheets as ``(path,
+    rules, pages)``, rules given as ``(css, rule)``. Each page's
+    ``dropped`` maps the ids of its dropped rules to the reason
+    ('common', 'hoisted', 'shared' or 'repeated'), and ``groups`` are the
+    group stylesheets it links, in order.
+    """
+    common = stylesheet_tokens(common_css)
+    tails = {}
+    sources = {}
+    for page in pages:
+        last = {}
+        for i, leaf in page.leaves():
+            last[rule_token(leaf)] = (page.styles[i][1], leaf)
+        sources[page] = last
+        if not page.movable():
+            continue
+        inline = [rule_token(leaf) for i, leaf in page.leaves()]
+        if page.links(COMMON_CSS):
+            tails[page] = own_rules(common, inline)
+        elif link and effective(common + inline) == effective(inline):
+            page.new_link = True
+            tails[page] = own_rules(common, inline)
+        else:
+            page.not_linked = link
+            tails[page] = own_rules([], inline)
+
+    # Rules move to common-styles.css only when every page that links it
+    # has them first among its own rules, in the same order.
+    linkers = [page for page in pages if page.links(COMMON_CSS) or page.new_link]
+    movers = [page for page in linkers if page in tails]
+    hoisted = _common_prefix([tails[page] for page in movers]) if len(movers) >= min_pages else []
+    fixed = [page for page in linkers if page not in tails] + list(others)
+    while hoisted and not all(_styles_unchanged(page, {COMMON_CSS: common},
+                                                {COMMON_CSS: common + hoisted})
+                              for page in fixed):
+        hoisted.pop()
+    for page in movers:
+        tails[page] = tails[page][len(hoisted):]
+
+    # The other rules that start the own rules of several pages go to a
+    # stylesheet only those pages link.
+    groups = []
+    free = [page for page in pages if tails.get(page)]
+    while True:
+        by_first = {}
+        for page in free:
+            by_first.setdefault(tails[page][0], []).append(page)
+        group = max(by_first.values(), key=len, default=[])
+        if len(group) < min_pages:
+            break
+        shared = _common_prefix([tails[page] for page in group])
+        pairs = [sources[group[0]][token] for token in shared]
+        path = os.path.join(COMMON_DIR, 'shared-styles-%s.css'
+                            % content_hash(group_css(pairs, group))[:8])
+        groups.append((path, pairs, group))
+        for page in group:
+            page.groups.append(path)
+            tails[page] = tails[page][len(shared):]
+        free = [page for page in free if tails[page]]
+
+    hoisted_keys = set(hoisted)
+    shared_keys = {}
+    for path, pairs, group in groups:
+        for page in group:
+            shared_keys.setdefault(page, set()).update(rule_token(leaf) for css, leaf in pairs)
+    for page in pages:
+        kept = set(tails.get(page, ()))
+        last = {}
+        for n, (i, leaf) in enumerate(page.leaves()):
+            last[rule_token(leaf)] = n
+        for n, (i, leaf) in enumerate(page.leaves()):
+            token = rule_token(leaf)
+            if last[token] != n:
+                # an identical rule further down overrides this one
+                if leaf.body is not None:
+                    page.dropped[id(leaf)] = 'repeated'
+            elif page not in tails or token in kept:
+                continue
+            elif token in hoisted_keys and (page.links(COMMON_CSS) or page.new_link):
+                page.dropped[id(leaf)] = 'hoisted'
+            elif token in shared_keys.get(page, ()):
+                page.dropped[id(leaf)] = 'shared'
+            else:
+                page.dropped[id(leaf)] = 'common'
+    hoisted = [sources[movers[0]][token] for token in hoisted]
+    return hoisted, groups
+
+
+def restyled_pages(pages, outputs, sheets_before, sheets_after):
+    """
+    Return the pages whose effective rules differ once ``outputs`` (path
+    -> new page) and the stylesheets of ``sheets_after`` are written.
+    """
+    restyled = []
+    for page in pages:
+        before = effective(cascade(page.path, parse(page.source), sheets_before))
+        after = cascade(page.path, parse(outputs.get(page.path, page.source)), sheets_after)
+        if before != effective(after):
+            restyled.append(page)
+    return restyled
+
+
+def format_rules(pairs):
+    """
+    Render rules given as ``(css, rule)``, each wrapped in its @media
+    blocks. Consecutive rules of the same @media share one block.
+    """
+    runs = []
+    for css, leaf in pairs:
+        if runs and runs[-1][0] == leaf.context:
+            runs[-1][1].append(rule_source(css, leaf))
+        else:
+            runs.append((leaf.context, [rule_source(css, leaf)]))
+    parts = []
+    for context, sources in runs:
+        source = '\n\n'.join(sources)
+        for prelude in reversed(context):
+            source = '%s {\n%s\n}' % (prelude, textwrap.indent(source, '    '))
+        parts.append('\n' + source + '\n')
+    return ''.join(parts)
+
+
+def hoisted_css(hoisted):
+    return HOISTED_HEADER + format_rules(hoisted)
+
+
+def group_css(pairs, pages):
+    names = ', '.join(os.path.basename(page.path) for page in pages)
+    return GROUP_HEADER % names + format_rules(pairs)
+
+
+def print_report(pages, outputs, common_before, common_after, groups):
+    print(f"\n{'='*60}")
+    print("CSS consolidation")
+    print(f"{'='*60}")
+    saved = 0
+    for page in pages:
+        reasons = list(page.dropped.values())
+        total = sum(1 for leaf in page.leaves())
+        before = len(page.source.encode('utf-8'))
+        after = len(outputs.get(page.path, page.source).encode('utf-8'))
+        saved += before - after
+        mark = '✅' if after != before else '  '
+        role = 'linked' if page.links(COMMON_CSS) or page.new_link else 'inline'
+        print(f"{mark} {page.name:<38} {role:<6} {total:>4} rule(s): "
+              f"{reasons.count('common'):>3} in common, {reasons.count('hoisted'):>3} hoisted, "
+              f"{reasons.count('shared'):>3} shared, {reasons.count('repeated'):>3} repeated")
+        print(f"   {'':<38} {before:,} → {after:,} bytes ({after - before:+,}), "
+              f"inline CSS {page.css_bytes():,} bytes")
+        if page.groups:
+            print(f"   {'':<38} links {', '.join(map(os.path.basename, page.groups))}")
+        if page.not_linked:
+            print(f"   {'':<38} ⚠️ not linked: common-styles.css would change its styles")
+    growth = len(common_after.encode('utf-8')) - len(common_before.encode('utf-8'))
+    print(f"📦 Pages: {saved:,} bytes saved")
+    print(f"📦 common-styles.css: {len(common_before.encode('utf-8')):,} → "
+          f"{len(common_after.encode('utf-8')):,} bytes ({growth:+,})")
+    for path, pairs, group in groups:
+        size = len(group_css(pairs, group).encode('utf-8'))
+        print(f"📦 {os.path.basename(path)}: {len(pairs)} rule(s), {size:,} bytes, "
+              f"for {len(group)} page(s)")
+
+
+def print_index(index):
+    shared = sorted(((names, key) for key, names in index.items() if len(names) > 1),
+                    key=lambda item: (-len(item[0]), item[1]))
+    for names, (context, prelude, body) in shared:
+        where = ' '.join(context + (prelude,))
+        print(f"{len(names):>3} {where[:70]}")
+        print(f"    {', '.join(names)}")
+    print(f"\n📒 {len(index)} distinct rule(s), {len(shared)} in more than one page")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Move the CSS rules the pages share into shared stylesheets')
+    parser.add_argument('files', nargs='*',
+                        help='pages to consolidate (default: teaching pages and site pages)')
+    parser.add_argument('-m', '--min-pages', type=int, default=2,
+                        help='hoist rules found in at least this many pages (default: 2)')
+    parser.add_argument('--link', action='store_true',
+                        help='link common-styles.css from the teaching pages that do not '
+                             '(where that changes no rule)')
+    parser.add_argument('--variants', action='store_true',
+                        help='also process the -demo, -backup and -protected copies')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='report the changes without writing anything')
+    parser.add_argument('--index', action='store_true',
+                        help='print the rules found in more than one page and exit')
+    args = parser.parse_args()
+
+    pages = []
+    for path in args.files or default_pages(args.variants):
+        if os.path.exists(path):
+            pages.append(StyledPage(os.path.abspath(path)))
+        else:
+            print(f"⚠️ File not found: {path}")
+
+    if args.index:
+        print_index(build_index(pages))
+        return 0
+
+    with open(COMMON_CSS, 'r', encoding='utf-8', newline='') as f:
+        common_before = f.read()
+    processed = {page.path for page in pages}
+    others = [page for page in map(StyledPage, default_pages(variants=True))
+              if page.path not in processed and page.links(COMMON_CSS)]
+    hoisted, groups = consolidate(pages, common_before, args.min_pages, args.link, others)
+    common_after = common_before
+    if hoisted:
+        common_after = common_before.rstrip('\n') + '\n' + hoisted_css(hoisted)
+
+    outputs = {}
+    for page in pages:
+        if page.new_link:
+            page.add_link()
+        if page.groups:
+            page.add_group_links([os.path.relpath(path, os.path.dirname(page.path))
+                                  for path in page.groups])
+        if page.dropped or page.new_link or page.groups:
+            html = page.html()
+            if html != page.source:
+                outputs[page.path] = html
+    print_report(pages, outputs, common_before, common_after, groups)
+    rules.report()
+
+    changes = [(page.path, content_hash(page.source), outputs[page.path],
+                undo_hunks(page.source, outputs[page.path]))
+               for page in pages if page.path in outputs]
+    if common_after != common_before:
+        changes.append((COMMON_CSS, content_hash(common_before), common_after,
+                        undo_hunks(common_before, common_after)))
+    sheets_before = {COMMON_CSS: stylesheet_tokens(common_before)}
+    sheets_after = {COMMON_CSS: stylesheet_tokens(common_after)}
+    for path, pairs, group in groups:
+        text = group_css(pairs, group)
+        sheets_after[path] = stylesheet_tokens(text)
+        if not os.path.exists(path):
+            changes.append((path, None, text, []))
+
+    # The pages must end up styled by the same rules, in the same order.
+    restyled = restyled_pages(pages + others, outputs, sheets_before, sheets_after)
+    if restyled:
+        print(f"\n❌ The rules that apply would change in: "
+              f"{', '.join(page.name for page in restyled)}")
+        print("No file was written")
+        return 1
+
+    print(f"\n{'='*60}")
+    if args.dry_run:
+        print(f"✅ Done (dry run, {len(changes)} file(s) would change)")
+        return 0
+    try:
+        journal = commit(changes)
+    except (JournalError, OSError) as e:
+        print(f"❌ {e}")
+        print("No file was written")
+        return 1
+    print(f"✅ Done, {len(changes)} file(s) written")
+    if journal:
+        print(f"📒 Undo with: python page_journal.py --undo ({os.path.basename(journal)})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Per-page CSS bundles with unused rules pruned and critical CSS inlined
+
+The course pages load common-styles.css (and some copies the stylesheets
+of ../assets/css) whole. For each page this build stage:
+
+- matches the selectors of its local stylesheets against the page,
+- writes the rules that can match to one bundle, css/<page>.css,
+- inlines in the head the rules that style what is on screen first: the
+  header (top nav, hero), the sidebar and the active section, with their
+  ancestors and siblings,
+- replaces the stylesheet links with the inline critical CSS and a link
+  to the bundle that does not block rendering.
+
+Pages are written to the output directory (default: _site/ at the root
+of the site) under their path in the site, e.g. _site/teaching/<page>.html;
+the source pages are not modified. The pruning is conservative: pseudo-classes
+are assumed to match, and the class, id and attribute names that appear
+in the strings of the page scripts are assumed to be set at run time (the
+'active' section, the 'collapsed' sidebar), so their rules are kept.
+
+Usage:
+    python css_prune.py [-o output] [--variants] [page.html ...]
+"""
+
+import argparse
+import os
+import sys
+
+import rules
+from css_consolidate import SITE_DIR, format_rules, leaves, parse_stylesheet, remove_rules
+from html_pipeline import discover_pages, parse, parse_fragment
+from rules import CSS_SOURCE_MAP, CSS_URL, JS_STRING, NAME, SELECTOR_PART
+
+OUTPUT_DIR = os.path.join(SITE_DIR, '_site')
+
+# Roots of what is on screen when the page opens
+CRITICAL_ROOTS = ['header', '.top-nav', '.hero', '.sidebar', '.content-section.active']
+
+BUNDLE_LINK = '''<link rel="preload" href="%(href)s" as="style" onload="this.onload=null;this.rel='stylesheet'">
+    <noscript><link rel="stylesheet" href="%(href)s"></noscript>'''
+
+
+# ============================================================
+# Selector matching
+# ============================================================
+
+class Compound:
+    """The simple selectors of a compound selector (pseudo-classes are ignored)."""
+
+    __slots__ = ('tag', 'ids', 'classes', 'attrs')
+
+    def __init__(self):
+        self.tag = None
+        self.ids = []
+        self.classes = []
+        self.attrs = []
+
+    def names(self):
+        return self.ids + self.classes + ([self.tag] if self.tag else [])
+
+
+def _unescape(name):
+    return name.replace('\\', '')
+
+
+def split_selectors(prelude):
+    """Split a selector list on its top-level commas."""
+    selectors = []
+    depth = 0
+    start = 0
+    quote = None
+    for i, char in enumerate(prelude):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and not depth:
+            selectors.append(prelude[start:i].strip())
+            start = i + 1
+    selectors.append(prelude[start:].strip())
+    return [selector for selector in selectors if selector]
+
+
+# selector -> list of (combinator, Compound), or None if not understood
+_selectors = {}
+
+
+def parse_selector(selector):
+    """
+    Parse a complex selector into ``[(combinator, Compound), ...]``, left
+    to right; the combinator of the first compound is None. Return None
+    for selectors that are not understood (they are kept).
+    """
+    if selector in _selectors:
+        return _selectors[selector]
+    parts = []
+    combinator = None
+    compound = None
+    pos = 0
+    while pos < len(selector):
+        m = SELECTOR_PART.match(selector, pos)
+        if m is None or m.end() == pos:
+            parts = None
+            break
+        pos = m.end()
+        if m.group('comb') is not None:
+            if compound is not None:
+                parts.append((combinator, compound))
+                compound = None
+                combinator = m.group('comb').strip() or ' '
+            continue
+        if compound is None:
+            compound = Compound()
+        if m.group('tag'):
+            compound.tag = None if m.group('tag') == '*' else m.group('tag').lower()
+        elif m.group('id'):
+            compound.ids.append(_unescape(m.group('id')))
+        elif m.group('cls'):
+            compound.classes.append(_unescape(m.group('cls')))
+        elif m.group('attr'):
+            value = m.group('value')
+            if value and value[0] in '"\'':
+                value = value[1:-1]
+            compound.attrs.append((m.group('attr').lower(), m.group('op'), value))
+    if parts is not None:
+        if compound is not None:
+            parts.append((combinator, compound))
+        elif parts:
+            # dangling combinator
+            parts = None
+    if not parts:
+        parts = None
+    _selectors[selector] = parts
+    return parts
+
+
+def _attr_matches(value, op, expected):
+    if op is None:
+        return True
+    if op == '=':
+        return value == expected
+    if op == '~=':
+        return expected in value.split()
+    if op == '|=':
+        return value == expected or value.startswith(expected + '-')
+    if op == '^=':
+        return value.startswith(expected)
+    if op == '$=':
+        return value.endswith(expected)
+    return expected in value
+
+
+class PageDOM:
+    """The elements of a page, indexed for selector matching."""
+
+    def __init__(self, tree, dynamic=frozenset()):
+        self.elements = list(tree.iter())
+        self.dynamic = dynamic
+        self.by_tag = {}
+        self.by_id = {}
+        self.by_class = {}
+        for node in self.elements:
+            self.by_tag.setdefault(node.tag, []).append(node)
+            if node.get('id'):
+                self.by_id.setdefault(node.get('id'), []).append(node)
+            for cls in node.classes():
+                self.by_class.setdefault(cls, []).append(node)
+
+    def candidates(self, compound):
+        for name in compound.ids:
+            if name not in self.dynamic:
+                return self.by_id.get(name, [])
+        for name in compound.classes:
+            if name not in self.dynamic:
+                return self.by_class.get(name, [])
+        if compound.tag:
+            return self.by_tag.get(compound.tag, [])
+        return self.elements
+
+    def compound_matches(self, node, compound):
+        if compound.tag and node.tag != compound.tag:
+            return False
+        dynamic = self.dynamic
+        for name in compound.ids:
+            if node.get('id') != name and name not in dynamic:
+                return False
+        if compound.classes:
+            classes = node.classes()
+            for name in compound.classes:
+                if name not in classes and name not in dynamic:
+                    return False
+        for name, op, expected in compound.attrs:
+            if name in dynamic:
+                continue
+            value = node.get(name)
+            if value is None or not _attr_matches(value, op, expected):
+                return False
+        return True
+
+    def matches(self, node, parts, i=None):
+        """Return whether ``node`` matches ``parts[:i + 1]``."""
+        i = len(parts) - 1 if i is None else i
+        combinator, compound = parts[i]
+        if not self.compound_matches(node, compound):
+            return False
+        if i == 0:
+            return True
+        if combinator in (' ', '>'):
+            parent = node.parent
+            while parent is not None and parent.tag != '#document':
+                if self.matches(parent, parts, i - 1):
+                    return True
+                if combinator == '>':
+                    return False
+                parent = parent.parent
+            return False
+        siblings = [child for child in node.parent.children if child.tag is not None]
+        before = siblings[:next(j for j, child in enumerate(siblings) if child is node)]
+        if combinator == '+':
+            before = before[-1:]
+        return any(self.matches(sibling, parts, i - 1) for sibling in before)
+
+    def selector_used(self, parts, within=None):
+        """
+        Return whether the selector can match an element (of ``within``,
+        a set of element ids, if given).
+        """
+        if parts is None:
+            return True
+        for node in self.candidates(parts[-1][1]):
+            if within is not None and id(node) not in within:
+                continue
+            if self.matches(node, parts):
+                return True
+        if within is not None:
+            return False
+        # elements built by the scripts
+        names = parts[-1][1].names()
+        return bool(names) and all(name in self.dynamic for name in names)
+
+    def rule_used(self, leaf, within=None):
+        if leaf.body is None or leaf.prelude.startswith('@'):
+            # @import, @font-face, @keyframes, ...
+            return within is None
+        return any(self.selector_used(parse_selector(selector), within)
+                   for selector in split_selectors(leaf.prelude))
+
+
+def script_names(tree, read):
+    """
+    Return the names in the string literals of the page scripts (inline,
+    local src= and on* attributes): the classes, ids and attributes the
+    scripts may set.
+    """
+    sources = []
+    for node in tree.iter():
+        if node.tag == 'script':
+            src = node.get('src')
+            if src is None:
+                sources.append(node.inner_html())
+            else:
+                sources.append(read(src) or '')
+        for name, value in node.attrs:
+            if name.startswith('on') and value:
+                sources.append(value)
+    names = set()
+    for source in sources:
+        for literal in JS_STRING.findall(source):
+            names.update(NAME.findall(literal))
+    return frozenset(names)
+
+
+def critical_elements(tree, dom):
+    """
+    Return the ids of the elements shown first: the subtrees of the
+    CRITICAL_ROOTS, their ancestors and the siblings of both (so that the
+    rules hiding the other sections are critical too).
+    """
+    critical = set()
+    roots = []
+    for selector in CRITICAL_ROOTS:
+        parts = parse_selector(selector)
+        roots.extend(node for node in dom.candidates(parts[-1][1]) if dom.matches(node, parts))
+    for root in roots:
+        critical.add(id(root))
+        critical.update(id(node) for node in root.iter())
+        node = root
+        while node.parent is not None and node.parent.tag != '#document':
+            critical.update(id(child) for child in node.parent.children if child.tag is not None)
+            node = node.parent
+            critical.add(id(node))
+    return critical
+
+
+# ============================================================
+# Bundles
+# ============================================================
+
+def _is_local(href):
+    return bool(href) and '://' not in href and not href.startswith(('//', 'data:', '#', '/'))
+
+
+def rebase_urls(css, from_dir, to_dir):
+    """
+    Rewrite the relative url()s of ``css`` from ``from_dir`` to ``to_dir``
+    (directories of the site: the output keeps the layout of the site).
+    """
+    def rebase(m):
+        url = m.group(2).strip()
+        if not _is_local(url):
+            return m.group()
+        target = os.path.normpath(os.path.join(from_dir, url))
+        return 'url(%s%s%s)' % (m.group(1), os.path.relpath(target, to_dir).replace(os.sep, '/'),
+                                m.group(1))
+    return CSS_URL.sub(rebase, css)
+
+
+# stylesheet path -> (mtime, text, parsed rules)
+_stylesheets = {}
+
+
+def load_stylesheet(path):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _stylesheets.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = CSS_SOURCE_MAP.sub('', f.read())
+        cached = _stylesheets[path] = (mtime, text, parse_stylesheet(text))
+    return cached[1], cached[2]
+
+
+def _read_local(directory):
+    def read(href):
+        path = os.path.join(directory, href.split('?')[0])
+        if not _is_local(href) or not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    return read
+
+
+def build_page(path, output_dir=OUTPUT_DIR):
+    """
+    Build the pruned bundle and the critical CSS of one page and write the
+    page and its bundle under ``output_dir``. Return a report dict, or None
+    if the page links no local stylesheet (or cannot be bundled).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        source = f.read()
+    tree = parse(source)
+
+    links = []
+    for link in tree.find_all('link'):
+        href = link.get('href') or ''
+        if 'stylesheet' in (link.get('rel') or '').split() and _is_local(href):
+            css_path = os.path.normpath(os.path.join(directory, href.split('?')[0]))
+            if os.path.isfile(css_path):
+                links.append((link, css_path))
+    if not links:
+        return None
+    # Bundling moves every linked rule to the first link; an inline <style>
+    # between the links would then come after rules it came before.
+    first, last = links[0][0], links[-1][0]
+    between = False
+    for node in tree.iter():
+        if node is last:
+            break
+        if node is first:
+            between = True
+        elif between and node.tag == 'style':
+            print(f"⚠️ {os.path.basename(path)}: <style> between the stylesheet links, not bundled")
+            return None
+
+    dom = PageDOM(tree, script_names(tree, _read_local(directory)))
+    strict = PageDOM(tree)
+    critical = critical_elements(tree, strict)
+
+    site_path = os.path.relpath(os.path.abspath(path), SITE_DIR)
+    out_page = os.path.join(output_dir, site_path)
+    out_dir = os.path.dirname(out_page)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    bundle_href = 'css/%s.css' % stem
+    out_bundle = os.path.join(out_dir, 'css', stem + '.css')
+
+    report = {'file': site_path, 'stylesheets': len(links), 'rules': 0, 'kept': 0,
+              'critical_rules': 0, 'bytes_before': 0}
+    bundle = []
+    critical_parts = []
+    for link, css_path in links:
+        text, items = load_stylesheet(css_path)
+        css_dir = os.path.dirname(css_path)
+        report['bytes_before'] += os.path.getsize(css_path)
+        unused = set()
+        critical_rules = []
+        for leaf in leaves(items):
+            report['rules'] += 1
+            if not dom.rule_used(leaf):
+                unused.add(id(leaf))
+                continue
+            report['kept'] += 1
+            if strict.rule_used(leaf, critical):
+                critical_rules.append((text, leaf))
+        pruned = remove_rules(text, items, unused).strip('\n')
+        bundle.append('/* %s */\n%s\n' % (os.path.relpath(css_path, SITE_DIR).replace(os.sep, '/'),
+                                          rebase_urls(pruned, css_dir, os.path.join(directory, 'css'))))
+        report['critical_rules'] += len(critical_rules)
+        critical_parts.append(rebase_urls(format_rules(critical_rules), css_dir, directory))
+    critical_css = ''.join(critical_parts).strip('\n')
+    bundle_css = '\n'.join(bundle)
+
+    indent = '\n    '
+    markup = '<style>\n%s\n    </style>%s%s' % (
+        '\n'.join('        ' + line if line else '' for line in critical_css.split('\n')),
+        indent, BUNDLE_LINK % {'href': bundle_href})
+    first.replace_with(*parse_fragment(markup))
+    for link, css_path in links[1:]:
+        previous = link.parent.children[link.index() - 1] if link.index() else None
+        link.replace_with()
+        if previous is not None and previous.tag is None and not previous.text.strip():
+            previous.replace_with()
+    html = tree.inner_html()
+
+    os.makedirs(os.path.dirname(out_bundle), exist_ok=True)
+    with open(out_bundle, 'w', encoding='utf-8', newline='') as f:
+        f.write(bundle_css)
+    with open(out_page, 'w', encoding='utf-8', newline='') as f:
+        f.write(html)
+    report['bytes_bundle'] = len(bundle_css.encode('utf-8'))
+    report['bytes_critical'] = len(critical_css.encode('utf-8'))
+    return report
+
+
+def print_report(reports):
+    print(f"\n{'='*60}")
+    print("CSS pruning")
+    print(f"{'='*60}")
+    for report in reports:
+        print(f"✅ {report['file']}: {report['stylesheets']} stylesheet(s), "
+              f"{report['kept']}/{report['rules']} rule(s) used, {report['critical_rules']} critical")
+        print(f"   {report['bytes_before']:,} → {report['bytes_bundle']:,} bytes bundled "
+              f"({report['bytes_bundle'] - report['bytes_before']:+,}), "
+              f"{report['bytes_critical']:,} bytes inlined")
+    before = sum(report['bytes_before'] for report in reports)
+    after = sum(report['bytes_bundle'] for report in reports)
+    print(f"📦 Stylesheets: {before:,} → {after:,} bytes ({after - before:+,})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write per-page CSS bundles with unused rules pruned and critical CSS inlined')
+    parser.add_argument('files', nargs='*',
+                        help='pages to build (default: every course page)')
+    parser.add_argument('-o', '--output', default=OUTPUT_DIR,
+                        help='output directory (default: %(default)s)')
+    parser.add_argument('--variants', action='store_true',
+                        help='also build the -demo, -backup and -protected copies')
+    args = parser.parse_args()
+
+    reports = []
+    for path in args.files or discover_pages(variants=args.variants):
+        if not os.path.exists(path):
+            print(f"⚠️ File not found: {path}")
+            continue
+        report = build_page(path, os.path.abspath(args.output))
+        if report is None:
+            print(f"⏭️  {os.path.basename(path)}: not built")
+            continue
+        reports.append(report)
+    print_report(reports)
+    rules.report()
+    print(f"\n{'='*60}")
+    print(f"✅ Done, {len(reports)} page(s) written to {args.output}")
+    print(f"{'='*60}\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Quiz Batch Grader
+Grades exported quiz submissions offline, the way Code.gs grades them
+
+Loads a quiz JSON once, turns its answer key into arrays and grades all
+submissions in one pass over a submissions x answers matrix with NumPy.
+Each result has the fields and values of gradeSubmission() in
+google-apps-script/Code.gs (correctCount, incorrectCount, score,
+totalPoints, percentage, grade, gradedAnswers):
+- answers find their question by questionId as Code.gs's object keys do,
+  so 1 and "1" are the same question; unknown questions are not counted,
+- totalPoints only counts the questions the student answered,
+- multiple-choice answers are compared with parseInt() semantics; text
+  answers are left for manual grading (counted incorrect),
+- the percentage is rounded like Math.round() and graded with the same
+  thresholds as calculateGrade(),
+- sums run in answer order, so non-integer points total the same.
+Submissions that validateSubmission() would reject are reported with its
+error message instead of being graded.
+
+Usage:
+    python grade_quiz.py <quiz-file.json> <submissions.json|.jsonl> [-o results.jsonl] [--summary FILE]
+
+Submissions are doPost payloads ({studentId, studentName, quizId,
+answers: [{questionId, userAnswer}, ...]}), as a JSON array or one per
+line. Results are written one per line, in the order of the submissions.
+"""
+
+import argparse
+import decimal
+import json
+import math
+import re
+import sys
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Must match CONFIG.GRADING in google-apps-script/Code.gs
+GRADING = (('A', 80), ('B', 70), ('C', 60), ('D', 50))
+
+# validateSubmission() student ID pattern (JS \d is ASCII only)
+STUDENT_ID = re.compile(r'[0-9]{10}')
+# Longest prefix parseFloat() reads, after leading whitespace
+JS_FLOAT = re.compile(r'[+-]?(?:Infinity|(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)')
+
+# Number.MAX_SAFE_INTEGER
+SAFE_INTEGER = 2 ** 53 - 1
+
+# Key of a missing questionId (String(undefined))
+UNDEFINED = 'undefined'
+
+
+# ============================================================
+# JavaScript semantics
+# ============================================================
+
+def _js_number_string(value):
+    """Number.prototype.toString() of a float"""
+    if value != value:
+        return 'NaN'
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if value == 0:
+        return '0'
+    sign, digits, exponent = decimal.Decimal(repr(value)).normalize().as_tuple()
+    digits = ''.join(map(str, digits))
+    k = len(digits)
+    n = exponent + k  # position of the decimal point
+    text = (
+        digits + '0' * (n - k) if k <= n <= 21 else
+        digits[:n] + '.' + digits[n:] if 0 < n <= 21 else
+        '0.' + '0' * -n + digits if -6 < n <= 0 else
+        digits[0] + ('.' + digits[1:] if k > 1 else '') + 'e' + ('+' if n > 0 else '-') + str(abs(n - 1))
+    )
+    return ('-' if sign else '') + text
+
+
+def js_string(value):
+    """String(value) of JavaScript, for JSON values"""
+    if type(value) is str:
+        return value
+    if type(value) is int and -SAFE_INTEGER <= value <= SAFE_INTEGER:
+        return str(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        if abs(value) < 10 ** 21:
+            return str(value)
+        try:
+            return _js_number_string(float(value))
+        except OverflowError:
+            return 'Infinity' if value > 0 else '-Infinity'
+    if isinstance(value, float):
+        return _js_number_string(value)
+    if isinstance(value, list):
+        return ','.join('' if item is None else js_string(item) for item in value)
+    return '[object Object]'
+
+
+def js_truthy(value):
+    if value is None or value is False:
+        return False
+    if isinstance(value, (int, float)):
+        return value == value and value != 0
+    if isinstance(value, str):
+        return value != ''
+    return True
+
+
+def js_parse_int(value):
+    """parseInt(value) without a radix, as a float like JS numbers; NaN when none"""
+    s = js_string(value).lstrip()
+    sign = 1
+    if s[:1] in ('+', '-'):
+        sign = -1 if s[0] == '-' else 1
+        s = s[1:]
+    base, digits = 10, '0123456789'
+    if s[:2] in ('0x', '0X'):
+        base, digits, s = 16, '0123456789abcdefABCDEF', s[2:]
+    n = 0
+    while n < len(s) and s[n] in digits:
+        n += 1
+    if n == 0:
+        return math.nan
+    try:
+        return float(sign * int(s[:n], base))
+    except OverflowError:
+        return sign * math.inf
+
+
+def js_parse_float(value):
+    """parseFloat(value), or None for NaN"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) if value == value else None
+    m = JS_FLOAT.match(js_string(value).lstrip())
+    if not m:
+        return None
+    return float(m.group().replace('Infinity', 'inf'))
+
+
+def js_strict_equal(a, b):
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) \
+            and not isinstance(a, bool) and not isinstance(b, bool):
+        return a == b
+    return type(a) is type(b) and a == b
+
+
+def js_value(value):
+    """
+    A JSON value as JSON.parse() then JSON.stringify() leave it: numbers
+    become doubles written in their shortest form (integers without .0),
+    NaN and infinities null.
+    """
+    # doubles hold these exactly
+    if type(value) is int and -SAFE_INTEGER <= value <= SAFE_INTEGER:
+        return value
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer() and -SAFE_INTEGER <= value <= SAFE_INTEGER:
+        return int(value)
+    if isinstance(value, (int, float)):
+        try:
+            number = float(value)
+        except OverflowError:
+            return None
+        if number != number or math.isinf(number):
+            return None
+        text = _js_number_string(number)
+        return int(text) if text.lstrip('-').isdigit() else number
+    if isinstance(value, list):
+        return [js_value(item) for item in value]
+    if isinstance(value, dict):
+        return {name: js_value(item) for name, item in value.items()}
+    return value
+
+
+def js_round(values):
+    """Math.round() of an array: halves round up"""
+    floor = np.floor(values)
+    return np.where(values - floor >= 0.5, floor + 1, floor)
+
+
+def validate_submission(data):
+    """validateSubmission() of Code.gs: its error message, or None if valid"""
+    if not isinstance(data, dict):
+        return 'Missing student information'
+    if not js_truthy(data.get('studentId')) or not js_truthy(data.get('studentName')):
+        return 'Missing student information'
+    if not js_truthy(data.get('quizId')):
+        return 'Missing quiz ID'
+    if not isinstance(data.get('answers'), list) or len(data['answers']) == 0:
+        return 'Missing or invalid answers'
+    if not STUDENT_ID.fullmatch(js_string(data['studentId'])):
+        return 'Invalid student ID format'
+    return None
+
+
+# ============================================================
+# Grading
+# ============================================================
+
+class AnswerKey:
+    """The questions of a quiz as arrays indexed by question position
+
+    index maps the string key of a questionId to its position; like
+    Code.gs's questionMap, a repeated ID maps to its last question.
+    """
+
+    def __init__(self, quiz):
+        self.quiz_id = quiz.get('id')
+        self.questions = [q if isinstance(q, dict) else {} for q in quiz.get('questions') or []]
+        self.index = {}
+        for i, q in enumerate(self.questions):
+            self.index[js_string(q['id']) if 'id' in q else UNDEFINED] = i
+        self.points = np.array([js_parse_float(q.get('points')) or 0.0 for q in self.questions],
+                               dtype=np.float64)
+        self.multiple_choice = np.array([q.get('type') == 'multiple-choice' for q in self.questions],
+                                        dtype=bool)
+        self.answers = np.array([js_parse_int(q.get('correctAnswer')) for q in self.questions],
+                                dtype=np.float64)
+
+    def __len__(self):
+        return len(self.questions)
+
+
+def _answer_matrix(key, submissions, rows):
+    """Question positions (-1: not found) and parseInt()ed answers, row per submission"""
+    width = max(len(submissions[pos]['answers']) for pos in rows)
+    position_rows = []
+    answer_rows = []
+    index = key.index
+    nan = math.nan
+    for pos in rows:
+        submission = submissions[pos]
+        # loadQuizData() finds no questions for another quiz ID
+        same_quiz = js_strict_equal(submission['quizId'], key.quiz_id)
+        row_positions = []
+        row_answers = []
+        for answer in submission['answers']:
+            answer = answer if isinstance(answer, dict) else {}
+            i = -1
+            if same_quiz:
+                i = index.get(js_string(answer['questionId']) if 'questionId' in answer else UNDEFINED, -1)
+            row_positions.append(i)
+            if 'userAnswer' in answer:
+                value = answer['userAnswer']
+                row_answers.append(float(value) if type(value) is int and abs(value) < 1e21
+                                   else js_parse_int(value))
+            else:
+                row_answers.append(nan)
+        padding = width - len(row_positions)
+        position_rows.append(row_positions + [-1] * padding)
+        answer_rows.append(row_answers + [nan] * padding)
+    positions = np.array(position_rows, dtype=np.intp)
+    answers = np.array(answer_rows, dtype=np.float64)
+    return positions, answers
+
+
+def _graded_answers(key, submission, positions, correct, earned, points):
+    graded = []
+    for j, answer in enumerate(submission['answers']):
+        answer = answer if isinstance(answer, dict) else {}
+        entry = {}
+        if 'questionId' in answer:
+            entry['questionId'] = js_value(answer['questionId'])
+        if 'userAnswer' in answer:
+            entry['userAnswer'] = js_value(answer['userAnswer'])
+        i = positions[j]
+        if i < 0:
+            entry.update(isCorrect=False, points=0, error='Question not found')
+        else:
+            question = key.questions[i]
+            if 'correctAnswer' in question:
+                entry['correctAnswer'] = js_value(question['correctAnswer'])
+            entry.update(isCorrect=correct[j], pointsEarned=js_value(earned[j]),
+                         pointsPossible=points[i])
+        graded.append(entry)
+    return graded
+
+
+def _identity(submission):
+    return {name: submission[name] for name in ('studentId', 'studentName', 'quizId')
+            if isinstance(submission, dict) and name in submission}
+
+
+def grade_batch(key, submissions):
+    """
+    Grade submissions against an answer key
+
+    Returns (results, stats): one result per submission, in order, with
+    the gradeSubmission() fields (or 'error' for a rejected submission),
+    and per-question stats over the graded submissions.
+    """
+    results = [None] * len(submissions)
+    rows = []
+    for pos, submission in enumerate(submissions):
+        error = validate_submission(submission)
+        if error:
+            results[pos] = dict(_identity(submission), error=error)
+        else:
+            rows.append(pos)
+
+    n = len(key)
+    stats = {'answered': np.zeros(n, dtype=np.int64), 'correct': np.zeros(n, dtype=np.int64),
+             'earned': np.zeros(n, dtype=np.float64)}
+    if not rows:
+        return results, stats
+
+    positions, answers = _answer_matrix(key, submissions, rows)
+    found = positions >= 0
+    q = np.where(found, positions, 0)
+    possible = np.where(found, key.points[q] if n else 0.0, 0.0)
+    # NaN answers (not a number for parseInt) never equal, like NaN === NaN
+    correct = found & (key.multiple_choice[q] if n else False) & (answers == (key.answers[q] if n else np.nan))
+    earned = np.where(correct, possible, 0.0)
+
+    # Running sums go left to right like the JS loop, so float totals match it exactly
+    score = np.cumsum(earned, axis=1)[:, -1]
+    total = np.cumsum(possible, axis=1)[:, -1]
+    correct_count = correct.sum(axis=1)
+    incorrect_count = found.sum(axis=1) - correct_count
+    ratio = np.divide(score, total, out=np.zeros_like(score), where=total > 0) * 100
+    percentage = np.where(total > 0, js_round(ratio), 0.0)
+    grades = np.select([percentage >= threshold for _, threshold in GRADING],
+                       [grade for grade, _ in GRADING], 'F')
+
+    points = [js_value(value) for value in key.points.tolist()]
+    for r, pos in enumerate(rows):
+        submission = submissions[pos]
+        width = len(submission['answers'])
+        results[pos] = dict(
+            _identity(submission),
+            correctCount=int(correct_count[r]),
+            incorrectCount=int(incorrect_count[r]),
+            score=js_value(score[r]),
+            totalPoints=js_value(total[r]),
+            percentage=js_value(percentage[r]),
+            grade=str(grades[r]),
+            gradedAnswers=_graded_answers(key, submission, positions[r, :width].tolist(),
+                                          correct[r, :width].tolist(), earned[r, :width].tolist(), points),
+        )
+
+    if n:
+        stats['answered'] = np.bincount(positions[found], minlength=n)
+        stats['correct'] = np.bincount(positions[correct], minlength=n)
+        stats['earned'] = np.bincount(positions[found], weights=earned[found], minlength=n)
+    return results, stats
+
+
+def summarize(key, results, stats):
+    """Machine-readable summary of a batch: grade counts and per-question stats"""
+    graded = [r for r in results if 'error' not in r]
+    grades = {grade: 0 for grade, _ in GRADING}
+    grades['F'] = 0
+    for r in graded:
+        grades[r['grade']] += 1
+    questions = []
+    for i, q in enumerate(key.questions):
+        answered = int(stats['answered'][i])
+        questions.append({
+            'questionId': q.get('id'),
+            'type': q.get('type'),
+            'pointsPossible': js_value(key.points[i]),
+            'answered': answered,
+            'correct': int(stats['correct'][i]),
+            'correctRate': round(int(stats['correct'][i]) / answered, 4) if answered else None,
+            'averagePoints': round(float(stats['earned'][i]) / answered, 4) if answered else None,
+        })
+    return {
+        'quizId': key.quiz_id,
+        'submissions': len(results),
+        'graded': len(graded),
+        'rejected': len(results) - len(graded),
+        'grades': grades,
+        'meanPercentage': round(sum(r['percentage'] for r in graded) / len(graded), 2) if graded else None,
+        'questions': questions,
+    }
+
+
+# ============================================================
+# Command line
+# ============================================================
+
+def load_submissions(path):
+    """Submissions from a JSON array or JSON Lines file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def print_report(quiz_path, summary, rejected, timings):
+    print(f"\n{'='*60}")
+    print(f"Grading: {Path(quiz_path).name} ({len(summary['questions'])} questions)")
+    print('='*60)
+    print(f"📦 {summary['submissions']:,} submissions: {summary['graded']:,} graded, "
+          f"{summary['rejected']:,} rejected")
+    if summary['graded']:
+        print("📊 Grades: " + " | ".join(f"{grade} {count:,}" for grade, count in summary['grades'].items()))
+        print(f"📊 Mean percentage: {summary['meanPercentage']}")
+        print(f"\n{'Question':<12} {'Type':<16} {'Answered':>9} {'Correct':>9} {'Rate':>7}")
+        for q in summary['questions']:
+            rate = f"{q['correctRate'] * 100:.1f}%" if q['correctRate'] is not None else '-'
+            print(f"{str(q['questionId']):<12} {str(q['type']):<16} {q['answered']:>9,} {q['correct']:>9,} {rate:>7}")
+
+    if rejected:
+        print("\n⚠️  REJECTED:")
+        for result in rejected[:10]:
+            print(f"  ⚠️  {result.get('studentId', '?')}: {result['error']}")
+        if len(rejected) > 10:
+            print(f"  ... and {len(rejected) - 10:,} more")
+
+    print("\n⏱️  " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings))
+    print('='*60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Grade exported quiz submissions like Code.gs gradeSubmission')
+    parser.add_argument('quiz', help='quiz JSON file')
+    parser.add_argument('submissions', help='submissions as a JSON array or JSON Lines')
+    parser.add_argument('-o', '--output', metavar='FILE', help='write one result per line (JSON Lines)')
+    parser.add_argument('--summary', metavar='FILE', help='write grade counts and per-question stats as JSON')
+    args = parser.parse_args()
+
+    if np is None:
+        print("❌ grade_quiz.py needs NumPy: pip install numpy")
+        return 1
+
+    timings = []
+    start = time.perf_counter()
+    try:
+        with open(args.quiz, 'r', encoding='utf-8') as f:
+            key = AnswerKey(json.load(f))
+        submissions = load_submissions(args.submissions)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    timings.append(('load', time.perf_counter() - start))
+
+    start = time.perf_counter()
+    results, stats = grade_batch(key, submissions)
+    summary = summarize(key, results, stats)
+    timings.append(('grade', time.perf_counter() - start))
+
+    start = time.perf_counter()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+    timings.append(('write', time.perf_counter() - start))
+
+    print_report(args.quiz, summary, [r for r in results if 'error' in r], timings)
+    if args.output:
+        print(f"📄 Results written to {args.output}")
+    if args.summary:
+        print(f"📄 Summary written to {args.summary}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+"""
+Local Quiz Submission Server
+A SQLite stand-in for the Code.gs submission backend
+
+Accepts the same POST payload as doPost() in google-apps-script/Code.gs
+and answers with the same createResponse() JSON ({ok, message, computed,
+submissionId, timestamp}), so the quiz pages can point APP_SCRIPT_URL at
+it for a local exam or a load test. The spreadsheet sheets become tables:
+- questions (QuizData), keyed by quiz ID and position, so loading one
+  quiz is an index range scan instead of reading the whole sheet; the
+  answer key built from it is cached until the quiz is loaded again,
+- submissions (Submissions), with the same columns as the sheet,
+- log (Log), one 'Submission received' row per request and the errors.
+Grading is grade_quiz.py's, which gives gradeSubmission()'s results.
+
+The database runs in WAL mode. Rows are written by one writer thread that
+commits whatever submissions are waiting in a single transaction, and a
+request is answered once its rows are committed.
+
+Usage:
+    python quiz_server.py load [quiz-file.json ...]     # default: every quiz bank here
+    python quiz_server.py serve [--host HOST] [--port PORT]
+    python quiz_server.py bench <quiz-file.json> [--url URL] [--clients 300] [--requests 1]
+
+All commands take --db FILE (default: quiz-submissions.db next to this
+script). bench posts random answers from many clients at once to a
+running server and checks every computed result against grade_quiz.py.
+"""
+
+import argparse
+import concurrent.futures
+import fnmatch
+import hashlib
+import http.client
+import json
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from grade_quiz import AnswerKey, grade_batch, js_truthy, js_value, np, validate_submission
+
+QUIZ_DIR = Path(__file__).parent
+DEFAULT_DB = QUIZ_DIR / 'quiz-submissions.db'
+CONFIG_NAME = 'quiz-config.json'
+
+# Rows committed per transaction at most, and how long the writer waits
+# for more submissions to join a transaction
+MAX_BATCH = 500
+BATCH_WAIT = 0.002
+
+# Requests larger than this are refused before reading the body
+MAX_BODY = 8 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quizzes (
+    quiz_id TEXT PRIMARY KEY,
+    title TEXT,
+    source TEXT,
+    hash TEXT NOT NULL,
+    loaded_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    quiz_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    question_id TEXT,
+    type TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (quiz_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS submissions (
+    submission_id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    student_id,
+    student_name,
+    quiz_id,
+    quiz_title,
+    score,
+    total_points,
+    percentage,
+    grade TEXT,
+    time_used_sec,
+    tab_switch_count,
+    user_agent,
+    client_score,
+    client_grade,
+    answers TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_by_quiz ON submissions (quiz_id, student_id);
+CREATE TABLE IF NOT EXISTS log (
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    message TEXT,
+    details TEXT
+);
+"""
+
+INSERT_SUBMISSION = 'INSERT INTO submissions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+INSERT_LOG = 'INSERT INTO log VALUES (?, ?, ?, ?)'
+
+
+# ============================================================
+# Database
+# ============================================================
+
+def connect(db_path):
+    """A connection in autocommit mode; transactions are explicit"""
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # FULL syncs the WAL on every commit: an acknowledged submission
+    # survives a power cut, and batching keeps that to one sync per batch
+    conn.execute('PRAGMA synchronous=FULL')
+    return conn
+
+
+def init_db(db_path):
+    conn = connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def iso_now():
+    """new Date().toISOString()"""
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def quiz_bank_names(directory):
+    """The quiz banks in directory, without the config, the template and
+    hidden files such as validate_quiz.py's .validate-manifest.json"""
+    return sorted(n for n in (p.name for p in Path(directory).iterdir())
+                  if fnmatch.fnmatch(n, '*-*.json') and n != CONFIG_NAME
+                  and not n.startswith(('TEMPLATE', '.')))
+
+
+def load_quiz(conn, path):
+    """Replace the questions of the quiz in path; returns (quiz_id, question count)"""
+    raw = Path(path).read_bytes()
+    quiz = json.loads(raw)
+    if not isinstance(quiz, dict) or not isinstance(quiz.get('id'), str) or not quiz['id']:
+        raise ValueError('quiz has no string "id"')
+    questions = quiz.get('questions')
+    if not isinstance(questions, list):
+        raise ValueError('quiz has no "questions" array')
+    rows = [(quiz['id'], i,
+             json.dumps(q.get('id')) if isinstance(q, dict) else None,
+             q.get('type') if isinstance(q, dict) and isinstance(q.get('type'), str) else None,
+             json.dumps(q, ensure_ascii=False))
+            for i, q in enumerate(questions)]
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM questions WHERE quiz_id = ?', (quiz['id'],))
+        conn.executemany('INSERT INTO questions VALUES (?, ?, ?, ?, ?)', rows)
+        conn.execute('INSERT OR REPLACE INTO quizzes VALUES (?, ?, ?, ?, ?)',
+                     (quiz['id'], quiz.get('title') if isinstance(quiz.get('title'), str) else None,
+                      Path(path).name, hashlib.sha256(raw).hexdigest(), iso_now()))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return quiz['id'], len(rows)
+
+
+class QuizStore:
+    """Answer keys by quiz ID, read from the questions table once per quiz version"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._keys = {}
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_path)
+        return conn
+
+    def answer_key(self, quiz_id):
+        """
+        The answer key for a submission's quizId. Like loadQuizData(), a
+        quiz without questions (or an unknown one) gives an empty key, so
+        every answer is graded 'Question not found'.
+        """
+        if type(quiz_id) is not str:
+            # QuizIDs are strings; === never matches another type
+            return AnswerKey({'id': None, 'questions': []})
+        conn = self._connection()
+        row = conn.execute('SELECT hash FROM quizzes WHERE quiz_id = ?', (quiz_id,)).fetchone()
+        version = row[0] if row else None
+        cached = self._keys.get(quiz_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # One read transaction, so the questions belong to the version read
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute('SELECT hash FROM quizzes WHERE quiz_id = ?', (quiz_id,)).fetchone()
+            version = row[0] if row else None
+            questions = [json.loads(data) for (data,) in conn.execute(
+                'SELECT data FROM questions WHERE quiz_id = ? ORDER BY position', (quiz_id,))]
+        finally:
+            conn.execute('COMMIT')
+        key = AnswerKey({'id': quiz_id, 'questions': questions})
+        if version is not None:
+            self._keys[quiz_id] = (version, key)
+        return key
+
+
+class BatchWriter(threading.Thread):
+    """
+    The only writer of submissions and log rows
+
+    Requests queue their rows and wait on a future; the writer takes
+    everything queued (up to MAX_BATCH, waiting BATCH_WAIT for more) and
+    commits it in one transaction, so concurrent submissions share one
+    WAL sync instead of queueing for the write lock one by one.
+    """
+
+    def __init__(self, db_path, max_batch=MAX_BATCH, wait=BATCH_WAIT):
+        super().__init__(name='quiz-writer', daemon=True)
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.wait = wait
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.rows = 0
+
+    def save(self, submission_row, log_rows=()):
+        """Queue a submission row; the future is done once it is committed"""
+        future = concurrent.futures.Future()
+        self.queue.put((submission_row, list(log_rows), future))
+        return future
+
+    def log(self, kind, message, details=''):
+        """Queue a log row without waiting for it"""
+        self.queue.put((None, [(iso_now(), kind, message, details)], None))
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+
+    def _take(self):
+        """A batch of queued items, blocking for the first; None once closed"""
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.wait
+        while len(batch) < self.max_batch:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def run(self):
+        conn = connect(self.db_path)
+        while True:
+            batch = self._take()
+            if batch is None:
+                break
+            submissions = [row for row, _, _ in batch if row is not None]
+            logs = [row for _, rows, _ in batch for row in rows]
+            futures = [future for _, _, future in batch if future is not None]
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany(INSERT_LOG, logs)
+                    conn.executemany(INSERT_SUBMISSION, submissions)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(submissions)
+            for future in futures:
+                future.set_result(None)
+        conn.close()
+
+
+# ============================================================
+# doPost
+# ============================================================
+
+def _cell(value):
+    """A JSON value as a cell: numbers as JS reads them, objects as JSON"""
+    value = js_value(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _or(value, default):
+    """value || default"""
+    return value if js_truthy(value) else default
+
+
+def _meta(submission, *names):
+    """submission.clientMeta?.<names...>; None for undefined"""
+    value = submission.get('clientMeta')
+    for name in names:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    return value
+
+
+def _student_details(data):
+    """JSON.stringify(data.studentId) in a log cell; '' for undefined"""
+    if not isinstance(data, dict) or 'studentId' not in data:
+        return ''
+    return json.dumps(js_value(data['studentId']), ensure_ascii=False)
+
+
+def submission_row(submission_id, timestamp, submission, result):
+    """The Submissions row saveSubmission() appends"""
+    return (
+        submission_id,
+        timestamp,
+        _cell(submission['studentId']),
+        _cell(submission['studentName']),
+        _cell(submission['quizId']),
+        _cell(_or(submission.get('quizTitle'), '')),
+        result['score'],
+        result['totalPoints'],
+        result['percentage'],
+        result['grade'],
+        _cell(_or(submission.get('timeUsedSec'), 0)),
+        _cell(_or(_meta(submission, 'tabSwitchCount'), 0)),
+        _cell(_or(_meta(submission, 'userAgent'), '')),
+        _cell(_or(_meta(submission, 'clientReported', 'score'), '')),
+        _cell(_or(_meta(submission, 'clientReported', 'grade'), '')),
+        json.dumps(result['gradedAnswers'], ensure_ascii=False, separators=(',', ':')),
+    )
+
+
+def create_response(success, message, **data):
+    return dict(ok=success, message=message, **data)
+
+
+def _reject_constant(name):
+    # JSON.parse() has no NaN or Infinity
+    raise ValueError(f'Unexpected token {name[0]} in JSON')
+
+
+def handle_submission(store, writer, body):
+    """doPost(): the response for one request body"""
+    try:
+        data = json.loads(body, parse_constant=_reject_constant)
+        if data is None:
+            raise TypeError("Cannot read properties of null (reading 'studentId')")
+
+        received = [(iso_now(), 'INFO', 'Submission received', _student_details(data))]
+
+        error = validate_submission(data)
+        if error:
+            writer.save(None, received)
+            return create_response(False, error)
+
+        key = store.answer_key(data['quizId'])
+        result = grade_batch(key, [data])[0][0]
+
+        submission_id = str(uuid.uuid4())
+        try:
+            writer.save(submission_row(submission_id, iso_now(), data, result), received).result()
+        except Exception as e:
+            writer.log('ERROR', 'saveSubmission error', repr(e))
+            return create_response(False, 'Failed to save submission')
+
+        return create_response(True, 'Submission successful', computed={
+            'correct': result['correctCount'],
+            'incorrect': result['incorrectCount'],
+            'score': result['score'],
+            'totalPoints': result['totalPoints'],
+            'percentage': result['percentage'],
+            'grade': result['grade'],
+        }, submissionId=submission_id, timestamp=iso_now())
+
+    except Exception as e:
+        writer.log('ERROR', 'doPost error', repr(e))
+        return create_response(False, f'Server error: {e}')
+
+
+class SubmissionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'QuizServer/1'
+
+    def _send(self, status, payload=None):
+        body = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        # The quiz pages post cross-origin with Content-Type: application/json
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if payload is None:
+            self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            self.send_header('Access-Control-Max-Age', '86400')
+        else:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self._send(204)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY:
+            self.close_connection = True
+            self._send(413, create_response(False, 'Submission too large'))
+            return
+        body = self.rfile.read(length)
+        self._send(200, handle_submission(self.server.store, self.server.writer, body))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class QuizServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # A whole class connects at once when the exam ends
+    request_queue_size = 1024
+
+    def __init__(self, address, db_path, verbose=False):
+        super().__init__(address, SubmissionHandler)
+        self.store = QuizStore(db_path)
+        self.writer = BatchWriter(db_path)
+        self.verbose = verbose
+
+
+# ============================================================
+# Load test
+# ============================================================
+
+def random_submission(quiz, number, rng):
+    answers = []
+    for i, q in enumerate(quiz['questions']):
+        if q.get('type') == 'multiple-choice':
+            answer = rng.randrange(len(q.get('options') or [None]))
+        else:
+            answer = rng.choice(['', 'proof', str(rng.random())])
+        answers.append({'questionId': str(q['id']) if q.get('id') is not None else f'q{i + 1}',
+                        'userAnswer': answer})
+    return {
+        'studentId': str(6500000000 + number),
+        'studentName': f'Load Test {number}',
+        'quizId': quiz['id'],
+        'quizTitle': quiz.get('title', ''),
+        'answers': answers,
+        'timeUsedSec': rng.randrange(60, 3600),
+        'clientMeta': {'tabSwitchCount': rng.randrange(3), 'userAgent': 'quiz_server.py bench'},
+    }
+
+
+def _post_all(url, payloads, start, latencies, responses):
+    """One client: a keep-alive connection posting its payloads in turn"""
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    start.wait()
+    for index, payload in payloads:
+        body = json.dumps(payload).encode('utf-8')
+        began = time.perf_counter()
+        try:
+            conn.request('POST', parts.path or '/', body, {'Content-Type': 'application/json'})
+            response = json.loads(conn.getresponse().read())
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            conn.close()
+            response = {'ok': False, 'message': f'client error: {e}'}
+        latencies.append(time.perf_counter() - began)
+        responses[index] = response
+    conn.close()
+
+
+def run_bench(url, quiz, clients, per_client, seed):
+    rng = random.Random(seed)
+    submissions = [random_submission(quiz, n, rng) for n in range(clients * per_client)]
+    responses = [None] * len(submissions)
+    latencies = []
+    start = threading.Event()
+    threads = [threading.Thread(target=_post_all, daemon=True,
+                                args=(url, [(i, submissions[i]) for i in range(c, len(submissions), clients)],
+                                      start, latencies, responses))
+               for c in range(clients)]
+    for thread in threads:
+        thread.start()
+    began = time.perf_counter()
+    start.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - began
+
+    # Every computed result must be what gradeSubmission() gives
+    expected, _ = grade_batch(AnswerKey(quiz), submissions)
+    failed = mismatched = 0
+    for response, result in zip(responses, expected):
+        if not response.get('ok'):
+            failed += 1
+        elif response['computed'] != {'correct': result['correctCount'], 'incorrect': result['incorrectCount'],
+                                      'score': result['score'], 'totalPoints': result['totalPoints'],
+                                      'percentage': result['percentage'], 'grade': result['grade']}:
+            mismatched += 1
+    return {'requests': len(submissions), 'failed': failed, 'mismatched': mismatched,
+            'seconds': wall, 'latencies': sorted(latencies), 'responses': responses}
+
+
+def print_bench(report, clients):
+    latencies = report['latencies']
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(f"\n{'='*60}")
+    print(f"Load test: {report['requests']:,} submissions from {clients:,} clients")
+    print('='*60)
+    print(f"⏱️  {report['seconds']:.2f} s, {report['requests'] / report['seconds']:,.0f} submissions/s")
+    print(f"📊 Latency p50 {percentile(50):.1f} ms | p95 {percentile(95):.1f} ms | "
+          f"p99 {percentile(99):.1f} ms | max {latencies[-1] * 1000:.1f} ms")
+    if report['failed']:
+        failures = [r['message'] for r in report['responses'] if not r.get('ok')]
+        print(f"❌ {report['failed']:,} failed, e.g. {failures[0]}")
+    if report['mismatched']:
+        print(f"❌ {report['mismatched']:,} computed results differ from grade_quiz.py")
+    if not report['failed'] and not report['mismatched']:
+        print("✅ Every submission saved with the expected result")
+    print('='*60)
+
+
+# ============================================================
+# Command line
+# ============================================================
+
+def cmd_load(args):
+    conn = init_db(args.db)
+    paths = [Path(p) for p in args.files] or [QUIZ_DIR / n for n in quiz_bank_names(QUIZ_DIR)]
+    status = 0
+    for path in paths:
+        try:
+            quiz_id, count = load_quiz(conn, path)
+        except (OSError, ValueError) as e:
+            print(f"❌ {path.name}: {e}")
+            status = 1
+            continue
+        print(f"✅ {path.name}: {quiz_id} ({count} questions)")
+    conn.close()
+    return status
+
+
+def cmd_serve(args):
+    conn = init_db(args.db)
+    quizzes = conn.execute('SELECT COUNT(*) FROM quizzes').fetchone()[0]
+    conn.close()
+    server = QuizServer((args.host, args.port), args.db, args.verbose)
+    server.writer.start()
+    print(f"📦 {args.db}: {quizzes} quizzes")
+    if not quizzes:
+        print("⚠️  No quizzes loaded; run: python quiz_server.py load")
+    print(f"✅ Listening on http://{args.host}:{server.server_port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.writer.close()
+        print(f"\n📊 {server.writer.rows:,} submissions saved in {server.writer.batches:,} transactions")
+    return 0
+
+
+def cmd_bench(args):
+    try:
+        with open(args.quiz, 'r', encoding='utf-8') as f:
+            quiz = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    report = run_bench(args.url, quiz, args.clients, args.requests, args.seed)
+    print_bench(report, args.clients)
+    return 0 if not report['failed'] and not report['mismatched'] else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local SQLite stand-in for the Code.gs submission backend')
+    parser.add_argument('--db', default=str(DEFAULT_DB), help=f'SQLite database (default: {DEFAULT_DB.name})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help='load quiz banks into the questions table')
+    load.add_argument('files', nargs='*', help='quiz JSON files (default: every quiz bank here)')
+
+    serve = commands.add_parser('serve', help='accept doPost submissions over HTTP')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('-v', '--verbose', action='store_true', help='log every request')
+
+    bench = commands.add_parser('bench', help='load test a running server')
+    bench.add_argument('quiz', help='quiz JSON file the server has loaded')
+    bench.add_argument('--url', default='http://127.0.0.1:8080/')
+    bench.add_argument('--clients', type=int, default=300, help='simultaneous students (default: 300)')
+    bench.add_argument('--requests', type=int, default=1, help='submissions per client (default: 1)')
+    bench.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    if np is None and args.command != 'load':
+        print("❌ quiz_server.py needs NumPy for grading: pip install numpy")
+        return 1
+
+    return {'load': cmd_load, 'serve': cmd_serve, 'bench': cmd_bench}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,105 +2,396 @@
 """
 Quiz JSON Validator
 Validates quiz JSON files for common errors before deployment
+
+Usage:
+    python validate_quiz.py [--stream] <quiz-file.json>
+    python validate_quiz.py quiz-config.json
+    python validate_quiz.py --all [-j JOBS] [--force] [--stream] [--json FILE]
+
+Banks and the config are checked against data/quiz.schema.json and
+data/quiz-config.schema.json with the checkers compiled by
+schema_compiler.py; the hand-written checks explain what a schema
+rejects, and cover the rules JSON Schema cannot express (duplicate IDs,
+the correctAnswer range, missing quiz files).
+
+--all validates quiz-config.json and every *-*.json quiz bank in this
+directory in parallel. Results are cached in .validate-manifest.json keyed
+by file size, mtime and content hash plus the validator version, so banks
+that have not changed since the last run are not re-read.
+
+--stream reads a bank's questions one at a time instead of loading the
+whole file, printing issues as they are found, so memory stays bounded
+for very large banks (--all does this by itself for banks over 32 MB).
+Issues of the fields outside the questions array come after the question
+issues in this mode, and only the hand-written checks run.
 """
 
+import argparse
+import fnmatch
+import hashlib
 import json
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def validate_quiz_file(filepath):
-    """Validate a quiz JSON file"""
-    errors = []
-    warnings = []
-    
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except json.JSONDecodeError as e:
-        return [f"❌ Invalid JSON syntax: {e}"], []
-    except Exception as e:
-        return [f"❌ Error reading file: {e}"], []
-    
+TEACHING_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(TEACHING_DIR))
+
+from schema_compiler import load_validator
+
+QUIZ_SCHEMA = str(TEACHING_DIR / 'data' / 'quiz.schema.json')
+CONFIG_SCHEMA = str(TEACHING_DIR / 'data' / 'quiz-config.schema.json')
+
+MANIFEST_NAME = '.validate-manifest.json'
+MANIFEST_FORMAT = 1
+CONFIG_NAME = 'quiz-config.json'
+
+# Banks larger than this are validated with the streaming reader by --all
+STREAM_THRESHOLD = 32 * 1024 * 1024
+STREAM_CHUNK = 1024 * 1024
+
+
+def _question_issues(i, q, question_ids):
+    """Errors and warnings of question i, as ('error' | 'warning', message)"""
+    if not isinstance(q, dict):
+        yield 'error', f"❌ Question {i}: Must be an object"
+        return
+
+    # Check required question fields
+    q_required = ['id', 'question', 'type', 'points']
+    for field in q_required:
+        if field not in q:
+            yield 'error', f"❌ Question {i}: Missing '{field}'"
+
+    # Check duplicate IDs
+    if 'id' in q:
+        if q['id'] in question_ids:
+            yield 'error', f"❌ Question {i}: Duplicate ID '{q['id']}'"
+        question_ids.add(q['id'])
+
+    # Validate question type
+    if 'type' in q:
+        if q['type'] not in ['multiple-choice', 'text']:
+            yield 'error', f"❌ Question {i}: Invalid type '{q['type']}', must be 'multiple-choice' or 'text'"
+
+        # Type-specific validation
+        if q['type'] == 'multiple-choice':
+            if 'options' not in q:
+                yield 'error', f"❌ Question {i}: Missing 'options' for multiple-choice"
+            elif not isinstance(q['options'], list):
+                yield 'error', f"❌ Question {i}: 'options' must be an array"
+            elif len(q['options']) < 2:
+                yield 'error', f"❌ Question {i}: Must have at least 2 options"
+
+            if 'correctAnswer' in q:
+                if not isinstance(q['correctAnswer'], int):
+                    yield 'error', f"❌ Question {i}: correctAnswer must be integer for multiple-choice"
+                elif 'options' in q and isinstance(q['options'], list):
+                    if q['correctAnswer'] < 0 or q['correctAnswer'] >= len(q['options']):
+                        yield 'error', f"❌ Question {i}: correctAnswer {q['correctAnswer']} out of range (0-{len(q['options'])-1})"
+            else:
+                yield 'error', f"❌ Question {i}: Missing 'correctAnswer'"
+
+        elif q['type'] == 'text':
+            if 'correctAnswer' not in q:
+                yield 'warning', f"⚠️  Question {i}: No reference answer provided for text question"
+
+    # Validate points
+    if 'points' in q:
+        if not isinstance(q['points'], (int, float)) or q['points'] <= 0:
+            yield 'error', f"❌ Question {i}: points must be positive number, got: {q['points']}"
+
+
+def _field_issues(data):
+    """Issues of the quiz fields checked before the questions"""
     # Check required top-level fields
     required_fields = ['id', 'courseCode', 'title', 'duration', 'questions']
     for field in required_fields:
         if field not in data:
-            errors.append(f"❌ Missing required field: '{field}'")
-    
+            yield 'error', f"❌ Missing required field: '{field}'"
+
     # Validate duration
     if 'duration' in data:
         if not isinstance(data['duration'], int) or data['duration'] <= 0:
-            errors.append(f"❌ duration must be a positive integer, got: {data['duration']}")
-    
+            yield 'error', f"❌ duration must be a positive integer, got: {data['duration']}"
+
+
+def _placeholder_issues(data):
+    """Issues of the quiz fields checked after the questions"""
+    # Check for template placeholders
+    if 'id' in data and data['id'] == 'CHANGE_ME':
+        yield 'warning', "⚠️  Quiz ID still set to 'CHANGE_ME'"
+    if 'courseCode' in data and data['courseCode'] == 'CHANGE_ME':
+        yield 'warning', "⚠️  Course code still set to 'CHANGE_ME'"
+
+    # Check for comment fields (should be removed)
+    comment_fields = [k for k in data.keys() if k.startswith('_')]
+    if comment_fields:
+        yield 'warning', f"⚠️  Found comment fields (should be removed): {', '.join(comment_fields)}"
+
+
+def _checked_question_issues(i, q, question_ids):
+    """
+    Issues of question i when the quiz schema accepts it: only the rules
+    JSON Schema cannot express, in the order _question_issues reports them
+    """
+    if q['id'] in question_ids:
+        yield 'error', f"❌ Question {i}: Duplicate ID '{q['id']}'"
+    question_ids.add(q['id'])
+    if q['type'] == 'multiple-choice':
+        if q['correctAnswer'] >= len(q['options']):
+            yield 'error', f"❌ Question {i}: correctAnswer {q['correctAnswer']} out of range (0-{len(q['options'])-1})"
+    elif 'correctAnswer' not in q:
+        yield 'warning', f"⚠️  Question {i}: No reference answer provided for text question"
+
+
+def _rejected_questions(schema_errors):
+    """Positions of the questions with schema errors, or None if an error is outside the questions"""
+    rejected = set()
+    for error in schema_errors:
+        parts = error.split(': ', 1)[0].split('/')
+        if len(parts) < 3 or parts[1] != 'questions' or not parts[2].isdigit():
+            return None
+        rejected.add(int(parts[2]))
+    return rejected
+
+
+def _schema_checked_issues(data, rejected):
+    """Issues of a bank whose fields the quiz schema accepts; the questions it
+    rejected go through the hand-written checks"""
+    questions = data['questions']
+    if not questions:
+        yield 'warning', "⚠️  No questions found in quiz"
+    question_ids = set()
+    for i, q in enumerate(questions):
+        issues = _question_issues if i in rejected else _checked_question_issues
+        yield from issues(i + 1, q, question_ids)
+    yield from _placeholder_issues(data)
+
+
+def quiz_issues(data):
+    """Errors and warnings of loaded quiz data, as ('error' | 'warning', message)
+
+    The compiled quiz schema (data/quiz.schema.json) checks the structure
+    first, so only the parts it rejects go through the hand-written checks
+    that explain them; the rest only needs the cross-field rules. When the
+    hand-written checks find no error, the schema errors are reported (a
+    field of the wrong type they do not check, such as a non-string option).
+    """
+    schema_errors = load_validator(QUIZ_SCHEMA)(data)
+    rejected = _rejected_questions(schema_errors)
+    if rejected is None:
+        issues = _hand_quiz_issues(data)
+    else:
+        issues = _schema_checked_issues(data, rejected)
+    found = False
+    for kind, message in issues:
+        found = found or kind == 'error'
+        yield kind, message
+    if not found:
+        for error in schema_errors:
+            yield 'error', f"❌ {error}"
+
+
+def _hand_quiz_issues(data):
+    if not isinstance(data, dict):
+        yield 'error', "❌ Quiz must be a JSON object"
+        return
+
+    yield from _field_issues(data)
+
     # Validate questions
     if 'questions' in data:
         if not isinstance(data['questions'], list):
-            errors.append("❌ 'questions' must be an array")
+            yield 'error', "❌ 'questions' must be an array"
         elif len(data['questions']) == 0:
-            warnings.append("⚠️  No questions found in quiz")
+            yield 'warning', "⚠️  No questions found in quiz"
         else:
             question_ids = set()
             for i, q in enumerate(data['questions'], 1):
-                # Check required question fields
-                q_required = ['id', 'question', 'type', 'points']
-                for field in q_required:
-                    if field not in q:
-                        errors.append(f"❌ Question {i}: Missing '{field}'")
-                
-                # Check duplicate IDs
-                if 'id' in q:
-                    if q['id'] in question_ids:
-                        errors.append(f"❌ Question {i}: Duplicate ID '{q['id']}'")
-                    question_ids.add(q['id'])
-                
-                # Validate question type
-                if 'type' in q:
-                    if q['type'] not in ['multiple-choice', 'text']:
-                        errors.append(f"❌ Question {i}: Invalid type '{q['type']}', must be 'multiple-choice' or 'text'")
-                    
-                    # Type-specific validation
-                    if q['type'] == 'multiple-choice':
-                        if 'options' not in q:
-                            errors.append(f"❌ Question {i}: Missing 'options' for multiple-choice")
-                        elif not isinstance(q['options'], list):
-                            errors.append(f"❌ Question {i}: 'options' must be an array")
-                        elif len(q['options']) < 2:
-                            errors.append(f"❌ Question {i}: Must have at least 2 options")
-                        
-                        if 'correctAnswer' in q:
-                            if not isinstance(q['correctAnswer'], int):
-                                errors.append(f"❌ Question {i}: correctAnswer must be integer for multiple-choice")
-                            elif 'options' in q and isinstance(q['options'], list):
-                                if q['correctAnswer'] < 0 or q['correctAnswer'] >= len(q['options']):
-                                    errors.append(f"❌ Question {i}: correctAnswer {q['correctAnswer']} out of range (0-{len(q['options'])-1})")
-                        else:
-                            errors.append(f"❌ Question {i}: Missing 'correctAnswer'")
-                    
-                    elif q['type'] == 'text':
-                        if 'correctAnswer' not in q:
-                            warnings.append(f"⚠️  Question {i}: No reference answer provided for text question")
-                
-                # Validate points
-                if 'points' in q:
-                    if not isinstance(q['points'], (int, float)) or q['points'] <= 0:
-                        errors.append(f"❌ Question {i}: points must be positive number, got: {q['points']}")
-    
-    # Check for template placeholders
-    if 'id' in data and data['id'] == 'CHANGE_ME':
-        warnings.append("⚠️  Quiz ID still set to 'CHANGE_ME'")
-    if 'courseCode' in data and data['courseCode'] == 'CHANGE_ME':
-        warnings.append("⚠️  Course code still set to 'CHANGE_ME'")
-    
-    # Check for comment fields (should be removed)
-    comment_fields = [k for k in data.keys() if k.startswith('_')]
-    if comment_fields:
-        warnings.append(f"⚠️  Found comment fields (should be removed): {', '.join(comment_fields)}")
-    
+                yield from _question_issues(i, q, question_ids)
+
+    yield from _placeholder_issues(data)
+
+
+def split_issues(issues):
+    """(errors, warnings) lists of an issue iterator"""
+    errors = []
+    warnings = []
+    for kind, message in issues:
+        (errors if kind == 'error' else warnings).append(message)
     return errors, warnings
 
 
-def validate_config_file(filepath):
-    """Validate quiz-config.json file"""
+def validate_quiz_file(filepath):
+    """Validate a quiz JSON file"""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        return [f"❌ Invalid JSON syntax: {e}"], []
+    except Exception as e:
+        return [f"❌ Error reading file: {e}"], []
+
+    return split_issues(quiz_issues(data))
+
+
+class StreamError(ValueError):
+    """Invalid JSON found while streaming, at a character offset of the file"""
+
+    def __init__(self, msg, offset):
+        self.msg = msg
+        self.offset = offset
+        super().__init__(f"{msg}: char {offset}")
+
+
+class JSONStream:
+    """Reads one JSON document a value at a time, holding only a chunk of it
+
+    json's raw_decode does the parsing; the text is read in chunks and
+    a value cut off at the end of the buffer is retried with more text.
+    """
+
+    def __init__(self, f, chunk_size=STREAM_CHUNK):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.offset = 0  # characters dropped before buf
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read(self, size):
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        if self.pos > self.chunk_size:
+            # drop what has been consumed
+            self.offset += self.pos
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += data
+        return True
+
+    def error(self, msg):
+        return StreamError(msg, self.offset + self.pos)
+
+    def peek(self):
+        """Next character after whitespace, '' at the end of the file"""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in ' \t\n\r':
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._read(self.chunk_size):
+                return ''
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of chars"""
+        c = self.peek()
+        if not c or c not in chars:
+            raise self.error("Expecting " + " or ".join(repr(ch) for ch in chars))
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Decode the next value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # Cut off by the end of the buffer: near it, or inside a long string
+                cut = e.pos >= len(self.buf) - 16 or e.msg.startswith('Unterminated string')
+                offset = self.offset + e.pos
+                if not cut or not self._read(max(self.chunk_size, len(self.buf) - self.pos)):
+                    raise StreamError(e.msg, offset) from None
+                continue
+            # A value at the end of the buffer may continue in the next
+            # chunk; a cut number ("-5e", "1.") decodes as its prefix,
+            # leaving at most two of its characters behind
+            if isinstance(value, (int, float)):
+                cut = end + 8 > len(self.buf)
+            else:
+                cut = end == len(self.buf)
+            if cut and not self.eof and self._read(self.chunk_size):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_quiz_issues(filepath, chunk_size=STREAM_CHUNK):
+    """Validate a quiz file in one pass, yielding issues as they are found
+
+    The questions array is decoded one question at a time, so memory
+    stays bounded by the largest question plus the set of question IDs.
+    The other fields are checked at the end of the file, after the
+    question issues.
+    """
+    data = {}
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            stream = JSONStream(f, chunk_size)
+            if stream.peek() != '{':
+                if stream.peek():
+                    yield 'error', "❌ Quiz must be a JSON object"
+                else:
+                    yield 'error', "❌ Invalid JSON syntax: Expecting value: char 0"
+                return
+            stream.pos += 1
+            if stream.peek() == '}':
+                stream.pos += 1
+            else:
+                while True:
+                    if stream.peek() != '"':
+                        raise stream.error("Expecting property name enclosed in double quotes")
+                    key = stream.value()
+                    stream.expect(':')
+                    if key == 'questions' and stream.peek() == '[':
+                        stream.pos += 1
+                        count = 0
+                        question_ids = set()
+                        if stream.peek() == ']':
+                            stream.pos += 1
+                        else:
+                            while True:
+                                count += 1
+                                yield from _question_issues(count, stream.value(), question_ids)
+                                if stream.expect(',]') == ']':
+                                    break
+                        if count == 0:
+                            yield 'warning', "⚠️  No questions found in quiz"
+                        data[key] = None
+                    else:
+                        data[key] = stream.value()
+                        if key == 'questions':
+                            yield 'error', "❌ 'questions' must be an array"
+                    if stream.expect(',}') == '}':
+                        break
+            if stream.peek():
+                raise stream.error("Extra data")
+    except StreamError as e:
+        yield 'error', f"❌ Invalid JSON syntax: {e}"
+        return
+    except Exception as e:
+        yield 'error', f"❌ Error reading file: {e}"
+        return
+
+    yield from _field_issues(data)
+    yield from _placeholder_issues(data)
+
+
+def validate_config_file(filepath, existing=None):
+    """Validate quiz-config.json file
+
+    existing is the set of file names next to the config; it is listed once
+    when not given rather than stat-ing every quiz entry.
+    """
     errors = []
     warnings = []
     
@@ -156,116 +447,301 @@ def validate_config_file(filepath):
             
             # Check file exists
             if 'file' in quiz:
-                quiz_path = Path(filepath).parent / quiz['file']
-                if not quiz_path.exists():
+                if existing is None:
+                    existing = directory_names(Path(filepath).parent)
+                if not _file_listed(quiz['file'], existing, Path(filepath).parent):
                     errors.append(f"❌ Course {course_code}, Quiz {i}: File not found: {quiz['file']}")
             
             # Check enabled field
             if 'enabled' in quiz and not isinstance(quiz['enabled'], bool):
                 errors.append(f"❌ Course {course_code}, Quiz {i}: 'enabled' must be boolean (true/false)")
-    
+
+    if not errors:
+        # Types the checks above leave alone, such as a numeric displayName
+        errors.extend(f"❌ {error}" for error in load_validator(CONFIG_SCHEMA)(data))
+
     return errors, warnings
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python validate_quiz.py <quiz-file.json>")
-        print("   or: python validate_quiz.py quiz-config.json")
-        print("   or: python validate_quiz.py --all")
-        sys.exit(1)
-    
-    if sys.argv[1] == '--all':
-        # Validate all quiz files in directory
-        quiz_dir = Path(__file__).parent
-        all_valid = True
-        
-        # Validate config
-        config_file = quiz_dir / 'quiz-config.json'
-        if config_file.exists():
-            print(f"\n{'='*60}")
-            print(f"Validating: quiz-config.json")
-            print('='*60)
-            errors, warnings = validate_config_file(config_file)
-            
-            if errors:
-                all_valid = False
-                print("\n❌ ERRORS:")
-                for error in errors:
-                    print(f"  {error}")
-            
-            if warnings:
-                print("\n⚠️  WARNINGS:")
-                for warning in warnings:
-                    print(f"  {warning}")
-            
-            if not errors and not warnings:
-                print("✅ No issues found!")
-        
-        # Validate all quiz JSON files
-        for quiz_file in quiz_dir.glob('*-*.json'):
-            if quiz_file.name == 'quiz-config.json':
-                continue
-            
-            print(f"\n{'='*60}")
-            print(f"Validating: {quiz_file.name}")
-            print('='*60)
-            
-            errors, warnings = validate_quiz_file(quiz_file)
-            
-            if errors:
-                all_valid = False
-                print("\n❌ ERRORS:")
-                for error in errors:
-                    print(f"  {error}")
-            
-            if warnings:
-                print("\n⚠️  WARNINGS:")
-                for warning in warnings:
-                    print(f"  {warning}")
-            
-            if not errors and not warnings:
-                print("✅ No issues found!")
-        
-        print("\n" + "="*60)
-        if all_valid:
-            print("✅ All quiz files are valid!")
-        else:
-            print("❌ Some files have errors. Please fix them before deploying.")
-        print("="*60)
-        
-        sys.exit(0 if all_valid else 1)
-    
-    filepath = Path(sys.argv[1])
-    
-    if not filepath.exists():
-        print(f"❌ File not found: {filepath}")
-        sys.exit(1)
-    
-    print(f"Validating: {filepath.name}")
-    print("="*60)
-    
-    if filepath.name == 'quiz-config.json':
-        errors, warnings = validate_config_file(filepath)
+def directory_names(directory):
+    """Names of the non-hidden entries in a directory, listed once"""
+    try:
+        return {n for n in os.listdir(directory) if not n.startswith('.')}
+    except OSError:
+        return set()
+
+
+def _file_listed(name, existing, directory):
+    if not isinstance(name, str):
+        return False
+    if '/' in name or os.sep in name:
+        # Only nested references need their own lookup
+        return (Path(directory) / name).exists()
+    return name in existing
+
+
+def quiz_file_names(names):
+    """The files --all validates: the config first, then the quiz banks"""
+    banks = sorted(n for n in names if fnmatch.fnmatch(n, '*-*.json') and n != CONFIG_NAME)
+    return ([CONFIG_NAME] if CONFIG_NAME in names else []) + banks
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(STREAM_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def validator_version():
+    """Hash of this script, the schemas and their compiler; editing any of
+    them invalidates every cached result"""
+    digest = hashlib.sha256()
+    for path in (__file__, QUIZ_SCHEMA, CONFIG_SCHEMA, TEACHING_DIR / 'schema_compiler.py'):
+        digest.update(file_hash(path).encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+def load_manifest(quiz_dir, version):
+    try:
+        with open(Path(quiz_dir) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('format') != MANIFEST_FORMAT or data.get('version') != version:
+        return {}
+    return data.get('files', {})
+
+
+def save_manifest(quiz_dir, version, files):
+    path = Path(quiz_dir) / MANIFEST_NAME
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'format': MANIFEST_FORMAT, 'version': version, 'files': files},
+                  f, indent=1, ensure_ascii=False)
+        f.write('\n')
+    os.replace(tmp, path)
+
+
+def _validate_job(args):
+    """Validate one file in a worker; stat and hash are taken before reading"""
+    path, existing, stream = args
+    start = time.perf_counter()
+    try:
+        key = _stat_key(path)
+        digest = file_hash(path)
+    except OSError:
+        key = digest = None
+    if Path(path).name == CONFIG_NAME:
+        errors, warnings = validate_config_file(path, existing)
+    elif stream or (key is not None and key[0] > STREAM_THRESHOLD):
+        errors, warnings = split_issues(iter_quiz_issues(path))
     else:
-        errors, warnings = validate_quiz_file(filepath)
-    
+        errors, warnings = validate_quiz_file(path)
+    return key, digest, errors, warnings, time.perf_counter() - start
+
+
+def _cached_entry(path, entry):
+    """The manifest entry if the file is unchanged since it was recorded"""
+    try:
+        key = _stat_key(path)
+        if key == entry['stat']:
+            return entry
+        if file_hash(path) == entry['hash']:
+            # Touched but not edited: keep the result, refresh the stat
+            return dict(entry, stat=key)
+    except (OSError, KeyError, TypeError):
+        pass
+    return None
+
+
+def validate_all(quiz_dir, jobs=1, force=False, stream=False):
+    """Validate the config and every quiz bank in quiz_dir
+
+    Unchanged files are answered from the manifest; the rest are validated
+    in parallel when jobs > 1, with the streaming reader for banks over
+    STREAM_THRESHOLD (all of them with stream). The config result also depends on which
+    files exist, so it is keyed on the directory listing as well.
+    """
+    quiz_dir = Path(quiz_dir)
+    version = validator_version()
+    manifest = {} if force else load_manifest(quiz_dir, version)
+    names = directory_names(quiz_dir)
+    listing = hashlib.sha256('\n'.join(sorted(names)).encode('utf-8')).hexdigest()
+    files = quiz_file_names(names)
+
+    results = {}
+    entries = {}
+    stale = []
+    for name in files:
+        start = time.perf_counter()
+        entry = manifest.get(name)
+        if entry is not None and name == CONFIG_NAME and entry.get('listing') != listing:
+            entry = None
+        if entry is not None:
+            entry = _cached_entry(quiz_dir / name, entry)
+        if entry is None:
+            stale.append(name)
+            continue
+        entries[name] = entry
+        results[name] = {'errors': entry['errors'], 'warnings': entry['warnings'],
+                         'cached': True, 'seconds': time.perf_counter() - start}
+
+    jobs_args = [(str(quiz_dir / name), names if name == CONFIG_NAME else None, stream) for name in stale]
+    if jobs > 1 and len(stale) > 1:
+        workers = min(jobs, len(stale))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_validate_job, jobs_args,
+                                     chunksize=max(1, len(stale) // (workers * 4))))
+    else:
+        outcomes = [_validate_job(args) for args in jobs_args]
+
+    for name, (key, digest, errors, warnings, seconds) in zip(stale, outcomes):
+        results[name] = {'errors': errors, 'warnings': warnings, 'cached': False, 'seconds': seconds}
+        if key is not None:
+            entries[name] = {'stat': key, 'hash': digest, 'errors': errors, 'warnings': warnings}
+            if name == CONFIG_NAME:
+                entries[name]['listing'] = listing
+
+    if stale or entries.keys() != manifest.keys() or any(entries[n] is not manifest.get(n) for n in entries):
+        try:
+            save_manifest(quiz_dir, version, entries)
+        except OSError as e:
+            print(f"⚠️  Could not write {MANIFEST_NAME}: {e}", file=sys.stderr)
+
+    return [dict(results[name], file=name) for name in files]
+
+
+def summary(results, wall):
+    """Machine-readable summary of an --all run"""
+    return {
+        'valid': not any(r['errors'] for r in results),
+        'seconds': round(wall, 6),
+        'totals': {
+            'files': len(results),
+            'validated': sum(1 for r in results if not r['cached']),
+            'cached': sum(1 for r in results if r['cached']),
+            'errors': sum(len(r['errors']) for r in results),
+            'warnings': sum(len(r['warnings']) for r in results),
+        },
+        'files': [{
+            'file': r['file'],
+            'valid': not r['errors'],
+            'cached': r['cached'],
+            'seconds': round(r['seconds'], 6),
+            'errors': r['errors'],
+            'warnings': r['warnings'],
+        } for r in results],
+    }
+
+
+def print_issues(errors, warnings, ok_message="✅ No issues found!"):
     if errors:
         print("\n❌ ERRORS:")
         for error in errors:
             print(f"  {error}")
-    
+
     if warnings:
         print("\n⚠️  WARNINGS:")
         for warning in warnings:
             print(f"  {warning}")
-    
+
     if not errors and not warnings:
-        print("✅ No issues found! Quiz file is valid.")
-    
+        print(ok_message)
+
+
+def print_report(results, wall):
+    for r in results:
+        print(f"\n{'='*60}")
+        print(f"Validating: {r['file']}" + (" (cached)" if r['cached'] else ""))
+        print('='*60)
+        print_issues(r['errors'], r['warnings'])
+
+    validated = sum(1 for r in results if not r['cached'])
+    print("\n" + "="*60)
+    if not any(r['errors'] for r in results):
+        print("✅ All quiz files are valid!")
+    else:
+        print("❌ Some files have errors. Please fix them before deploying.")
+    print(f"⏱️  {len(results)} files ({validated} validated, "
+          f"{len(results) - validated} cached) in {wall * 1000:.1f} ms")
     print("="*60)
-    
-    sys.exit(0 if not errors else 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate quiz JSON files before deployment')
+    parser.add_argument('file', nargs='?', help='quiz file or quiz-config.json')
+    parser.add_argument('--all', action='store_true', help='validate every quiz file in this directory')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='parallel workers for --all (default: CPU count)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='ignore the validation manifest and re-validate everything')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the questions one at a time and report issues as they are found')
+    parser.add_argument('--json', metavar='FILE',
+                        help="write a JSON summary of an --all run to FILE ('-' for stdout)")
+    args = parser.parse_args()
+
+    if args.all:
+        start = time.perf_counter()
+        results = validate_all(Path(__file__).parent, args.jobs, args.force, args.stream)
+        wall = time.perf_counter() - start
+        if args.json == '-':
+            json.dump(summary(results, wall), sys.stdout, indent=2, ensure_ascii=False)
+            print()
+        else:
+            print_report(results, wall)
+            if args.json:
+                with open(args.json, 'w', encoding='utf-8') as f:
+                    json.dump(summary(results, wall), f, indent=2, ensure_ascii=False)
+                    f.write('\n')
+                print(f"📄 Summary written to {args.json}")
+        return 0 if not any(r['errors'] for r in results) else 1
+
+    if not args.file:
+        print("Usage: python validate_quiz.py [--stream] <quiz-file.json>")
+        print("   or: python validate_quiz.py quiz-config.json")
+        print("   or: python validate_quiz.py --all [-j JOBS] [--force] [--stream] [--json FILE]")
+        return 1
+
+    filepath = Path(args.file)
+
+    if not filepath.exists():
+        print(f"❌ File not found: {filepath}")
+        return 1
+
+    print(f"Validating: {filepath.name}")
+    print("="*60)
+
+    if args.stream and filepath.name != CONFIG_NAME:
+        counts = {'error': 0, 'warning': 0}
+        for kind, message in iter_quiz_issues(filepath):
+            counts[kind] += 1
+            print(f"  {message}")
+        if not counts['error'] and not counts['warning']:
+            print("✅ No issues found! Quiz file is valid.")
+        else:
+            print(f"\n{counts['error']} error(s), {counts['warning']} warning(s)")
+        print("="*60)
+        return 0 if not counts['error'] else 1
+
+    if filepath.name == CONFIG_NAME:
+        errors, warnings = validate_config_file(filepath)
+    else:
+        errors, warnings = validate_quiz_file(filepath)
+
+    print_issues(errors, warnings, "✅ No issues found! Quiz file is valid.")
+
+    print("="*60)
+
+    return 0 if not errors else 1
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """Fix duplicate onclick attributes"""
-import re
+from rules import DUPLICATE_ONCLICK, report
 
 files = ['720201-B1-1-2568.html', '725103-2-2568.html']
 
@@ -11,8 +11,7 @@ for filename in files:
     original = content
     
     # Remove duplicate onclick attributes - match the full pattern including quotes and escaped quotes
-    content = re.sub(r'onclick="showSection\(\'([^\']+)\', event\)" onclick="showSection\(\'([^\']+)\', event\)"', 
-                     r'onclick="showSection(\'\1\', event)"', content)
+    content = DUPLICATE_ONCLICK.sub(r'onclick="showSection(\'\1\', event)"', content)
     
     changes = len(original) - len(content)
     
@@ -22,3 +21,4 @@ for filename in files:
     print(f"✅ Fixed duplicates in {filename} (removed {changes} bytes)")
 
 print("\n✅ All files fixed!")
+report()
@@ -0,0 +1,850 @@
+#!/usr/bin/env python3
+"""
+Single-parse transform engine for the teaching pages
+
+Parses a course page once into a tree, runs a chain of registered
+transforms against it and serializes it once. It replaces running
+add_sidebar_structure.py, convert_to_template.py, safe_convert_to_template.py,
+update_to_common_css.py, clean_html_css.py, fix_quotes.py and fix_duplicates.py
+one after the other, each re-reading and rewriting the same pages.
+
+Without file arguments every course page of the teaching directory is
+processed, in parallel with -j; --variants also picks up the -demo,
+-backup and -protected copies.
+
+A manifest (.html-pipeline.json, next to the pages) records for each page
+the hash of its content after the last run and the version of the
+transform set. Pages that still have that content and whose transforms did
+not change are skipped; when their size and mtime did not change either,
+they are not even read. --force processes every page.
+
+Usage:
+    python html_pipeline.py [-t transform,...] [-j jobs] [--variants] [--force] [page.html ...]
+    python html_pipeline.py --diff [page.html ...]
+    python html_pipeline.py --list
+
+Changed pages are written together or not at all; page_journal.py --undo
+reverts the last run. --stats writes the rule (rules.py) and transform
+timings of the run as JSON.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+import rules
+from obe_prerender import OBE_SCHEMA, course_obe, render_fragments
+from page_journal import commit, undo_hunks, unified_diff
+from page_templates import course_for, data_files, render_layout, render_menu, render_script
+from rules import NEWLINE, TAG_ATTRIBUTE
+
+TEACHING_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MANIFEST_NAME = '.html-pipeline.json'
+MANIFEST_FORMAT = 1
+
+# Suffixes of the copies kept next to a course page
+VARIANT_SUFFIXES = ('-demo', '-backup', '-protected')
+
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+
+
+# ============================================================
+# Document tree
+# ============================================================
+
+class Node:
+    """A node of a parsed page.
+
+    Elements have a ``tag``, the raw text of their start and end tags and
+    their children. Text, comments, doctypes and stray end tags are leaves
+    with ``tag`` set to None that only keep their raw text. Serializing an
+    unmodified tree gives back the original page byte for byte.
+    """
+
+    __slots__ = ('tag', 'attrs', 'start', 'end', 'children', 'parent', 'text')
+
+    def __init__(self, tag=None, attrs=None, start='', text=''):
+        self.tag = tag
+        self.attrs = attrs or []
+        self.start = start
+        self.end = ''
+        self.children = []
+        self.parent = None
+        self.text = text
+
+    # --- tree navigation ---------------------------------------------
+
+    def iter(self, tag=None):
+        """Iterate over the elements below this node, in document order."""
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if node.tag is not None:
+                if tag is None or node.tag == tag:
+                    yield node
+                stack.extend(reversed(node.children))
+
+    def find_all(self, tag=None, cls=None, **attrs):
+        """Return the elements matching ``tag``, a class and attributes."""
+        result = []
+        for node in self.iter(tag):
+            if cls is not None and cls not in node.classes():
+                continue
+            if all(node.get(name.rstrip('_')) == value for name, value in attrs.items()):
+                result.append(node)
+        return result
+
+    def find(self, tag=None, cls=None, **attrs):
+        found = self.find_all(tag, cls, **attrs)
+        return found[0] if found else None
+
+    # --- attributes --------------------------------------------------
+
+    def get(self, name, default=None):
+        for key, value in self.attrs:
+            if key == name:
+                return value
+        return default
+
+    def classes(self):
+        return (self.get('class') or '').split()
+
+    def _raw_attrs(self, name):
+        """Return the matches of attribute ``name`` in the raw start tag."""
+        name = name.lower()
+        return [m for m in TAG_ATTRIBUTE.finditer(self.start) if m.group(1).lower() == name]
+
+    def set(self, name, value):
+        """Set attribute ``name``, editing the raw start tag in place."""
+        escaped = value.replace('"', '&quot;')
+        found = self._raw_attrs(name) if self.get(name) is not None else []
+        if found:
+            m = found[0]
+            self.start = self.start[:m.start(3)] + '"%s"' % escaped + self.start[m.end(3):]
+            self.attrs = [(k, value if k == name else v) for k, v in self.attrs]
+        else:
+            close = len(self.start) - (2 if self.start.endswith('/>') else 1)
+            self.start = self.start[:close] + ' %s="%s"' % (name, escaped) + self.start[close:]
+            self.attrs.append((name, value))
+
+    def remove_duplicate_attrs(self):
+        """Drop repeated attributes, keeping the first one. Return how many."""
+        seen = set()
+        removed = 0
+        for name, value in list(self.attrs):
+            if name not in seen:
+                seen.add(name)
+                continue
+            matches = self._raw_attrs(name)
+            if len(matches) > 1:
+                m = matches[1]
+                self.start = self.start[:m.start()] + self.start[m.end():]
+                removed += 1
+        if removed:
+            first = {}
+            for name, value in self.attrs:
+                first.setdefault(name, value)
+            self.attrs = list(first.items())
+        return removed
+
+    # --- editing -----------------------------------------------------
+
+    def append(self, node):
+        node.parent = self
+        self.children.append(node)
+
+    def insert(self, index, node):
+        node.parent = self
+        self.children.insert(index, node)
+
+    def index(self):
+        return next(i for i, child in enumerate(self.parent.children) if child is self)
+
+    def replace_with(self, *nodes):
+        parent, i = self.parent, self.index()
+        parent.children[i:i + 1] = []
+        for offset, node in enumerate(nodes):
+            parent.insert(i + offset, node)
+
+    def set_inner_html(self, markup):
+        self.children = []
+        for node in parse_fragment(markup):
+            self.append(node)
+
+    # --- serialization -----------------------------------------------
+
+    def inner_html(self):
+        parts = []
+        for child in self.children:
+            child._serialize(parts)
+        return ''.join(parts)
+
+    def outer_html(self):
+        parts = []
+        self._serialize(parts)
+        return ''.join(parts)
+
+    def _serialize(self, parts):
+        if self.tag is None:
+            parts.append(self.text)
+            return
+        parts.append(self.start)
+        for child in self.children:
+            child._serialize(parts)
+        parts.append(self.end)
+
+
+class _TreeBuilder(HTMLParser):
+    """Build a tree of Nodes keeping the raw text of every construct."""
+
+    def __init__(self, source):
+        super().__init__(convert_charrefs=False)
+        self.source = source
+        # offset of the first character of each line
+        self.line_offsets = [0]
+        for m in NEWLINE.finditer(source):
+            self.line_offsets.append(m.end())
+        self.events = []
+
+    def _offset(self):
+        line, col = self.getpos()
+        return self.line_offsets[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        self.events.append((self._offset(), 'start', tag, attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.events.append((self._offset(), 'leaf', tag, attrs))
+
+    def handle_endtag(self, tag):
+        self.events.append((self._offset(), 'end', tag, None))
+
+    def _raw(self, *args):
+        self.events.append((self._offset(), 'text', None, None))
+
+    handle_data = handle_entityref = handle_charref = _raw
+    handle_comment = handle_decl = handle_pi = unknown_decl = _raw
+
+    def build(self):
+        self.feed(self.source)
+        self.close()
+        root = Node('#document')
+        stack = [root]
+        events = self.events
+        # Consecutive events are contiguous, so each one spans up to the next.
+        for i, (offset, kind, tag, attrs) in enumerate(events):
+            end = events[i + 1][0] if i + 1 < len(events) else len(self.source)
+            raw = self.source[offset:end]
+            if kind == 'start':
+                node = Node(tag, attrs, raw)
+                stack[-1].append(node)
+                if tag not in VOID_ELEMENTS:
+                    stack.append(node)
+            elif kind == 'leaf':
+                stack[-1].append(Node(tag, attrs, raw))
+            elif kind == 'end' and any(node.tag == tag for node in stack[1:]):
+                while stack[-1].tag != tag:
+                    stack.pop()
+                stack.pop().end = raw
+            elif raw:
+                stack[-1].append(Node(text=raw))
+        return root
+
+
+def parse(source):
+    """Parse a page into a tree whose serialization is ``source``."""
+    return _TreeBuilder(source).build()
+
+
+def parse_fragment(markup):
+    """Parse an HTML fragment into a list of nodes."""
+    return list(parse(markup).children)
+
+
+class Page:
+    """A page being transformed: its path, course and document tree."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.source = source
+        self.course = course_for(self.name)
+        self.tree = parse(source)
+
+    def html(self):
+        return self.tree.inner_html()
+
+
+# ============================================================
+# Page discovery
+# ============================================================
+
+def is_variant(filename):
+    stem = os.path.splitext(filename)[0]
+    return any(suffix in stem for suffix in VARIANT_SUFFIXES)
+
+
+def discover_pages(directory=TEACHING_DIR, variants=False):
+    """Return the course pages of ``directory``, sorted by name."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*-*.html'))):
+        name = os.path.basename(path)
+        if course_for(name) is None:
+            continue
+        if is_variant(name) and not variants:
+            continue
+        pages.append(path)
+    return pages
+
+
+# ============================================================
+# Transforms
+# ============================================================
+
+# name -> function(page) returning the number of changes it made
+TRANSFORMS = {}
+
+COMMON_CSS_LINK = '''<!-- Common Styles for Teaching Pages -->
+    <link rel="stylesheet" href="common-styles.css">
+
+    '''
+
+
+def transform(name):
+    """Register a transform. Transforms run in registration order."""
+    def register(func):
+        TRANSFORMS[name] = func
+        return func
+    return register
+
+
+def _previous_element(node):
+    """Return the sibling before ``node``, skipping whitespace text."""
+    siblings = node.parent.children
+    i = node.index() - 1
+    while i >= 0 and siblings[i].tag is None and not siblings[i].text.strip():
+        i -= 1
+    return siblings[i] if i >= 0 else None
+
+
+def _previous_whitespace(node):
+    """Return the whitespace text before ``node``, or ``node`` itself."""
+    i = node.index()
+    if i > 0:
+        previous = node.parent.children[i - 1]
+        if previous.tag is None and not previous.text.strip():
+            return previous
+    return node
+
+
+def _replace_run(first, last, markup):
+    """Replace the siblings from ``first`` to ``last`` with ``markup``."""
+    parent = first.parent
+    start, end = first.index(), last.index()
+    parent.children[start:end + 1] = []
+    for offset, node in enumerate(parse_fragment(markup)):
+        parent.insert(start + offset, node)
+
+
+@transform('quote-repair')
+def quote_repair(page):
+    """Unescape \\' in onclick handlers (fix_quotes.py)."""
+    changes = 0
+    for node in page.tree.iter():
+        value = node.get('onclick')
+        if value and "\\'" in value:
+            node.set('onclick', value.replace("\\'", "'"))
+            changes += 1
+    return changes
+
+
+@transform('duplicate-repair')
+def duplicate_repair(page):
+    """Drop repeated attributes such as double onclick (fix_duplicates.py)."""
+    return sum(node.remove_duplicate_attrs() for node in page.tree.iter())
+
+
+@transform('common-css-link')
+def common_css_link(page):
+    """Link common-styles.css before the page <style> block."""
+    head = page.tree.find('head')
+    if head is None or page.course is None:
+        return 0
+    if head.find('link', href='common-styles.css') is not None:
+        return 0
+    style = head.find('style')
+    if style is None:
+        return 0
+    index = style.index()
+    for offset, node in enumerate(parse_fragment(COMMON_CSS_LINK)):
+        style.parent.insert(index + offset, node)
+    return 1
+
+
+@transform('style-cleanup')
+def style_cleanup(page):
+    """Empty the page <style> block, now provided by common-styles.css."""
+    head = page.tree.find('head')
+    if head is None or page.course is None:
+        return 0
+    style = head.find('style')
+    if style is None or head.find('link', href='common-styles.css') is None:
+        return 0
+    if not style.inner_html().strip():
+        return 0
+    style.set_inner_html('\n\n    ')
+    return 1
+
+
+@transform('sidebar-layout')
+def sidebar_layout(page):
+    """Wrap main.main-container into the sidebar layout (add_sidebar_structure.py)."""
+    main = page.tree.find('main', cls='main-container')
+    if main is None or page.course is None:
+        return 0
+    first = _previous_element(main)
+    if first is None or first.tag is not None or 'Main Content' not in first.text:
+        first = main
+    _replace_run(first, main, render_layout(page.course) + main.inner_html() + main.end + '\n    </div>')
+    return 1
+
+
+@transform('menu-toggle')
+def menu_toggle(page):
+    """Add the mobile sidebar toggle button to the top navigation."""
+    nav = page.tree.find('div', cls='nav-container')
+    if nav is None or page.tree.find('aside', cls='sidebar') is None:
+        return 0
+    if nav.find('button', cls='menu-toggle') is not None:
+        return 0
+    brand = nav.find('a', cls='nav-brand')
+    if brand is None:
+        return 0
+    index = brand.index() + 1
+    button = '\n            <button class="menu-toggle" onclick="toggleSidebar()">☰ Menu</button>'
+    for offset, node in enumerate(parse_fragment(button)):
+        nav.insert(index + offset, node)
+    return 1
+
+
+@transform('sidebar-menu')
+def sidebar_menu(page):
+    """Rebuild the sidebar menu from the course data."""
+    menu = page.tree.find('ul', cls='sidebar-menu')
+    if menu is None or page.course is None:
+        return 0
+    markup = '\n' + render_menu(page.course) + '            '
+    if menu.inner_html() == markup:
+        return 0
+    menu.set_inner_html(markup)
+    return 1
+
+
+@transform('onclick-wiring')
+def onclick_wiring(page):
+    """Call showSection() from menu links that do not do it yet."""
+    changes = 0
+    for link in page.tree.find_all('a', cls='menu-link'):
+        href = link.get('href') or ''
+        if href.startswith('#') and link.get('onclick') is None:
+            link.set('onclick', "showSection('%s', event)" % href[1:])
+            changes += 1
+    return changes
+
+
+def _fill(node, markup):
+    """Replace the content of ``node``, keeping the indentation of its end tag."""
+    inner = node.inner_html()
+    if markup.startswith('\n'):
+        trailing = inner[len(inner.rstrip()):]
+        if '\n' not in trailing:
+            previous = _previous_whitespace(node)
+            trailing = '\n' + (previous.text.rsplit('\n', 1)[-1] if previous is not node else '')
+        markup += trailing
+    if markup == inner:
+        return 0
+    node.set_inner_html(markup)
+    return 1
+
+
+@transform('section-script')
+def section_script(page):
+    """Replace the legacy analytics script and the client-side OBE loader
+    with the section navigation script."""
+    body = page.tree.find('body')
+    if body is None or page.course is None:
+        return 0
+    scripts = body.find_all('script')
+    for script in scripts:
+        if 'function tryLoadOBE(' in script.inner_html() \
+                and 'function showSection(' in script.inner_html():
+            rendered = parse(render_script(page.course)).find('script')
+            script.set_inner_html(rendered.inner_html())
+            return 1
+    if any('function showSection(' in script.inner_html() for script in scripts):
+        return 0
+    for script in scripts:
+        if 'function trackPageVisit(' in script.inner_html():
+            first = _previous_element(script)
+            if first is None or first.tag is not None or 'Analytics' not in first.text:
+                first = script
+            _replace_run(first, script, render_script(page.course))
+            return 1
+    return 0
+
+
+@transform('obe-prerender')
+def obe_prerender(page):
+    """Render the OBE data (CLOs, mapping, assessments, schedule...) into the page."""
+    data = course_obe(page.course)
+    if data is None:
+        return 0
+    changes = 0
+    for attribute, value, markup in render_fragments(data):
+        if attribute == 'id':
+            node = page.tree.find(id=value)
+        else:
+            node = page.tree.find(cls=value)
+        if node is not None:
+            changes += _fill(node, markup)
+        if value == 'schedule-list' and node is not None:
+            placeholder = page.tree.find(id='schedule-placeholder')
+            if placeholder is not None:
+                _replace_run(_previous_whitespace(placeholder), placeholder, '')
+                changes += 1
+    return changes
+
+
+# ============================================================
+# Driver
+# ============================================================
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def transform_version(names=None):
+    """Return the version of a transform set.
+
+    It covers the selected transforms, the source of this module and the
+    templates and course data, so editing any of them invalidates the
+    manifest.
+    """
+    names = list(TRANSFORMS) if names is None else names
+    version = hashlib.sha1()
+    for path in [os.path.abspath(__file__), OBE_SCHEMA] + data_files():
+        with open(path, 'rb') as f:
+            version.update(f.read())
+    version.update(','.join(names).encode('utf-8'))
+    return version.hexdigest()
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('format') != MANIFEST_FORMAT:
+        return {}
+    return manifest.get('pages', {})
+
+
+def save_manifest(directory, pages):
+    path = os.path.join(directory, MANIFEST_NAME)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'format': MANIFEST_FORMAT, 'pages': pages}, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp, path)
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def is_current(path, entry, version):
+    """
+    Tell whether ``path`` is still the output of a run of the transform
+    set ``version``, as recorded by its manifest ``entry``.
+
+    Return None when it is not, else the stat key to record (the page is
+    only hashed when its size or mtime changed).
+    """
+    if not entry or entry.get('version') != version:
+        return None
+    stat = _stat_key(path)
+    if stat == entry.get('stat'):
+        return stat
+    with open(path, 'rb') as f:
+        if content_hash(f.read()) == entry.get('output'):
+            return stat
+    return None
+
+
+def run_page(path, names=None, diff=False):
+    """
+    Run the transforms ``names`` (all by default) over one page, without
+    writing it.
+
+    Return a dict with the byte counts, the per-transform changes and
+    timings, the content hashes and whether the page changed. A changed
+    page also comes with its new ``html`` and the ``undo`` hunks for the
+    journal, and with ``diff``, its unified diff.
+    """
+    names = list(TRANSFORMS) if names is None else names
+    rules.reset()
+    start = time.perf_counter()
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        source = f.read()
+    page = Page(path, source)
+    parsed = time.perf_counter()
+
+    applied = []
+    for name in names:
+        t0 = time.perf_counter()
+        changes = TRANSFORMS[name](page)
+        applied.append((name, changes, time.perf_counter() - t0))
+
+    html = page.html()
+    changed = html != source
+    result = {
+        'path': path,
+        'file': page.name,
+        'changed': changed,
+        'skipped': False,
+        'source': content_hash(source),
+        'output': content_hash(html),
+        'bytes_in': len(source.encode('utf-8')),
+        'bytes_out': len(html.encode('utf-8')),
+        'parse_seconds': parsed - start,
+        'transforms': applied,
+        'rules': rules.stats(),
+    }
+    if changed:
+        result['html'] = html
+        result['undo'] = undo_hunks(source, html)
+        if diff:
+            result['diff'] = unified_diff(path, source, html)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def skipped_result(path):
+    size = os.path.getsize(path)
+    return {
+        'path': path,
+        'file': os.path.basename(path),
+        'changed': False,
+        'skipped': True,
+        'bytes_in': size,
+        'bytes_out': size,
+        'parse_seconds': 0.0,
+        'seconds': 0.0,
+        'transforms': [],
+        'rules': [],
+    }
+
+
+def print_result(result):
+    if result['skipped']:
+        print(f"⏭️  {result['file']}: up to date")
+        return
+    print(f"\n{'='*60}")
+    print(f"Processing: {result['file']}")
+    print(f"{'='*60}")
+    for name, changes, seconds in result['transforms']:
+        mark = '✅' if changes else '  '
+        print(f"{mark} {name:<18} {changes:>4} change(s)  {seconds * 1000:8.2f} ms")
+    status = 'updated' if result['changed'] else 'unchanged'
+    print(f"📄 {status}: {result['bytes_in']:,} → {result['bytes_out']:,} bytes "
+          f"(parse {result['parse_seconds'] * 1000:.2f} ms, "
+          f"total {result['seconds'] * 1000:.2f} ms)")
+
+
+def _run_job(args):
+    return run_page(*args)
+
+
+def run_batch(paths, names=None, write=True, jobs=1, incremental=True, diff=False):
+    """
+    Run the transforms over ``paths``, in ``jobs`` processes.
+
+    With ``incremental``, the pages the manifest records as already
+    transformed by the same transform set are skipped. With ``write``, the
+    changed pages are written all or nothing (see page_journal.commit) and
+    the manifest is updated; the journal path is returned with the
+    results.
+    """
+    version = transform_version(names)
+    manifests = {}
+    results = {}
+    tasks = []
+    for path in paths:
+        directory = os.path.dirname(os.path.abspath(path))
+        if directory not in manifests:
+            manifests[directory] = load_manifest(directory)
+        entry = manifests[directory].get(os.path.basename(path))
+        stat = is_current(path, entry, version) if incremental else None
+        if stat is None:
+            tasks.append((path, names, diff))
+        else:
+            entry['stat'] = stat
+            results[path] = skipped_result(path)
+
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            done = list(pool.map(_run_job, tasks))
+    else:
+        done = [_run_job(task) for task in tasks]
+
+    journal = None
+    if write:
+        journal = commit([(result['path'], result['source'], result['html'], result['undo'])
+                          for result in done if result['changed']])
+    for result in done:
+        results[result['path']] = result
+        if write:
+            directory = os.path.dirname(os.path.abspath(result['path']))
+            manifests[directory][result['file']] = {
+                'version': version,
+                'source': result['source'],
+                'output': result['output'],
+                'stat': _stat_key(result['path']),
+            }
+    if write:
+        for directory, pages in manifests.items():
+            save_manifest(directory, pages)
+    return [results[path] for path in paths], journal
+
+
+def transform_totals(results):
+    """Return the changes and time of each transform over ``results``."""
+    totals = {}
+    for result in results:
+        for name, changes, seconds in result['transforms']:
+            count, elapsed = totals.get(name, (0, 0.0))
+            totals[name] = (count + changes, elapsed + seconds)
+    return totals
+
+
+def write_run_stats(path, results, wall):
+    totals = transform_totals(results)
+    rules.write_stats(
+        path, rules.merge(result['rules'] for result in results),
+        pages=len(results),
+        skipped=sum(1 for result in results if result['skipped']),
+        wall_seconds=round(wall, 6),
+        transforms=[{'transform': name, 'changes': count, 'seconds': round(elapsed, 6)}
+                    for name, (count, elapsed) in totals.items()])
+
+
+def print_summary(results, wall):
+    totals = transform_totals(results)
+    bytes_in = sum(result['bytes_in'] for result in results)
+    bytes_out = sum(result['bytes_out'] for result in results)
+    updated = sum(1 for result in results if result['changed'])
+    skipped = sum(1 for result in results if result['skipped'])
+    busy = sum(result['seconds'] for result in results)
+
+    print(f"\n{'='*60}")
+    print("Summary")
+    print(f"{'='*60}")
+    for name, (count, elapsed) in totals.items():
+        print(f"   {name:<18} {count:>4} change(s)  {elapsed * 1000:8.2f} ms")
+    print(f"📄 Pages: {len(results)} ({updated} updated, {skipped} up to date)")
+    print(f"📦 Bytes: {bytes_in:,} in → {bytes_out:,} out ({bytes_out - bytes_in:+,})")
+    print(f"⏱️  Wall time: {wall * 1000:.2f} ms (page time {busy * 1000:.2f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the teaching page transforms with a single parse per page')
+    parser.add_argument('files', nargs='*',
+                        help='pages to transform (default: every course page)')
+    parser.add_argument('-t', '--transforms',
+                        help='comma-separated transforms to run (default: all)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('--variants', action='store_true',
+                        help='also process the -demo, -backup and -protected copies')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='ignore the manifest and process every page')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='report the changes without writing the pages')
+    parser.add_argument('-d', '--diff', action='store_true',
+                        help='print the unified diff of the changes (implies --dry-run)')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='write the rule and transform timings as JSON to FILE')
+    parser.add_argument('--list', action='store_true',
+                        help='list the transforms and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, func in TRANSFORMS.items():
+            print(f"{name:<18} {func.__doc__}")
+        return 0
+
+    names = None
+    if args.transforms:
+        names = [name.strip() for name in args.transforms.split(',') if name.strip()]
+        unknown = [name for name in names if name not in TRANSFORMS]
+        if unknown:
+            print(f"❌ Unknown transform(s): {', '.join(unknown)}")
+            return 2
+
+    files = []
+    for path in args.files or discover_pages(variants=args.variants):
+        if os.path.exists(path):
+            files.append(path)
+        else:
+            print(f"⚠️ File not found: {path}")
+
+    dry_run = args.dry_run or args.diff
+    start = time.perf_counter()
+    try:
+        results, journal = run_batch(files, names, write=not dry_run, jobs=args.jobs,
+                                     incremental=not args.force, diff=args.diff)
+    except Exception as e:
+        print(f"❌ {e.__class__.__name__}: {e}")
+        print("No page was written")
+        return 1
+    wall = time.perf_counter() - start
+    if args.stats:
+        write_run_stats(args.stats, results, wall)
+    if args.diff:
+        for result in results:
+            sys.stdout.write(result.get('diff', ''))
+        return 0
+    for result in results:
+        print_result(result)
+    print_summary(results, wall)
+    rules.report(rules.merge(result['rules'] for result in results))
+    if args.stats:
+        print(f"📊 Stats written to {args.stats}")
+
+    print(f"\n{'='*60}")
+    if dry_run:
+        print("✅ Done (dry run, nothing written)")
+    else:
+        print("✅ Done")
+        if journal:
+            print(f"📒 Undo with: python page_journal.py --undo ({os.path.basename(journal)})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
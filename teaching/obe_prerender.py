@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Build-time rendering of the course OBE data
+
+The course pages used to fetch data/<code>-obe.json on every page view
+(tryLoadOBE) and build the hero fields, CLO table, CLO-PLO mapping,
+assessment plan, schedule and policies in the browser. This module
+validates the OBE data against data/725103-obe.schema.json (compiled by
+schema_compiler.py) and renders those parts with the templates in
+templates/, so that html_pipeline.py (obe-prerender transform) can bake
+them into the pages.
+
+Usage:
+    python obe_prerender.py [course code ...]     validate and render the OBE data
+"""
+
+import os
+import sys
+
+from page_templates import TEACHING_DIR, load_courses, load_obe, render
+from schema_compiler import load_validator
+
+OBE_SCHEMA = os.path.join(TEACHING_DIR, 'data', '725103-obe.schema.json')
+
+
+class OBEDataError(Exception):
+    """OBE data that does not match the schema."""
+
+    def __init__(self, filename, errors):
+        self.filename = filename
+        self.errors = errors
+        super().__init__('%s: %d schema error(s)' % (filename, len(errors)))
+
+
+def normalize(data):
+    """
+    Return the OBE data in the layout of the schema.
+
+    819605-obe.json uses an older layout (courseInfo, mapping.clo-plo,
+    assessment.methods and differently named policies); its hero fields
+    are written in the page itself, so courseInfo is not carried over.
+    """
+    if 'courseInfo' not in data:
+        return data
+    data = dict(data)
+    del data['courseInfo']
+    mapping = data.get('mapping')
+    if isinstance(mapping, dict):
+        data['mapping'] = mapping.get('clo-plo', [])
+    assessment = data.pop('assessment', None)
+    if isinstance(assessment, dict):
+        data['assessments'] = assessment.get('methods', [])
+    policies = data.get('policies')
+    if isinstance(policies, dict):
+        renamed = {'lateSubmission': 'submission', 'academicIntegrity': 'integrity'}
+        data['policies'] = {renamed.get(key, key): value for key, value in policies.items()}
+    return data
+
+
+# obeJson path -> (mtime, data)
+_data_cache = {}
+
+
+def course_obe(course):
+    """
+    Return the validated, normalized OBE data of a course, or None if the
+    course has none. Raise OBEDataError if it does not match the schema.
+    """
+    if not course or not course.get('obeJson'):
+        return None
+    path = os.path.join(TEACHING_DIR, course['obeJson'])
+    mtime = os.stat(path).st_mtime_ns
+    cached = _data_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    data = normalize(load_obe(course))
+    errors = load_validator(OBE_SCHEMA)(data)
+    if errors:
+        raise OBEDataError(course['obeJson'], errors)
+    _data_cache[path] = (mtime, data)
+    return data
+
+
+def _mapping_rows(data):
+    plos = data.get('plos') or []
+    rows = []
+    for row in data.get('mapping') or []:
+        weights = row.get('weights') or []
+        cells = [weights[i] if i < len(weights) else '' for i in range(len(plos))]
+        rows.append({'clo': row.get('clo'), 'cells': cells})
+    return rows
+
+
+def render_fragments(data):
+    """
+    Render the OBE parts of a page.
+
+    Return a list of ``(attribute, value, markup)``: the markup replaces
+    the content of the element whose ``attribute`` (id or class) is
+    ``value``. Parts without data are left out, so the page keeps its
+    own content for them.
+    """
+    fragments = []
+    course = data.get('course')
+    if course:
+        if course.get('term'):
+            fragments.append(('class', 'hero-subtitle', render('obe-hero-subtitle.html', course)))
+        if course.get('schedule') or course.get('room'):
+            fragments.append(('class', 'hero-info', render('obe-hero-info.html', course)))
+    if data.get('clos'):
+        fragments.append(('id', 'clos-tbody', render('obe-clos.html', data)))
+    if data.get('plos') and data.get('mapping'):
+        fragments.append(('id', 'mapping-thead-row', render('obe-mapping-head.html', data)))
+        fragments.append(('id', 'mapping-tbody',
+                          render('obe-mapping-body.html', {'rows': _mapping_rows(data)})))
+    if data.get('assessments'):
+        assessments = [dict(item, cloList=', '.join(item.get('clos') or []))
+                       for item in data['assessments']]
+        fragments.append(('id', 'assessment-tbody',
+                          render('obe-assessments.html', {'assessments': assessments})))
+    if data.get('schedule'):
+        fragments.append(('id', 'schedule-list', render('obe-schedule.html', data)))
+    for key, value in (data.get('policies') or {}).items():
+        if value:
+            fragments.append(('id', 'policy-' + key, render('obe-policy.html', {'value': value})))
+    return fragments
+
+
+def main():
+    codes = sys.argv[1:] or sorted(code for code, course in load_courses().items()
+                                   if course.get('obeJson'))
+    failed = 0
+    for code in codes:
+        course = load_courses().get(code)
+        if course is None or not course.get('obeJson'):
+            print(f"⚠️ No OBE data for course {code}")
+            continue
+        try:
+            data = course_obe(course)
+        except OBEDataError as e:
+            failed += 1
+            print(f"❌ {e}")
+            for error in e.errors:
+                print(f"   {error}")
+            continue
+        fragments = render_fragments(data)
+        size = sum(len(markup) for _, _, markup in fragments)
+        print(f"✅ {code}: {len(fragments)} fragment(s), {size:,} chars")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
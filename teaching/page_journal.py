@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+All-or-nothing writes of a batch of pages, with an undo journal
+
+commit() writes every new page to a temporary file next to it, records
+how to undo the batch in a journal, then renames the temporary files over
+the pages. If anything fails before the renames, no page is touched; if a
+rename fails, the pages already replaced are restored. A batch can also
+create files, which undoing it deletes. The journal keeps only the lines
+each page lost (not full copies of the pages), gzipped, in
+.html-pipeline-journal/.
+
+Usage:
+    python page_journal.py              list the journals
+    python page_journal.py --undo       undo the last committed batch
+"""
+
+import argparse
+import difflib
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+TEACHING_DIR = os.path.dirname(os.path.abspath(__file__))
+JOURNAL_DIR = os.path.join(TEACHING_DIR, '.html-pipeline-journal')
+JOURNAL_FORMAT = 1
+
+
+class JournalError(Exception):
+    pass
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def undo_hunks(before, after):
+    """
+    Return what it takes to turn ``after`` back into ``before``: a list of
+    ``[start, end, lines]``, meaning lines start:end of ``after`` were
+    ``lines`` in ``before``.
+    """
+    a = before.splitlines(keepends=True)
+    b = after.splitlines(keepends=True)
+    hunks = []
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            hunks.append([j1, j2, a[i1:i2]])
+    return hunks
+
+
+def apply_undo(after, hunks):
+    lines = after.splitlines(keepends=True)
+    for start, end, old in reversed(hunks):
+        lines[start:end] = old
+    return ''.join(lines)
+
+
+def unified_diff(path, before, after):
+    name = os.path.basename(path)
+    return ''.join(difflib.unified_diff(before.splitlines(keepends=True),
+                                        after.splitlines(keepends=True),
+                                        'a/' + name, 'b/' + name))
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def _write_temp(path, text):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp
+
+
+def _save_journal(path, journal):
+    tmp = path + '.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        json.dump(journal, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def _load_journal(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        journal = json.load(f)
+    if journal.get('format') != JOURNAL_FORMAT:
+        raise JournalError('%s: unknown journal format' % path)
+    return journal
+
+
+def commit(changes, journal_dir=JOURNAL_DIR):
+    """
+    Write a batch of pages, all or nothing.
+
+    ``changes`` is a list of ``(path, source_hash, text, hunks)``: the new
+    ``text`` of the page at ``path``, the hash of the content it was
+    computed from and the undo hunks from that content. A ``source_hash``
+    of None creates the file, which must not exist yet. A page changed on
+    disk since it was read makes the whole batch fail. Return the path of
+    the journal (None for an empty batch).
+    """
+    if not changes:
+        return None
+    temps = []
+    try:
+        for path, source_hash, text, hunks in changes:
+            if source_hash is None:
+                if os.path.exists(path):
+                    raise JournalError('%s already exists' % path)
+            elif _hash(_read(path)) != source_hash:
+                raise JournalError('%s changed since it was read' % path)
+            temps.append(_write_temp(path, text))
+    except BaseException:
+        for tmp in temps:
+            os.unlink(tmp)
+        raise
+
+    os.makedirs(journal_dir, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + '.%06d' % (now % 1 * 1e6)
+    journal_path = os.path.join(journal_dir, stamp + '.json.gz')
+    journal = {
+        'format': JOURNAL_FORMAT,
+        'time': stamp,
+        'status': 'pending',
+        'pages': [{'path': os.path.abspath(path), 'before': source_hash,
+                   'after': _hash(text), 'hunks': hunks}
+                  for path, source_hash, text, hunks in changes],
+    }
+    _save_journal(journal_path, journal)
+
+    done = []
+    try:
+        for (path, source_hash, text, hunks), tmp in zip(changes, temps):
+            os.replace(tmp, path)
+            done.append((path, source_hash, text, hunks))
+    except BaseException:
+        for path, source_hash, text, hunks in reversed(done):
+            if source_hash is None:
+                os.unlink(path)
+            else:
+                os.replace(_write_temp(path, apply_undo(text, hunks)), path)
+        for tmp in temps[len(done):]:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        os.unlink(journal_path)
+        raise
+    journal['status'] = 'committed'
+    _save_journal(journal_path, journal)
+    return journal_path
+
+
+def journals(journal_dir=JOURNAL_DIR):
+    """Return the journal files, oldest first."""
+    return sorted(glob.glob(os.path.join(journal_dir, '*.json.gz')))
+
+
+def undo(journal_path):
+    """
+    Undo the batch of ``journal_path``, all or nothing, and delete the
+    journal. Every page must still be as the batch left it.
+    """
+    journal = _load_journal(journal_path)
+    changes = []
+    for page in journal['pages']:
+        if page['before'] is None and not os.path.exists(page['path']):
+            # never created: the batch was interrupted
+            continue
+        text = _read(page['path'])
+        if _hash(text) == page['before']:
+            # never replaced: the batch was interrupted
+            continue
+        if _hash(text) != page['after']:
+            raise JournalError('%s changed since the batch was committed' % page['path'])
+        if page['before'] is None:
+            changes.append((page['path'], page['after'], None, []))
+            continue
+        restored = apply_undo(text, page['hunks'])
+        if _hash(restored) != page['before']:
+            raise JournalError('%s: journal does not restore the page' % page['path'])
+        changes.append((page['path'], page['after'], restored, []))
+    # the undo itself is not journaled
+    temps = []
+    try:
+        for path, after, restored, hunks in changes:
+            temps.append(None if restored is None else _write_temp(path, restored))
+    except BaseException:
+        for tmp in temps:
+            if tmp is not None:
+                os.unlink(tmp)
+        raise
+    for (path, after, restored, hunks), tmp in zip(changes, temps):
+        if tmp is None:
+            os.unlink(path)
+        else:
+            os.replace(tmp, path)
+    os.unlink(journal_path)
+    return [path for path, after, restored, hunks in changes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List or undo html_pipeline.py batches')
+    parser.add_argument('--undo', action='store_true', help='undo the last committed batch')
+    args = parser.parse_args()
+
+    found = journals()
+    if not args.undo:
+        for path in found:
+            journal = _load_journal(path)
+            size = os.path.getsize(path)
+            print(f"📒 {os.path.basename(path)}: {journal['status']}, "
+                  f"{len(journal['pages'])} page(s), {size:,} bytes")
+        if not found:
+            print("No journal")
+        return 0
+
+    if not found:
+        print("❌ Nothing to undo")
+        return 1
+    try:
+        restored = undo(found[-1])
+    except (JournalError, OSError) as e:
+        print(f"❌ Undo failed, nothing changed: {e}")
+        return 1
+    for path in restored:
+        print(f"↩️  Restored {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
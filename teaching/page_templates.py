@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Course page templates
+
+The parts of the course pages that are the same for every course (sidebar
+layout and menu, section navigation script) are templates in templates/,
+filled in from the course list in data/courses.json and the course OBE
+data (data/<code>-obe.json). Adding a course is a change to courses.json.
+
+Templates use a small syntax:
+    {{ name }}            value, HTML-escaped (dotted names look up keys)
+    {{ name|raw }}        value, as is
+    {% if name %}...{% else %}...{% endif %}
+    {% for item in name %}...{% endfor %}
+
+Each template is compiled once into a Python function, kept for the life
+of the process, so rendering the pages of every course is a few function
+calls.
+
+Usage:
+    python page_templates.py [course code ...]
+"""
+
+import html
+import json
+import os
+import re
+import sys
+import time
+
+TEACHING_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(TEACHING_DIR, 'templates')
+COURSES_FILE = os.path.join(TEACHING_DIR, 'data', 'courses.json')
+
+_re_tag = re.compile(r'\{\{\s*(.+?)\s*\}\}|\{%\s*(.+?)\s*%\}')
+_re_name = re.compile(r'[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*\Z')
+
+
+class TemplateError(Exception):
+    pass
+
+
+def lookup(context, name):
+    """Resolve a dotted name in the render context."""
+    value = context
+    for part in name.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part)
+        else:
+            value = getattr(value, part, None)
+        if value is None:
+            return None
+    return value
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def _escape(value):
+    return html.escape(_text(value))
+
+
+def compile_template(source, name='<template>'):
+    """Compile a template into a function of a context dict."""
+    code = ['def render(context):', ' _out = []', ' _append = _out.append']
+    indent = 1
+    stack = []
+    scopes = 0
+    pos = 0
+
+    def name_ref(ref):
+        if not _re_name.match(ref):
+            raise TemplateError('%s: bad name %r' % (name, ref))
+        return '_lookup(context, %r)' % ref
+
+    for m in _re_tag.finditer(source):
+        if m.start() > pos:
+            code.append(' ' * indent + '_append(%r)' % source[pos:m.start()])
+        pos = m.end()
+        if m.group(1) is not None:
+            ref, _, filt = m.group(1).partition('|')
+            func = '_text' if filt.strip() == 'raw' else '_escape'
+            code.append(' ' * indent + '_append(%s(%s))' % (func, name_ref(ref.strip())))
+            continue
+        words = m.group(2).split()
+        if words[0] == 'if' and len(words) == 2:
+            code.append(' ' * indent + 'if %s:' % name_ref(words[1]))
+            stack.append('if')
+            indent += 1
+        elif words[0] == 'else' and len(words) == 1 and stack and stack[-1] == 'if':
+            code.append(' ' * (indent - 1) + 'else:')
+        elif words[0] == 'for' and len(words) == 4 and words[2] == 'in':
+            if not _re_name.match(words[1]) or '.' in words[1]:
+                raise TemplateError('%s: bad loop variable %r' % (name, words[1]))
+            # Each loop body sees a copy of the context with the loop variable.
+            scopes += 1
+            code.append(' ' * indent + '_outer%d = context' % scopes)
+            code.append(' ' * indent + 'for _item in %s or ():' % name_ref(words[3]))
+            code.append(' ' * (indent + 1) + 'context = dict(_outer%d, %s=_item)' % (scopes, words[1]))
+            stack.append('for%d' % scopes)
+            indent += 1
+        elif words[0] in ('endif', 'endfor') and len(words) == 1 and stack \
+                and stack[-1].startswith(words[0][3:]):
+            block = stack.pop()
+            indent -= 1
+            if block != 'if':
+                code.append(' ' * indent + 'context = _outer%s' % block[3:])
+        else:
+            raise TemplateError('%s: unexpected {%% %s %%}' % (name, m.group(2)))
+    if stack:
+        raise TemplateError('%s: unclosed {%% %s %%}' % (name, stack[-1].rstrip('0123456789')))
+    if pos < len(source):
+        code.append(' ' * indent + '_append(%r)' % source[pos:])
+    code.append(" return ''.join(_out)")
+
+    namespace = {'_lookup': lookup, '_text': _text, '_escape': _escape}
+    exec(compile('\n'.join(code), name, 'exec'), namespace)
+    return namespace['render']
+
+
+# template name -> (mtime, renderer)
+_renderers = {}
+
+
+def get_template(name):
+    """Return the compiled renderer of templates/<name>.
+
+    Renderers are compiled on first use and reused until the template file
+    changes. A single trailing newline of the file is not part of the
+    template.
+    """
+    path = os.path.join(TEMPLATE_DIR, name)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _renderers.get(name)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        source = f.read()
+    if source.endswith('\n'):
+        source = source[:-1]
+    renderer = compile_template(source, name)
+    _renderers[name] = (mtime, renderer)
+    return renderer
+
+
+def render(name, context):
+    return get_template(name)(context)
+
+
+# ============================================================
+# Course data
+# ============================================================
+
+_courses = None
+
+
+def load_courses():
+    """Return the courses of data/courses.json, by course code."""
+    global _courses
+    if _courses is None:
+        with open(COURSES_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        _courses = {}
+        for code, course in data['courses'].items():
+            course = dict(course, code=code)
+            course.setdefault('sidebarTitle', data.get('sidebarTitle', ''))
+            course['sections'] = [dict(section, active=(i == 0))
+                                  for i, section in enumerate(course['sections'])]
+            _courses[code] = course
+    return _courses
+
+
+def course_for(filename):
+    """Return the course of a page from its course code prefix, or None."""
+    return load_courses().get(os.path.basename(filename).split('-', 1)[0])
+
+
+def load_obe(course):
+    """Return the OBE data of a course, or None if it has none."""
+    if not course.get('obeJson'):
+        return None
+    with open(os.path.join(TEACHING_DIR, course['obeJson']), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def data_files():
+    """Return the files the rendered fragments depend on."""
+    files = [COURSES_FILE]
+    for name in sorted(os.listdir(TEMPLATE_DIR)):
+        files.append(os.path.join(TEMPLATE_DIR, name))
+    for course in load_courses().values():
+        if course.get('obeJson'):
+            files.append(os.path.join(TEACHING_DIR, course['obeJson']))
+    return files
+
+
+def render_menu(course):
+    return render('sidebar-menu.html', course)
+
+
+def render_layout(course):
+    return render('sidebar-layout.html', dict(course, menu=render_menu(course)))
+
+
+def render_script(course):
+    return render('section-script.html', course)
+
+
+def main():
+    codes = sys.argv[1:] or sorted(load_courses())
+    start = time.perf_counter()
+    for code in codes:
+        course = load_courses().get(code)
+        if course is None:
+            print(f"❌ Unknown course: {code}")
+            return 1
+        layout = render_layout(course)
+        script = render_script(course)
+        print(f"✅ {code}: {len(course['sections'])} sections, "
+              f"layout {len(layout):,} chars, script {len(script):,} chars")
+    print(f"⏱️  Rendered {len(codes)} course(s) in {(time.perf_counter() - start) * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Publish the site: minified HTML, CSS and JS with precompressed variants
+
+Writes every page, stylesheet and script of the site, minified, to the
+output directory (default: dist/ at the root of the site), with a .gz
+copy and, when the brotli module is installed, a .br copy, for servers
+that send precompressed files. The other files of the site (images,
+fonts, data, documents) are copied as they are, so that the output
+directory can be served as is.
+
+Files built by the build stages in _site/ (css_prune.py) replace the
+source file of the same path.
+
+Minification only drops what cannot change the result:
+- HTML: comments (not conditional ones) and whitespace runs in text,
+  collapsed to one space or newline (not in <pre> and <textarea>), and
+  whitespace inside tags; inline <style> and <script> as below,
+- CSS: comments (not /*! ... */) and whitespace that does not separate
+  tokens,
+- JS: comments (not /*! ... */ and //# source maps), indentation and
+  blank lines. Line breaks are kept, so automatic semicolon insertion
+  is not affected. Template literals are kept whole, with their ${...}
+  substitutions; a script with one left open is not minified,
+- JSON (<script> data blocks): whitespace between tokens. A '<' in a
+  string is escaped as \u003c if the output would hold '</' or '<!--'.
+
+A <script> or <style> holding '<!--' (the old hiding idiom) is kept as
+is, and so is one whose minified text would hold '<!--' or end the
+element early.
+
+A manifest (.publish.json, in the output directory) records each input
+and its outputs; files whose size and mtime, or content, did not change
+since the last run are skipped, unless --force is given. Files are
+processed in parallel with -j.
+
+Usage:
+    python publish.py [-o output] [-j jobs] [--force] [--no-assets]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import rules
+from css_prune import OUTPUT_DIR as BUILD_DIR
+from html_pipeline import TEACHING_DIR, content_hash, parse
+from rules import CSS_MIN_TOKEN, HTML_SPACE, JS_REGEX, JS_TOKEN, TAG_SPACE
+
+SITE_DIR = os.path.dirname(TEACHING_DIR)
+OUTPUT_DIR = os.path.join(SITE_DIR, 'dist')
+MANIFEST_NAME = '.publish.json'
+MANIFEST_FORMAT = 1
+
+# Not part of the published site
+SKIP_DIRS = {'__pycache__', 'node_modules', 'dist'}
+SKIP_PATHS = {os.path.join('teaching', 'templates')}
+SKIP_EXTENSIONS = ('.py', '.pyc', '.md', '.bat', '.jsonl', '.scss', '.db', '.db-wal', '.db-shm')
+
+# Smaller precompressed files are not worth a request header check
+MIN_COMPRESS_SIZE = 256
+
+
+# ============================================================
+# Minifiers
+# ============================================================
+
+# no space needed after / before these characters
+_CSS_AFTER = set('{};,>:(')
+_CSS_BEFORE = set('{};,>)!')
+
+
+def minify_css(source):
+    out = []
+    space = False
+    for m in CSS_MIN_TOKEN.finditer(source):
+        kind, text = m.lastgroup, m.group()
+        if kind == 'space' or (kind == 'comment' and not text.startswith(('/*!', '/*#'))):
+            space = True
+            continue
+        if kind == 'code':
+            text = text.replace(';}', '}')
+            if text[0] == '}' and out and out[-1].endswith(';'):
+                out[-1] = out[-1][:-1]
+        if space and out and out[-1] and out[-1][-1] not in _CSS_AFTER and text[0] not in _CSS_BEFORE:
+            out.append(' ')
+        space = False
+        out.append(text)
+    return ''.join(out)
+
+
+# a regular expression literal, rather than a division, may follow these
+_JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                      'void', 'throw', 'instanceof', 'yield', 'await'}
+# no space needed around these characters (not + - / . which may combine)
+_JS_TIGHT = set('{}()[];,:=*&|!?<>')
+
+
+def _regex_allowed(previous):
+    if not previous:
+        return True
+    if previous[-1] in _JS_REGEX_AFTER:
+        return True
+    word = previous[len(previous.rstrip('abcdefghijklmnopqrstuvwxyz')):]
+    return word in _JS_REGEX_KEYWORDS and not previous[:-len(word)][-1:].isalnum()
+
+
+def _template_end(source, pos):
+    """End of the template literal whose backtick is at pos, with its ${...}
+    substitutions and the template literals nested in them; -1 if it is
+    not closed"""
+    pos += 1
+    while pos < len(source):
+        c = source[pos]
+        if c == '\\':
+            pos += 2
+        elif c == '`':
+            return pos + 1
+        elif source.startswith('${', pos):
+            pos = _substitution_end(source, pos + 2)
+            if pos < 0:
+                return -1
+        else:
+            pos += 1
+    return -1
+
+
+def _substitution_end(source, pos):
+    """End of a ${...} substitution whose expression starts at pos, past its }"""
+    depth = 0
+    previous = '('
+    while pos < len(source):
+        m = JS_TOKEN.match(source, pos)
+        kind, text = m.lastgroup, m.group()
+        if text == '`':
+            end = _template_end(source, pos)
+            if end < 0:
+                return -1
+            text = source[pos:end]
+        elif kind == 'slash' and _regex_allowed(previous):
+            literal = JS_REGEX.match(source, pos)
+            if literal is not None:
+                text = literal.group()
+        elif kind == 'code':
+            for i, c in enumerate(text):
+                if c == '{':
+                    depth += 1
+                elif c == '}':
+                    if depth == 0:
+                        return pos + i + 1
+                    depth -= 1
+        pos += len(text)
+        if kind not in ('line', 'block', 'newline', 'space'):
+            previous = text
+    return -1
+
+
+def minify_js(source):
+    out = []
+    previous = ''
+    pending = None
+    pos = 0
+    while pos < len(source):
+        m = JS_TOKEN.match(source, pos)
+        kind, text = m.lastgroup, m.group()
+        if text == '`':
+            # A template literal is one token, substitutions and all
+            end = _template_end(source, pos)
+            if end < 0:
+                return source
+            kind, text = 'string', source[pos:end]
+        elif kind == 'slash' and _regex_allowed(previous):
+            literal = JS_REGEX.match(source, pos)
+            if literal is not None:
+                kind, text = 'string', literal.group()
+        pos += len(text)
+        if kind == 'line' and not text.startswith(('//#', '//@')):
+            continue
+        if kind == 'block' and not text.startswith('/*!'):
+            pending = '\n' if '\n' in text or pending == '\n' else ' '
+            continue
+        if kind == 'newline':
+            pending = '\n'
+            continue
+        if kind == 'space':
+            pending = pending or ' '
+            continue
+        if pending and out:
+            if pending == '\n':
+                out.append('\n')
+            elif previous[-1] not in _JS_TIGHT and text[0] not in _JS_TIGHT:
+                out.append(' ')
+        pending = None
+        out.append(text)
+        previous = text
+    return ''.join(out)
+
+
+def minify_json(source):
+    try:
+        text = json.dumps(json.loads(source), ensure_ascii=False, separators=(',', ':'))
+    except ValueError:
+        return source
+    if '</' in text or '<!--' in text:
+        # '<' is only ever in strings, where the escape means the same
+        text = text.replace('<', '\\u003c')
+    return text
+
+
+PRESERVE_ELEMENTS = {'pre', 'textarea'}
+JS_TYPES = {'', 'text/javascript', 'application/javascript', 'module'}
+JSON_TYPES = {'application/json', 'application/ld+json', 'importmap'}
+
+
+def _space(m):
+    return '\n' if '\n' in m.group() else ' '
+
+
+def _tag_space(m):
+    if m.group(1):
+        return m.group(1)
+    if m.group(2):
+        # keep the space of "/>": it may end an unquoted attribute value
+        return '>' if m.group(2) == '>' else ' />'
+    return ' '
+
+
+def _minify_children(node, preserve):
+    if node.tag == 'script':
+        kind = (node.get('type') or '').strip().lower()
+        minify = minify_js if kind in JS_TYPES else minify_json if kind in JSON_TYPES else None
+    elif node.tag == 'style':
+        minify = minify_css
+    else:
+        minify = None
+    space_before = False
+    for child in node.children:
+        if child.tag is not None:
+            child.start = TAG_SPACE.sub(_tag_space, child.start)
+            _minify_children(child, preserve or child.tag in PRESERVE_ELEMENTS)
+            space_before = False
+        elif node.tag in ('script', 'style'):
+            # raw text: '<!--' here is the script's or the stylesheet's own
+            if minify is not None and '<!--' not in child.text:
+                text = minify(child.text)
+                if '<!--' not in text and '</' + node.tag not in text.lower():
+                    child.text = text
+        elif child.text.startswith('<!--'):
+            if not child.text.startswith('<!--['):
+                child.text = ''
+        elif child.text.startswith(('<!', '<?')):
+            space_before = False
+        elif not preserve:
+            text = HTML_SPACE.sub(_space, child.text)
+            if space_before:
+                text = text.lstrip()
+            if text:
+                child.text = text
+                space_before = text[-1] in ' \n'
+            else:
+                child.text = ''
+
+
+def minify_html(source):
+    tree = parse(source)
+    _minify_children(tree, False)
+    return tree.inner_html().strip() + '\n'
+
+
+MINIFIERS = {
+    '.html': minify_html,
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+# ============================================================
+# Publishing
+# ============================================================
+
+def _skipped_dir(rel):
+    name = os.path.basename(rel)
+    return name.startswith(('.', '_')) or name in SKIP_DIRS or rel in SKIP_PATHS
+
+
+def collect_inputs(site_dir=SITE_DIR, build_dir=BUILD_DIR, output_dir=OUTPUT_DIR, assets=True):
+    """
+    Return ``{relative path: input path}`` for the files to publish; a
+    file of ``build_dir`` replaces the source file of the same path.
+    """
+    inputs = {}
+    for top, base in ((site_dir, site_dir), (build_dir, build_dir)):
+        if not os.path.isdir(top):
+            continue
+        for directory, dirs, files in os.walk(top):
+            rel_dir = os.path.relpath(directory, base)
+            dirs[:] = sorted(name for name in dirs
+                             if not _skipped_dir(os.path.normpath(os.path.join(rel_dir, name)))
+                             and os.path.join(directory, name) not in (build_dir, output_dir))
+            for name in sorted(files):
+                if name.startswith('.') or name.endswith(SKIP_EXTENSIONS):
+                    continue
+                if not assets and os.path.splitext(name)[1] not in MINIFIERS:
+                    continue
+                rel = os.path.normpath(os.path.join(rel_dir, name))
+                path = os.path.join(directory, name)
+                source = inputs.get(rel)
+                if source is not None and os.path.getmtime(source) > os.path.getmtime(path):
+                    print(f"⚠️ {os.path.relpath(path, SITE_DIR)} is older than its source {rel}")
+                inputs[rel] = path
+    return dict(sorted(inputs.items()))
+
+
+def publish_version():
+    """Hash of what the outputs depend on besides the inputs."""
+    parts = []
+    for module in (__file__, rules.__file__):
+        with open(module, 'rb') as f:
+            parts.append(content_hash(f.read()))
+    parts.append('brotli' if brotli is not None else '')
+    return content_hash(' '.join(parts))
+
+
+def load_manifest(output_dir, version):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('format') != MANIFEST_FORMAT or data.get('version') != version:
+        return {}
+    return data.get('files', {})
+
+
+def save_manifest(output_dir, version, files):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'format': MANIFEST_FORMAT, 'version': version, 'files': files}, f, indent=1)
+        f.write('\n')
+    os.replace(path + '.tmp', path)
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def _outputs_exist(output_dir, entry):
+    return all(os.path.exists(os.path.join(output_dir, name)) for name in entry.get('outputs', []))
+
+
+def publish_file(rel, path, output_dir, entry=None):
+    """
+    Minify (or copy) one file into ``output_dir`` with its compressed
+    variants. Return a result dict; ``entry`` is the file's manifest entry,
+    and the file is skipped if its content did not change.
+    """
+    rules.reset()
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        data = f.read()
+    source = content_hash(data)
+    stat = _stat_key(path)
+    if entry and entry.get('source') == source and _outputs_exist(output_dir, entry):
+        return dict(entry, rel=rel, stat=stat, skipped=True, seconds=time.perf_counter() - start,
+                    rules=[])
+
+    target = os.path.join(output_dir, rel)
+    minify = MINIFIERS.get(os.path.splitext(rel)[1].lower())
+    result = {'rel': rel, 'source': source, 'stat': stat, 'skipped': False,
+              'minified': minify is not None, 'bytes_in': len(data), 'outputs': [rel]}
+    if minify is None:
+        _write(target, data)
+        result['bytes_out'] = len(data)
+    else:
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            text = None
+        output = minify(text).encode('utf-8') if text is not None else data
+        _write(target, output)
+        result['bytes_out'] = len(output)
+        variants = [('.gz', lambda raw: gzip.compress(raw, 9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', lambda raw: brotli.compress(raw, quality=11)))
+        for suffix, compress in variants:
+            compressed = compress(output) if len(output) >= MIN_COMPRESS_SIZE else None
+            name = suffix.lstrip('.')
+            if compressed is not None and len(compressed) < len(output):
+                _write(target + suffix, compressed)
+                result['outputs'].append(rel + suffix)
+                result['bytes_' + name] = len(compressed)
+            elif os.path.exists(target + suffix):
+                os.unlink(target + suffix)
+    result['seconds'] = time.perf_counter() - start
+    result['rules'] = rules.stats()
+    return result
+
+
+def _publish_job(args):
+    return publish_file(*args)
+
+
+def publish(inputs, output_dir=OUTPUT_DIR, jobs=1, force=False):
+    """Publish ``inputs`` (see collect_inputs); return the results."""
+    version = publish_version()
+    manifest = {} if force else load_manifest(output_dir, version)
+    results = []
+    tasks = []
+    for rel, path in inputs.items():
+        entry = manifest.get(rel)
+        if entry and entry.get('stat') == _stat_key(path) and _outputs_exist(output_dir, entry):
+            results.append(dict(entry, rel=rel, skipped=True, seconds=0.0, rules=[]))
+        else:
+            tasks.append((rel, path, output_dir, entry))
+
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results.extend(pool.map(_publish_job, tasks, chunksize=8))
+    else:
+        results.extend(_publish_job(task) for task in tasks)
+
+    files = {}
+    for result in results:
+        files[result['rel']] = {key: value for key, value in result.items()
+                                if key not in ('rel', 'skipped', 'seconds', 'rules')}
+    os.makedirs(output_dir, exist_ok=True)
+    save_manifest(output_dir, version, files)
+    return sorted(results, key=lambda result: result['rel'])
+
+
+def print_report(results, wall):
+    print(f"\n{'='*60}")
+    print("Publish")
+    print(f"{'='*60}")
+    for result in results:
+        if result['skipped'] or not result['minified']:
+            continue
+        saved = 1 - result['bytes_out'] / result['bytes_in'] if result['bytes_in'] else 0
+        variants = ''.join(f", .{name} {result['bytes_' + name]:,}" for name in ('gz', 'br')
+                           if 'bytes_' + name in result)
+        print(f"✅ {result['rel']:<52} {result['bytes_in']:>9,} → {result['bytes_out']:>9,} "
+              f"({saved:5.1%}){variants}")
+
+    print(f"\n{'type':<8} {'files':>6} {'source':>12} {'minified':>12} {'.gz':>12} {'.br':>12}")
+    kinds = {}
+    for result in results:
+        ext = os.path.splitext(result['rel'])[1].lower() if result['minified'] else 'other'
+        totals = kinds.setdefault(ext, [0, 0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += result['bytes_in']
+        totals[2] += result['bytes_out']
+        totals[3] += result.get('bytes_gz', result['bytes_out'])
+        totals[4] += result.get('bytes_br', result.get('bytes_gz', result['bytes_out']))
+    for ext, (count, bytes_in, bytes_out, gz, br) in sorted(kinds.items()):
+        if ext == 'other':
+            print(f"{ext:<8} {count:>6} {bytes_in:>12,} {'(copied)':>12}")
+        else:
+            br_text = f"{br:>12,}" if brotli is not None else f"{'-':>12}"
+            print(f"{ext:<8} {count:>6} {bytes_in:>12,} {bytes_out:>12,} {gz:>12,} {br_text}")
+    skipped = sum(1 for result in results if result['skipped'])
+    busy = sum(result['seconds'] for result in results)
+    print(f"\n📄 Files: {len(results)} ({len(results) - skipped} published, {skipped} unchanged)")
+    if brotli is None:
+        print("⚠️  brotli is not installed: no .br files (pip install brotli)")
+    print(f"⏱️  Wall time: {wall * 1000:.2f} ms (file time {busy * 1000:.2f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write the minified and precompressed site to an output directory')
+    parser.add_argument('-o', '--output', default=OUTPUT_DIR,
+                        help='output directory (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='ignore the manifest and publish every file')
+    parser.add_argument('--no-assets', action='store_true',
+                        help='only publish the HTML, CSS and JS files')
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output)
+    start = time.perf_counter()
+    inputs = collect_inputs(output_dir=output_dir, assets=not args.no_assets)
+    try:
+        results = publish(inputs, output_dir, jobs=args.jobs, force=args.force)
+    except (OSError, UnicodeError) as e:
+        print(f"❌ {e.__class__.__name__}: {e}")
+        return 1
+    wall = time.perf_counter() - start
+    print_report(results, wall)
+    rules.report(rules.merge(result['rules'] for result in results))
+
+    print(f"\n{'='*60}")
+    print(f"✅ Done, site written to {args.output}")
+    print(f"{'='*60}\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Registry of the compiled regular expressions used by the teaching scripts
+
+Every pattern is compiled once, when its module is imported, and
+registered under a name. Each use records the number of calls, matches,
+characters scanned and time spent, so a run can show which rules are
+expensive and which matched nothing.
+
+Patterns that span a block (<style>...</style>, the sidebar menu, a
+<script>) are written as "unrolled loops", e.g.
+    <style>[^<]*(?:<(?!/style>)[^<]*)*</style>
+instead of the lazy DOTALL form <style>.*?</style>: they match the same
+text but never backtrack character by character.
+
+Stats are printed with report(), and written as JSON to the file named by
+the RULE_STATS environment variable (or passed to write_stats()).
+
+Usage:
+    python rules.py           list the registered rules
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+# name -> Rule, in registration order
+RULES = {}
+
+
+class Rule:
+    """A compiled pattern that counts its own use."""
+
+    __slots__ = ('name', 'regex', 'description', 'calls', 'hits', 'scanned', 'seconds')
+
+    def __init__(self, name, pattern, flags=0, description=''):
+        self.name = name
+        self.regex = re.compile(pattern, flags)
+        self.description = description
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.hits = 0
+        self.scanned = 0
+        self.seconds = 0.0
+
+    def _record(self, scanned, hits, start):
+        self.calls += 1
+        self.hits += hits
+        self.scanned += scanned
+        self.seconds += time.perf_counter() - start
+
+    def search(self, text, pos=0):
+        start = time.perf_counter()
+        m = self.regex.search(text, pos)
+        self._record(len(text) - pos, m is not None, start)
+        return m
+
+    def match(self, text, pos=0):
+        """Match at ``pos``; only the matched characters count as scanned."""
+        start = time.perf_counter()
+        m = self.regex.match(text, pos)
+        self._record(m.end() - pos if m is not None else 0, m is not None, start)
+        return m
+
+    def findall(self, text):
+        start = time.perf_counter()
+        found = self.regex.findall(text)
+        self._record(len(text), len(found), start)
+        return found
+
+    def finditer(self, text):
+        """Return the matches as a list (so that they are timed)."""
+        start = time.perf_counter()
+        found = list(self.regex.finditer(text))
+        self._record(len(text), len(found), start)
+        return found
+
+    def subn(self, repl, text, count=0):
+        start = time.perf_counter()
+        result = self.regex.subn(repl, text, count)
+        self._record(len(text), result[1], start)
+        return result
+
+    def sub(self, repl, text, count=0):
+        return self.subn(repl, text, count)[0]
+
+    def stats(self):
+        return {
+            'rule': self.name,
+            'calls': self.calls,
+            'hits': self.hits,
+            'scanned': self.scanned,
+            'seconds': round(self.seconds, 6),
+        }
+
+
+def rule(name, pattern, flags=0, description=''):
+    """Compile and register a rule. Names are unique."""
+    if name in RULES:
+        raise ValueError('rule %r is already registered' % name)
+    RULES[name] = Rule(name, pattern, flags, description)
+    return RULES[name]
+
+
+def block(start, end):
+    """Return a pattern matching ``start``, then anything up to the first ``end``.
+
+    ``end`` must start with '<'.
+    """
+    assert end.startswith('<')
+    return '%s[^<]*(?:<(?!%s)[^<]*)*%s' % (start, re.escape(end[1:]), end)
+
+
+def reset():
+    for r in RULES.values():
+        r.reset()
+
+
+def stats():
+    """Return the stats of every registered rule."""
+    return [r.stats() for r in RULES.values()]
+
+
+def merge(many):
+    """Add up lists of rule stats (e.g. from several processes)."""
+    total = {}
+    for entries in many:
+        for entry in entries:
+            current = total.setdefault(entry['rule'], dict(entry, calls=0, hits=0,
+                                                           scanned=0, seconds=0.0))
+            for key in ('calls', 'hits', 'scanned', 'seconds'):
+                current[key] += entry[key]
+    for entry in total.values():
+        entry['seconds'] = round(entry['seconds'], 6)
+    return list(total.values())
+
+
+def write_stats(path, entries=None, **extra):
+    data = dict(extra, rules=stats() if entries is None else entries)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+        f.write('\n')
+
+
+def report(entries=None):
+    """Print the rules that were used, and warn about those that matched nothing."""
+    entries = stats() if entries is None else entries
+    used = [entry for entry in entries if entry['calls']]
+    if not used:
+        return
+    print(f"\n{'='*60}")
+    print("Rule stats")
+    print(f"{'='*60}")
+    for entry in used:
+        mark = '⚠️ ' if not entry['hits'] else '  '
+        print(f"{mark} {entry['rule']:<28} {entry['calls']:>4} call(s) {entry['hits']:>5} hit(s) "
+              f"{entry['scanned']:>10,} chars {entry['seconds'] * 1000:8.2f} ms")
+    for entry in used:
+        if not entry['hits']:
+            print(f"⚠️  {entry['rule']} matched nothing")
+    if os.environ.get('RULE_STATS'):
+        write_stats(os.environ['RULE_STATS'], entries)
+        print(f"📊 Rule stats written to {os.environ['RULE_STATS']}")
+
+
+# ============================================================
+# Rules
+# ============================================================
+
+STYLE_BLOCK = rule('style-block', r'(<style>)([^<]*(?:<(?!/style>)[^<]*)*)(</style>)',
+                   description='a whole <style> element')
+
+SIDEBAR_MENU = rule('sidebar-menu', block('<h3 class="sidebar-title">', '</ul>'),
+                    description='sidebar title and menu')
+
+ANALYTICS_SCRIPT = rule('analytics-script', block('<!-- Simple Analytics Script -->', '</script>'),
+                        description='legacy analytics <script> and its comment')
+
+SCRIPT_BEFORE_LAYOUT_END = rule(
+    'script-before-layout-end',
+    block('<script>', '</script>') + r'\s*</div> <!-- End main-layout -->',
+    description='<script> right before the end of div.main-layout')
+
+MAIN_CONTENT_OPEN = rule('main-content-open',
+                         r'^    <!-- Main Content -->\s*<main class="main-container">', re.MULTILINE,
+                         description='opening of the pre-sidebar main container')
+
+STYLE_BEFORE_SCROLLBAR = rule(
+    'style-before-scrollbar',
+    r'(<style>)((?:[^/<]|/(?!\* Scrollbar Styling \*/)|<(?!/style>))*)'
+    r'(' + block(r'/\* Scrollbar Styling \*/', '</style>') + ')',
+    description='<style> content before the scrollbar styles')
+
+GTAG_STYLE = rule('gtag-style',
+                  r"(gtag\('config', 'G-9VT36QFMKJ'\);\s*</script>)\s*(" + block('<style>', '</style>') + ')',
+                  description='<style> element right after the gtag snippet')
+
+DUPLICATE_ONCLICK = rule(
+    'duplicate-onclick',
+    r'onclick="showSection\(\'([^\']+)\', event\)" onclick="showSection\(\'([^\']+)\', event\)"',
+    description='showSection onclick attribute written twice')
+
+# html_pipeline.py
+NEWLINE = rule('newline', r'\n', description='line ends, to map parser positions to offsets')
+
+TAG_ATTRIBUTE = rule('tag-attribute', r'''\s([^\s"'>/=]+)(\s*=\s*)("[^"]*"|'[^']*'|[^\s>]+)''',
+                     description='attribute of a raw start tag')
+
+# css_consolidate.py
+_CSS_COMMENT = r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'
+_CSS_STRING = r'"(?:[^"\\\n]|\\[\s\S])*"|\'(?:[^\'\\\n]|\\[\s\S])*\''
+
+CSS_TOKEN = rule('css-token', _CSS_STRING + '|' + _CSS_COMMENT + r'|[{};()]',
+                 description='strings, comments and structural characters of a stylesheet')
+
+CSS_LEADING = rule('css-leading', r'\s*((?:' + _CSS_COMMENT + r'\s*)*)',
+                   description='whitespace and comments before a CSS rule')
+
+CSS_COMMENT = rule('css-comment', _CSS_COMMENT, description='CSS comment')
+
+CSS_COMBINATOR = rule('css-combinator', r'\s*([,>+~])\s*',
+                      description='selector list separator or combinator, with its spaces')
+
+CSS_DECLARATION = rule('css-declaration', r'(?:' + _CSS_STRING + r'|\([^)]*\)|[^;"\'(])+',
+                       description='declaration of a CSS rule body')
+
+# css_prune.py
+SELECTOR_PART = rule(
+    'selector-part',
+    r'(?P<comb>\s*[>+~]\s*|\s+)'
+    r'|(?P<tag>\*|[A-Za-z][\w-]*)'
+    r'|#(?P<id>(?:[\w-]|\\.)+)'
+    r'|\.(?P<cls>(?:[\w-]|\\.)+)'
+    r'|\[\s*(?P<attr>[\w:-]+)\s*(?:(?P<op>[~|^$*]?=)\s*'
+    r'(?P<value>' + _CSS_STRING + r'|[^\]\s]+)\s*(?:[iIsS]\s*)?)?\]'
+    r'|(?P<pseudo>::?[\w-]+(?:\((?:[^()]|\([^()]*\))*\))?)',
+    description='combinator, type, id, class, attribute or pseudo-class of a selector')
+
+JS_STRING = rule('js-string', _CSS_STRING + r'|`(?:[^`\\]|\\[\s\S])*`',
+                 description='string literal of a script')
+
+NAME = rule('name', r'[A-Za-z_][\w-]*', description='class, id or attribute name in script strings')
+
+CSS_URL = rule('css-url', r'''url\(\s*(["']?)([^"')]+)\1\s*\)''',
+               description='url() of a stylesheet')
+
+CSS_SOURCE_MAP = rule('css-source-map', r'/\*# sourceMappingURL=[^*]*\*/\s*',
+                      description='source map comment of a stylesheet')
+
+# publish.py
+CSS_MIN_TOKEN = rule('css-min-token', r'(?P<string>' + _CSS_STRING + r')|(?P<comment>' + _CSS_COMMENT + r')'
+                     r'|(?P<space>\s+)|(?P<code>[^"\'/\s]+|/)',
+                     description='token of a stylesheet being minified')
+
+JS_TOKEN = rule(
+    'js-token',
+    r'(?P<string>"(?:[^"\\\n]|\\[\s\S])*"|\'(?:[^\'\\\n]|\\[\s\S])*\')'
+    r'|(?P<line>//[^\n]*)|(?P<block>' + _CSS_COMMENT + r')'
+    r'|(?P<newline>[ \t\r]*\n\s*)|(?P<space>[ \t\r]+)|(?P<slash>/)|(?P<code>[^"\'`/\s]+|["\'`])',
+    description='token of a script being minified; a backtick starts a template literal')
+
+JS_REGEX = rule('js-regex', r'/(?![*/])(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*',
+                description='regular expression literal of a script')
+
+HTML_SPACE = rule('html-space', r'\s+', description='whitespace run of page text')
+
+TAG_SPACE = rule('tag-space', r'("[^"]*"|\'[^\']*\')|\s+(/?>)?',
+                 description='whitespace of a raw start tag, outside attribute values')
+
+
+def main():
+    for r in RULES.values():
+        print(f"{r.name:<28} {r.description}")
+        print(f"{'':<28} {r.regex.pattern}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,8 @@ Converts teaching HTML files to match 819605 template structure
 """
 
 import os
-import re
+
+from rules import STYLE_BLOCK, report
 
 def safe_convert_720201():
     """Safely convert 720201 to match 819605 template"""
@@ -23,12 +24,7 @@ def safe_convert_720201():
     original_size = len(content)
     
     # 1. Fix style section - find and replace just the style tags
-    content = re.sub(
-        r'(<style>)[\s\S]*?(</style>)',
-        r'\1\n\n    \2',
-        content,
-        count=1
-    )
+    content = STYLE_BLOCK.sub(r'\1\n\n    \3', content, count=1)
     
     # 2. Add onclick to sidebar menu links - do one by one
     menu_replacements = [
@@ -177,12 +173,7 @@ def safe_convert_725103():
     original_size = len(content)
     
     # 1. Fix style section
-    content = re.sub(
-        r'(<style>)[\s\S]*?(</style>)',
-        r'\1\n\n    \2',
-        content,
-        count=1
-    )
+    content = STYLE_BLOCK.sub(r'\1\n\n    \3', content, count=1)
     
     # 2. Add onclick to sidebar menu links
     menu_replacements = [
@@ -363,6 +354,7 @@ def main():
     else:
         print(f"⚠️ Only {success_count}/2 files converted")
     print("="*60 + "\n")
+    report()
 
 if __name__ == "__main__":
     main()
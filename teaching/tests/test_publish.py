@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from publish import minify_css, minify_html, minify_js, minify_json
+
+
+def test_template_literal_text_is_kept():
+    assert minify_js("el.textContent = `${m} = ${m*2} items`;") == "el.textContent=`${m} = ${m*2} items`;"
+
+
+def test_nested_template_literal_is_one_token():
+    source = "row = `<tr>  ${cols.map(c => `<td>  ${c}  </td>`).join('')}  </tr>`;\n    next()"
+    assert minify_js(source) == "row=`<tr>  ${cols.map(c => `<td>  ${c}  </td>`).join('')}  </tr>`;\nnext()"
+
+
+def test_braces_strings_and_regexes_in_substitutions():
+    source = "x = `${ {a: '}'}.a + /}`/.source }   z`"
+    assert minify_js(source) == "x=`${ {a: '}'}.a + /}`/.source }   z`"
+
+
+def test_unclosed_template_literal_is_left_as_is():
+    source = "x = `open ${ a"
+    assert minify_js(source) == source
+
+
+def test_string_line_continuation_is_kept():
+    source = 'x = "a  \\\n   b";\n    y()'
+    assert minify_js(source) == 'x="a  \\\n   b";\ny()'
+
+
+def test_html_comments_and_whitespace():
+    source = '<p>a  <!-- note -->\n\n  b</p><!--[if IE]>x<![endif]--><pre>  c  </pre>'
+    assert minify_html(source) == '<p>a b</p><!--[if IE]>x<![endif]--><pre>  c  </pre>\n'
+
+
+def test_commented_out_script_body_is_kept():
+    source = '<script><!--\nvar a = 1;\n//--></script>'
+    assert minify_html(source) == source + '\n'
+
+
+def test_css_comments_spaces_and_strings():
+    assert minify_css('a {  color : red ; }  /* c */ b{x:y}') == 'a{color :red}b{x:y}'
+    source = 'a::before { content: "x  \\\n   y" }'
+    assert minify_css(source) == 'a::before{content:"x  \\\n   y"}'
+
+
+def test_json_keeps_script_end_escaped():
+    assert minify_json('{ "a": [1, 2] }') == '{"a":[1,2]}'
+    text = minify_json('{"html": "<\\/script><!-- x"}')
+    assert '</' not in text and '<!--' not in text
+    assert json.loads(text) == {'html': '</script><!-- x'}
@@ -0,0 +1,22 @@
+import argparse
+import os
+import shutil
+import sys
+
+QUIZ_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'quizzes')
+sys.path.insert(0, QUIZ_DIR)
+
+import quiz_server
+import validate_quiz
+
+
+def test_load_skips_the_validation_manifest(tmp_path, monkeypatch):
+    for name in ['quiz-config.json'] + quiz_server.quiz_bank_names(QUIZ_DIR):
+        shutil.copy(os.path.join(QUIZ_DIR, name), tmp_path / name)
+    validate_quiz.validate_all(tmp_path)
+    assert (tmp_path / validate_quiz.MANIFEST_NAME).exists()
+
+    monkeypatch.setattr(quiz_server, 'QUIZ_DIR', tmp_path)
+    args = argparse.Namespace(db=str(tmp_path / 'quiz.db'), files=[])
+    assert quiz_server.cmd_load(args) == 0
+    assert validate_quiz.MANIFEST_NAME not in quiz_server.quiz_bank_names(tmp_path)
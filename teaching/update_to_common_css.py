@@ -3,9 +3,11 @@ Script to update teaching HTML files to use common CSS
 This will add the common-styles.css link and remove duplicate embedded styles
 """
 
-import re
 import os
 
+from html_pipeline import TEACHING_DIR, discover_pages
+from rules import STYLE_BEFORE_SCROLLBAR, report
+
 def update_html_file(file_path):
     """Update a single HTML file to use common CSS"""
     print(f"\n{'='*60}")
@@ -24,10 +26,8 @@ def update_html_file(file_path):
         print("✅ File already references common-styles.css")
         return True
     
-    # Pattern to find the embedded <style> section
-    # We want to find from <style> to </style> but keep scrollbar styling
-    style_pattern = r'(<style>)(.*?)(\/\* Scrollbar Styling \*\/.*?<\/style>)'
-    
+    # The embedded <style> section: everything from <style> up to the
+    # scrollbar styling is replaced, the scrollbar styling is kept
     def replace_styles(match):
         # Keep only page-specific styles
         scrollbar_section = match.group(3)
@@ -40,7 +40,7 @@ def update_html_file(file_path):
         {scrollbar_section}'''
     
     # Apply the replacement
-    new_content = re.sub(style_pattern, replace_styles, content, flags=re.DOTALL)
+    new_content = STYLE_BEFORE_SCROLLBAR.sub(replace_styles, content)
     
     if new_content == content:
         print("⚠️  No style section found to replace")
@@ -58,14 +58,10 @@ def update_html_file(file_path):
 
 def main():
     """Main function to update all teaching HTML files"""
-    base_path = r"g:\My Drive\profile\teaching"
+    base_path = TEACHING_DIR
     
-    # List of files to update (excluding demo and backup files)
-    files_to_update = [
-        '720201-B1-1-2568.html',
-        '725103-2-2568.html',
-        '819605-2-2568.html'
-    ]
+    # Course pages found next to this script (excluding demo and backup files)
+    files_to_update = [os.path.basename(path) for path in discover_pages(base_path)]
     
     print("\n" + "="*60)
     print("HTML to Common CSS Converter")
@@ -85,6 +81,7 @@ def main():
     print("\n" + "="*60)
     print(f"✅ Successfully updated: {success_count}/{len(files_to_update)} files")
     print("="*60)
+    report()
 
 if __name__ == '__main__':
     main()